@@ -1,59 +1,186 @@
 # Import the necessary modules
 import streamlit as st
+import asyncio
+import concurrent.futures
 import json
-import requests
-from openai import OpenAI 
 import os
-from google import genai
-from google.genai import types as genai_types
-from PIL import Image
-from io import BytesIO
+import threading
 import base64
+import time
+from llm_clients import ClientRegistry, preload
+from image_jobs import ImageJobs
+from image_cache import ImageCache
+import image_pipeline
+from image_pipeline import ImagePipeline
+from context_manager import ConversationContext, estimate_tokens
+from model_router import ModelRouter
+from world_loader import WorldLoader
+from world_index import world_lore
+from opening_pool import OpeningPool
+from session_store import MessageStore, SessionStore
+from game_log import GameConflict, GameLog
+from game_engine import SYSTEM_PROMPT, WELCOME, GameEngine, GameSession, is_error_reply
+import providers
+import sqlite3
+from metrics import Metrics, TOKEN_BUCKETS, start_file_exporter, start_http_exporter
+from rate_limiter import BACKGROUND, RateLimiter
+from scene_bundle import SceneBundle
+import uuid
 
 # --- Load World Data ---
-@st.cache_resource  # Cache to load only once
-def load_world_data(json_file_path):
-    if json_file_path.startswith("http"):
-        response = requests.get(json_file_path)
-        response.raise_for_status()  # Ensure request is successful
-        world_data = response.json()  # Parse JSON response
-    else:
-        with open(json_file_path, 'r') as f:
-            world_data = json.load(f)
-    return world_data
-
-# --- API Interaction Function (Adapt from your example) ---
-def _build_conversation(messages):
-    return "\n".join([f"{m['role']}: {m['content']}" for m in messages])
-
-def _extract_response_text(response):
-    if response is None:
-        return ""
-    text = getattr(response, "text", None)
-    if text:
-        return text
-    candidates = getattr(response, "candidates", None)
-    if candidates:
-        parts = getattr(candidates[0].content, "parts", [])
-        for part in parts:
-            part_text = getattr(part, "text", None)
-            if part_text:
-                return part_text
-    return ""
-
-def _make_genai_config(**kwargs):
-    config_class = getattr(genai_types, "GenerateContentConfig", None)
-    if config_class is None:
-        return None
-    return config_class(**kwargs)
+WORLD_URL = "https://raw.githubusercontent.com/thecraigd/rpg-streamlit/main/aurora_nexus_world.json"
+
+@st.cache_resource  # Serves the shipped/cached world at once and revalidates the remote copy in the background
+def get_world_loader():
+    return WorldLoader(
+        local_path=os.path.join(os.path.dirname(os.path.abspath(__file__)), "aurora_nexus_world.json"),
+        remote_url=os.environ.get("WORLD_URL", WORLD_URL) or None,
+        cache_path=os.path.join(".cache", "world", "aurora_nexus_world.json"),
+        refresh_seconds=float(os.environ.get("WORLD_REFRESH_SECONDS", 300)),
+        # Compiled, memory-mapped copy of the world; stations are parsed on first visit
+        index_path=os.environ.get("WORLD_INDEX_PATH", os.path.join(".cache", "world", "aurora_nexus_world.idx")) or None,
+    )
+
+@st.cache_resource  # Player states of every session in the process; idle ones are spilled to SQLite
+def get_session_store():
+    loader = get_world_loader()
+    return SessionStore(
+        path=os.environ.get("SESSION_STORE_PATH", os.path.join(".cache", "sessions.sqlite3")),
+        resolve_world=lambda world_id: loader.by_id(world_id) or loader.get(),
+        idle_seconds=float(os.environ.get("SESSION_IDLE_SECONDS", 900)),
+        max_resident=int(os.environ.get("SESSION_MAX_RESIDENT", 200)),
+    )
+
+def _player():
+    """This session's game state, reloaded from the session store if it was spilled while idle."""
+    return get_session_store().activate(st.session_state.player)
+
+@st.cache_resource  # One event log per process; every game survives refreshes and restarts
+def get_game_log():
+    return GameLog(
+        path=os.environ.get("GAME_LOG_PATH", os.path.join(".cache", "games.sqlite3")),
+        snapshot_every=int(os.environ.get("GAME_SNAPSHOT_EVERY", 50)),
+    )
+
+@st.cache_resource  # Timings and counters are aggregated across every session in the process
+def get_metrics():
+    metrics = Metrics()
+    if os.environ.get("METRICS_PORT"):
+        start_http_exporter(metrics, int(os.environ["METRICS_PORT"]), host=os.environ.get("METRICS_HOST", "127.0.0.1"))
+    if os.environ.get("METRICS_FILE"):
+        start_file_exporter(metrics, os.environ["METRICS_FILE"])
+    return metrics
+
+@st.cache_resource  # One registry per process, shared by every session
+def get_client_registry():
+    return ClientRegistry(
+        connect_timeout=float(os.environ.get("LLM_CONNECT_TIMEOUT", 5)),
+        read_timeout=float(os.environ.get("LLM_READ_TIMEOUT", 60)),
+        idle_ttl=float(os.environ.get("LLM_CLIENT_IDLE_TTL", 300)),
+        loop=get_event_loop(), # Async clients are closed on the engine loop they ran on
+    )
 
 def _get_genai_client(api_key):
     if api_key and not os.environ.get("GEMINI_API_KEY"):
         os.environ["GEMINI_API_KEY"] = api_key
+    return get_client_registry().get("gemini", api_key)
+
+# Client kind behind each provider in the sidebar; its SDK is imported when the provider is first selected
+PROVIDER_CLIENTS = {"Google Gemini Flash 3": "gemini", "Deepseek Chat": "openai-async"}
+
+@st.cache_resource  # Start each provider's SDK import once per process
+def _preload_provider(client_kind):
+    return preload(client_kind)
+
+DEEPSEEK_BASE_URL = os.environ.get("DEEPSEEK_BASE_URL", providers.DEEPSEEK_BASE_URL)
+
+@st.cache_resource  # Model health is tracked across every session in the process
+def get_model_router():
+    hedge_after = os.environ.get("GEMINI_HEDGE_AFTER")
+    return ModelRouter(
+        providers.GEMINI_MODELS,
+        open_seconds=float(os.environ.get("GEMINI_CIRCUIT_OPEN_SECONDS", 30)),
+        hedge_after=float(hedge_after) if hedge_after else None,
+    )
+
+@st.cache_resource  # Provider quotas are shared by every session in the process
+def get_rate_limiter():
+    # RATE_LIMITS: JSON of model -> {"rpm": requests/min, "tpm": tokens/min}, e.g. {"deepseek-chat": {"rpm": 60}}
+    metrics = get_metrics()
+    return RateLimiter(
+        limits=json.loads(os.environ.get("RATE_LIMITS") or "{}"),
+        max_wait=float(os.environ.get("RATE_LIMIT_MAX_WAIT", 30)),
+        retries=int(os.environ.get("RATE_LIMIT_RETRIES", 3)),
+        burst_seconds=float(os.environ.get("RATE_LIMIT_BURST_SECONDS", 60)),
+        observe=metrics.observe,
+        count=metrics.inc,
+    )
+
+# --- Game Engine ---
+@st.cache_resource  # One event loop per process runs every provider call, so pooled async clients stay on it
+def get_event_loop():
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, name="game-engine-loop", daemon=True).start()
+    return loop
+
+_DONE = object()
+
+async def _next_chunk(chunks):
+    try:
+        return await chunks.__anext__()
+    except StopAsyncIteration:
+        return _DONE
+
+def _run_async(coro, on_idle=None):
+    """Run `coro` on the engine loop and wait for its result; `on_idle()` runs on this thread meanwhile."""
+    future = asyncio.run_coroutine_threadsafe(coro, get_event_loop())
+    try:
+        while True:
+            try:
+                return future.result(timeout=0.1)
+            except concurrent.futures.TimeoutError:
+                if on_idle is not None:
+                    on_idle()
+    finally:
+        future.cancel() # Only has an effect when the script run was interrupted
+
+def _iterate_async(chunks, on_idle=None):
+    """Iterate an async generator from the script thread, one chunk at a time on the engine loop."""
     try:
-        return genai.Client(api_key=api_key)
-    except TypeError:
-        return genai.Client()
+        while (chunk := _run_async(_next_chunk(chunks), on_idle)) is not _DONE:
+            yield chunk
+    finally:
+        asyncio.run_coroutine_threadsafe(chunks.aclose(), get_event_loop())
+
+@st.cache_resource  # Providers, lore indexes and the game log are shared by every session
+def get_engine():
+    registry, limiter, metrics = get_client_registry(), get_rate_limiter(), get_metrics()
+    gemini = providers.GeminiProvider(registry, get_model_router(), limiter, metrics)
+    return GameEngine(
+        providers={
+            "Google Gemini Flash 3": gemini,
+            "Google Gemini Flash 2.0 Experimental": gemini,
+            "Deepseek Chat": providers.OpenAICompatibleProvider(registry, limiter, metrics, base_url=DEEPSEEK_BASE_URL),
+        },
+        lore_index=get_lore_index,
+        game_log=get_game_log(),
+        metrics=metrics,
+        lore_top_k=int(os.environ.get("LORE_TOP_K", 4)),
+        lore_token_budget=int(os.environ.get("LORE_TOKEN_BUDGET", 400)),
+    )
+
+def _game():
+    """This session's game, with the provider and settings chosen in the sidebar."""
+    return GameSession(
+        get_engine(),
+        _player(),
+        _get_conversation_context(),
+        provider=st.session_state.api_provider,
+        api_key=st.session_state.api_key,
+        temperature=st.session_state.temperature,
+        log=_debug_write,
+        owner=st.session_state.owner,
+    )
 
 def _load_gemini_api_key():
     secrets = getattr(st, "secrets", {})
@@ -64,50 +191,105 @@ def _load_gemini_api_key():
         os.environ["GEMINI_API_KEY"] = key
     return key
 
-def generate_response(messages, api_key, provider, temperature):
-    if not api_key: # Check for API key here to avoid initial message
-        return "API key not configured. Please set it in Streamlit secrets or environment variables."
+def _timed_stream(chunks, timing):
+    # Records time-to-first-token and total time into `timing` while passing chunks through
+    start = time.perf_counter()
+    timing["ttft"] = None
+    for chunk in chunks:
+        if timing["ttft"] is None:
+            timing["ttft"] = time.perf_counter() - start
+        yield chunk
+    timing["total"] = time.perf_counter() - start
+
+def _render_response(messages):
+    """Render the DM reply into the current container and return the full text."""
+    timing = {"streamed": st.session_state.get('stream_responses', True)}
+    queue_notice = st.empty()
+    queue = {}
+    def on_queue(position, delay):
+        # Back-pressure from the shared rate limiter; called on the engine loop, shown by show_queue
+        wait = f" (about {delay:.0f}s)" if delay and delay >= 1 else ""
+        queue["notice"] = f"The Dungeon Master is busy: you are #{position} in the queue{wait}..."
+    def show_queue():
+        if "notice" in queue:
+            queue_notice.caption(queue.pop("notice"))
+    game = _game()
+    if timing["streamed"]:
+        chunks = _iterate_async(game.reply(messages, on_queue=on_queue), on_idle=show_queue)
+        response = st.write_stream(_timed_stream(chunks, timing))
+        if isinstance(response, list):
+            response = "".join(str(part) for part in response)
+    else:
+        start = time.perf_counter()
+        response = _run_async(game.reply_text(messages, on_queue=on_queue), on_idle=show_queue)
+        timing["ttft"] = timing["total"] = time.perf_counter() - start
+        st.write(response)
+    queue_notice.empty()
+    st.session_state.last_response_timing = timing
+    metrics = get_metrics()
+    labels = {"provider": st.session_state.api_provider, "streamed": timing["streamed"]}
+    if timing.get("ttft") is not None:
+        metrics.observe("time_to_first_token_seconds", timing["ttft"], **labels)
+    if timing.get("total") is not None:
+        metrics.observe("reply_seconds", timing["total"], **labels)
+    metrics.observe("reply_tokens", estimate_tokens(response), buckets=TOKEN_BUCKETS, provider=st.session_state.api_provider)
+    return response
+
+# --- Lore Retrieval ---
+@st.cache_resource(max_entries=4)  # Built once per world version and shared by every session on it
+def get_lore_index(world_id, _world_data):
+    return world_lore(_world_data) # Compiled worlds read their lore postings from the index file
+
+# --- Conversation Context ---
+MAX_TURN_STATS = 200
+
+def _get_conversation_context():
+    # One context per session; it carries the running summary of older turns
+    if "conversation_context" not in st.session_state:
+        st.session_state.conversation_context = ConversationContext(
+            token_budget=int(os.environ.get("CONTEXT_TOKEN_BUDGET", 3000)),
+            summary_every=int(os.environ.get("CONTEXT_SUMMARY_EVERY", 5)),
+        )
+    return st.session_state.conversation_context
 
-    try:
-        if provider in ("Google Gemini Flash 3", "Google Gemini Flash 2.0 Experimental"):
-            # Convert message history to text format
-            conversation = _build_conversation(messages)
-            model_names = ["gemini-3-flash-preview", "gemini-2.5-flash"]
-
-            client = _get_genai_client(api_key)
-            config = _make_genai_config(temperature=temperature)
-            kwargs = {"config": config} if config is not None else {}
-            last_error = None
-            for model_name in model_names:
-                try:
-                    response = client.models.generate_content(
-                        model=model_name,
-                        contents=conversation,
-                        **kwargs,
-                    )
-                    return _extract_response_text(response)
-                except Exception as e:
-                    last_error = e
-            raise last_error
-
-        elif provider == "Deepseek Chat":
-            client = OpenAI(api_key=api_key, base_url="https://api.deepseek.com/v1")
-            response = client.chat.completions.create(
-                model="deepseek-chat",
-                messages=messages,
-                temperature=temperature, # Use the temperature parameter
-            )
-            return response.choices[0].message.content
-        return f"Error: Unknown provider '{provider}'."
-
-    except Exception as e:
-        return f"Error: {str(e)}"
+def _record_turn_stats(context_stats):
+    # Prompt size next to latency per turn, to check latency stays flat as the session grows
+    turn_stats = st.session_state.setdefault("turn_stats", [])
+    turn_stats.append({**context_stats, **st.session_state.get("last_response_timing", {})})
+    del turn_stats[:-MAX_TURN_STATS]
 
 # --- NEW: Image Generation Function ---
-def generate_image(text_prompt, api_key):
+IMAGE_MODEL = "gemini-2.0-flash-exp-image-generation"
+
+@st.cache_resource  # Shared by every session so repeat scenes are generated once
+def get_image_cache():
+    return ImageCache(
+        directory=os.environ.get("IMAGE_CACHE_DIR", os.path.join(".cache", "images")),
+        memory_bytes=int(os.environ.get("IMAGE_CACHE_MEMORY_MB", 64)) * 1024 * 1024,
+        disk_bytes=int(os.environ.get("IMAGE_CACHE_DISK_MB", 512)) * 1024 * 1024,
+    )
+
+@st.cache_resource  # Scene images are scaled and encoded once, then served as stored bytes
+def get_image_pipeline():
+    metrics = get_metrics()
+    return ImagePipeline(
+        width=int(os.environ.get("IMAGE_DISPLAY_WIDTH", 768)),
+        quality=int(os.environ.get("IMAGE_QUALITY", 80)),
+        observe=metrics.observe,
+        count=metrics.inc,
+    )
+
+def _debug_write(message):
+    if st.session_state.get('debug_mode', False):
+        st.sidebar.write(message)
+
+def generate_image(text_prompt, api_key, log=None):
+    # `log` receives debug messages; background workers pass their own collector
+    # because they cannot write to the sidebar
+    if log is None:
+        log = _debug_write
     if not api_key:
-        if st.session_state.get('debug_mode', False):
-            st.sidebar.write("Debug: API key not configured")
+        log("Debug: API key not configured")
         return None, "API key not configured."
     
     try:
@@ -115,27 +297,35 @@ def generate_image(text_prompt, api_key):
         # This is our last attempt to avoid policy violations
         image_prompt = "Create an abstract futuristic landscape with stars and technology. Completely fictional, no text, no characters."
         
-        if st.session_state.get('debug_mode', False):
-            st.sidebar.write(f"Debug: Using ultra-generic prompt: '{image_prompt}'")
+        log(f"Debug: Using ultra-generic prompt: '{image_prompt}'")
+
+        # Identical (model, prompt) pairs produce interchangeable images, so serve repeats from the cache.
+        # It holds the processed display bytes, keyed by the pipeline's settings, so a hit is a byte copy.
+        image_cache = get_image_cache()
+        pipeline = get_image_pipeline()
+        metrics = get_metrics()
+        cache_model = f"{IMAGE_MODEL}#{pipeline.spec}"
+        cached_image = image_cache.get(cache_model, image_prompt)
+        metrics.inc("image_cache_requests_total", result="miss" if cached_image is None else "hit")
+        if cached_image is not None:
+            return cached_image, "Generated scene image"
         
         # Use the simplest possible approach
         client = _get_genai_client(api_key)
-        config = _make_genai_config(response_modalities=["Text", "Image"])
+        config = providers.make_genai_config(response_modalities=["Text", "Image"])
         kwargs = {"config": config} if config is not None else {}
-        response = client.models.generate_content(
-            model="gemini-2.0-flash-exp-image-generation",
-            contents=image_prompt,
-            **kwargs,
-        )
-        
-        if st.session_state.get('debug_mode', False):
-            st.sidebar.write("Debug: Response received")
+        with metrics.span("image_generate", model=IMAGE_MODEL):
+            # Scene images are background work, so they queue behind players' replies
+            response = get_rate_limiter().call(IMAGE_MODEL, lambda: client.models.generate_content(
+                model=IMAGE_MODEL,
+                contents=image_prompt,
+                **kwargs,
+            ), tokens=estimate_tokens(image_prompt), priority=BACKGROUND)
         
         # Check if we got an error or policy violation
         if hasattr(response, 'text') and response.text:
             if "violates" in response.text.lower() or "policy" in response.text.lower():
-                if st.session_state.get('debug_mode', False):
-                    st.sidebar.write(f"Debug: Policy violation: {response.text[:100]}...")
+                log(f"Debug: Policy violation: {response.text[:100]}...")
                 
                 # If we're getting policy violations even with the most generic prompt,
                 # the feature may not be available for this API key or account
@@ -143,8 +333,7 @@ def generate_image(text_prompt, api_key):
             
             # If the response is just text but not an error, we still don't have an image
             if len(response.text) > 100:
-                if st.session_state.get('debug_mode', False):
-                    st.sidebar.write(f"Debug: Got text response instead of image: {response.text[:100]}...")
+                log(f"Debug: Got text response instead of image: {response.text[:100]}...")
                 return None, "Image generation returned text instead of an image"
         
         # Try to extract image data if present
@@ -156,18 +345,14 @@ def generate_image(text_prompt, api_key):
                         image_payload = part.inline_data.data
                         if isinstance(image_payload, str):
                             image_payload = base64.b64decode(image_payload)
-                        image_bytes = BytesIO(image_payload)
-                        image = Image.open(image_bytes)
-                        if st.session_state.get('debug_mode', False):
-                            st.sidebar.write(f"Debug: Successfully parsed image: {image.format} {image.size}")
-                        return image, "Generated scene image"
+                        image_data, _ = pipeline.process(image_payload) # Decoded, scaled and encoded once, off the render path
+                        image_cache.put(cache_model, image_prompt, image_data)
+                        return image_data, "Generated scene image"
                     except Exception as img_e:
-                        if st.session_state.get('debug_mode', False):
-                            st.sidebar.write(f"Debug: Failed to process image data: {str(img_e)}")
+                        log(f"Debug: Failed to process image data: {str(img_e)}")
         
         # If we got here, we couldn't extract an image
-        if st.session_state.get('debug_mode', False):
-            st.sidebar.write("Debug: No image found in the response")
+        log("Debug: No image found in the response")
         
         # At this point, we should consider the image generation feature unavailable
         # and recommend disabling it to avoid further policy violations
@@ -175,158 +360,319 @@ def generate_image(text_prompt, api_key):
     
     except Exception as e:
         error_msg = f"Error in image generation: {str(e)}"
-        if st.session_state.get('debug_mode', False):
-            st.sidebar.write(f"Debug: {error_msg}")
+        log(f"Debug: {error_msg}")
         return None, error_msg
 
-# --- Game Logic Functions ---
-def start_game(world_data):
-    st.session_state.world_data = world_data
-    st.session_state.inventory = {}
-    st.session_state.current_station = "New Eden"  # Example starting station
-    st.session_state.current_town = "Cygnus Enclave"  # Example starting town
-
-    initial_prompt_content = f"""You are the Dungeon Master for a text-based RPG set in the world of {world_data['name']}.
-    The world description is: {world_data['description']}.
-
-    The player starts in {st.session_state.current_town} in {st.session_state.current_station}.
-    Station Description: {world_data['stations'][st.session_state.current_station]['description']}.
-    Town Description: {world_data['stations'][st.session_state.current_station]['towns'][st.session_state.current_town]['description']}.
-    Available NPCs in {st.session_state.current_town}:
-    """
-    if 'npcs' in world_data['stations'][st.session_state.current_station]['towns'][st.session_state.current_town]:
-        for npc_name, npc_data in world_data['stations'][st.session_state.current_station]['towns'][st.session_state.current_town]['npcs'].items():
-            initial_prompt_content += f"- {npc_data['name']}: {npc_data['description']}\n"
+# --- Background Scene Images ---
+@st.cache_resource  # Worker pool shared by every session
+def get_image_jobs():
+    return ImageJobs(max_workers=int(os.environ.get("IMAGE_WORKERS", 2)))
+
+def _scene_image_job(text_prompt, api_key):
+    # Runs on a worker thread, so debug output is collected and written by the script later
+    debug_lines = []
+    image_data, image_caption = generate_image(text_prompt, api_key, log=debug_lines.append)
+    return image_data, image_caption, debug_lines
+
+@st.cache_resource  # Read once per process; the manifest is re-read when a batch run updates it
+def get_scene_bundle():
+    return SceneBundle(
+        os.environ.get("SCENE_BUNDLE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets", "scenes")),
+        transform=lambda data: get_image_pipeline().process(data)[0], # st.image would re-encode the stored WebP on every render
+    )
+
+def _bundled_scene(game_state):
+    # Towns pre-rendered with scene_bundle.py are shown without a generation call
+    scene = get_scene_bundle().get(game_state.current_station, game_state.current_town)
+    get_metrics().inc("scene_bundle_requests_total", result="miss" if scene is None else "hit")
+    return scene
+
+def _start_scene_image(text_prompt, message_index):
+    """Queue a scene image for the chat message at `message_index`, replacing any stale job."""
+    jobs = get_image_jobs()
+    if not st.session_state.get('enable_images', True):
+        jobs.cancel(st.session_state.session_id)
+        return
+    player = _player()
+    scene = _bundled_scene(player)
+    if scene is not None:
+        jobs.cancel(st.session_state.session_id)
+        player.message_images[message_index] = scene
+        return
+    jobs.submit(st.session_state.session_id, message_index, _scene_image_job, text_prompt, st.session_state.api_key)
+
+def _collect_scene_image():
+    """Attach a finished background image to the message it was generated for."""
+    done = get_image_jobs().collect(st.session_state.session_id)
+    if done is None:
+        return
+    message_index, result = done
+    if isinstance(result, Exception):
+        result = (None, f"Error in image generation: {str(result)}", [f"Debug: Exception during image generation: {str(result)}"])
+    image_data, image_caption, debug_lines = result
+    for line in debug_lines:
+        _debug_write(line)
+    if image_data:
+        _player().message_images[message_index] = (image_data, image_caption)
     else:
-        initial_prompt_content += "None visible.\n"
-
-    initial_prompt_content += """
-    Give some context of the whole Aurora Nexus with its many stations and abundance of variety. Describe the player's immediate surroundings in {st.session_state.current_town} and wait for their first command. 
-    Keep your descriptions evocative and engaging, setting the scene for an immersive role-playing experience.
-    Remember to act as the Dungeon Master and guide the player through the world. Aim to keep your initial description to around 250 words.
-    """
-
-    initial_messages = [
-        {"role": "system", "content": "You are a Dungeon Master for a text-based RPG. Use the provided world data to describe locations, NPCs, and events. Be creative and engaging. Keep responses concise, aiming for approximately 150 words or less."},
-        {"role": "user", "content": initial_prompt_content} # Send the initial prompt as a user message to trigger the DM response
-    ]
-
-    initial_response = generate_response(initial_messages, st.session_state.api_key, st.session_state.api_provider, st.session_state.temperature)
-
-    # Generate an image for the initial scene if images are enabled
-    if st.session_state.get('enable_images', True) and initial_response and not initial_response.startswith("API key not configured"):
+        _debug_write(f"Debug: Failed to generate image. Reason: {image_caption}")
+
+# --- Chat Rendering ---
+HISTORY_PAGE_SIZE = int(os.environ.get("HISTORY_PAGE_SIZE", 30)) # Messages rendered before "Show earlier messages"
+
+def _render_messages(player, start, end):
+    for index in range(start, end):
+        message = player.messages[index]
+        if message["role"] == "system": # Don't show system messages directly to the user
+            continue
+        with st.chat_message(message["role"]):
+            st.write(message["content"])
+            _render_scene_image(player, index)
+
+SCENE_IMAGES_FULL = int(os.environ.get("SCENE_IMAGES_FULL", 3)) # Latest scene images shown at full size; older ones as thumbnails
+
+def _render_scene_image(player, index):
+    # Display the scene image generated for the message at `index`, if any
+    if index in player.message_images and st.session_state.get('enable_images', True):
+        image_data, image_caption = player.message_images[index]
         try:
-            if st.session_state.get('debug_mode', False):
-                st.sidebar.write("Debug: Attempting to generate initial scene image...")
-                
-            image_data, image_caption = generate_image(initial_response, st.session_state.api_key)
-            
-            if image_data:
-                st.session_state.current_image = image_data
-                st.session_state.current_image_caption = image_caption
-                
-                if st.session_state.get('debug_mode', False):
-                    st.sidebar.write("Debug: Initial scene image successfully generated")
-            else:
-                if st.session_state.get('debug_mode', False):
-                    st.sidebar.write(f"Debug: Failed to generate initial image. Reason: {image_caption}")
-                st.session_state.current_image = None
-                st.session_state.current_image_caption = None
+            full = SCENE_IMAGES_FULL > 0 and index in sorted(player.message_images)[-SCENE_IMAGES_FULL:]
+            if not full:
+                image_data = get_image_pipeline().placeholder(image_data)
+            _count_image_sent(index, image_data, "full" if full else "placeholder")
+            st.image(image_data,
+                     caption=image_caption or 'Scene illustration',
+                     width="stretch" if full else "content")
         except Exception as e:
-            if st.session_state.get('debug_mode', False):
-                st.sidebar.write(f"Debug: Exception during initial image generation: {str(e)}")
-            st.session_state.current_image = None
-            st.session_state.current_image_caption = None
+            st.error(f"Failed to display image: {str(e)}")
+            _debug_write(f"Debug: Image display error: {str(e)}")
+            _debug_write(f"Debug: Image type: {type(image_data)}")
+
+def _count_image_sent(index, image_data, variant):
+    # The browser fetches each media file once, so the bytes are counted on the first render only
+    sent = st.session_state.setdefault("images_sent", set())
+    if (index, variant, len(image_data)) not in sent:
+        sent.add((index, variant, len(image_data)))
+        get_metrics().inc("image_bytes_sent_total", len(image_data), variant=variant)
+
+def _show_earlier_messages():
+    st.session_state.history_shown += HISTORY_PAGE_SIZE
+
+def _render_history(player):
+    """Render the latest page of messages on a full run; older ones stay behind a button."""
+    messages = player.messages
+    first = max(0, len(messages) - st.session_state.history_shown)
+    hidden = sum(1 for message in messages[:first] if message["role"] != "system")
+    if hidden:
+        st.button(f"Show earlier messages ({hidden} hidden)", on_click=_show_earlier_messages)
+    _render_messages(player, first, len(messages))
+    st.session_state.history_rendered_upto = len(messages)
+
+@st.fragment
+def _active_turn():
+    # Player commands rerun only this fragment: it renders the turns played since the
+    # last full run, so the cost of a turn does not grow with the length of the history
+    player = _player()
+    try:
+        with get_metrics().span("render_active_turn"):
+            _render_messages(player, st.session_state.history_rendered_upto, len(player.messages))
+        turn_area = st.container()
+        if prompt := st.chat_input("Enter your command here..."):
+            with turn_area:
+                handle_player_input(prompt, _game()) # Renders the player's command and the streamed reply
+            _keep_game_in_url(player) # The turn continues as a copy if the game was resumed in another tab
+            if len(player.messages) - st.session_state.history_rendered_upto > HISTORY_PAGE_SIZE:
+                st.rerun(scope="app") # A full run pages the history again, so turn cost stays bounded by a page
+
+        # Keep polling while this session's scene image is still being generated
+        if get_image_jobs().pending(st.session_state.session_id):
+            _scene_image_watcher()
+    finally:
+        get_session_store().release(player)
+
+@st.fragment(run_every=1)
+def _scene_image_watcher():
+    # Polls the worker pool and reruns the app once the image is ready to attach
+    if get_image_jobs().ready(st.session_state.session_id):
+        st.rerun()
+    st.caption("Rendering scene image...")
+
+def _render_latency_panel():
+    # Process-wide latency histograms (all sessions), replacing the scattered debug lines
+    rows, counters = get_metrics().snapshot()
+    with st.sidebar.expander("Latency (ms)", expanded=True):
+        table = []
+        for row in rows:
+            in_ms = not row["metric"].startswith(("prompt_tokens", "reply_tokens"))
+            scale = 1000 if in_ms else 1
+            table.append({
+                "metric": row["metric"],
+                "n": row["count"],
+                "p50": round(row["p50"] * scale, 1),
+                "p95": round(row["p95"] * scale, 1),
+                "last": round(row["last"] * scale, 1),
+            })
+        if table:
+            st.dataframe(table, hide_index=True)
+        if counters:
+            st.json(counters, expanded=False)
+        st.caption("Token metrics are in tokens, everything else in milliseconds.")
+
+# --- Pre-generated Openings ---
+
+@st.cache_resource  # Openings are shared by every new session in the process
+def get_opening_pool():
+    pool = OpeningPool(
+        target_depth=int(os.environ.get("OPENING_POOL_DEPTH", 2)),
+        ttl_seconds=float(os.environ.get("OPENING_POOL_TTL", 3600)),
+        max_keys=int(os.environ.get("OPENING_POOL_MAX_KEYS", 16)),
+    )
+    metrics = get_metrics()
+    metrics.describe("opening_pool_depth", "Pre-generated openings ready to serve")
+    metrics.gauge("opening_pool_depth", pool.depth)
+    return pool
+
+def _generate_opening(initial_messages, api_key, provider, temperature, with_image):
+    """Produce one opening scene for the pool; raises rather than pooling an error reply."""
+    text = _run_async(get_engine().complete(provider, initial_messages, api_key, temperature, priority=BACKGROUND))
+    if is_error_reply(text):
+        raise RuntimeError(text or "Empty opening scene")
+    image = None
+    if with_image:
+        image_data, image_caption = generate_image(initial_messages[-1]["content"], api_key, log=lambda message: None)
+        if image_data:
+            image = (image_data, image_caption)
+    return {"text": text, "image": image}
+
+# --- Game Flow ---
+def start_game(world_id, world_data, container=None):
+    game = _game()
+    player = game.state
+    initial_messages = game.new_game(world_id, world_data)
+    initial_prompt_content = initial_messages[-1]["content"]
+    st.session_state.history_shown = HISTORY_PAGE_SIZE
+
+    # Take a pre-generated opening if one is ready; the pool refills itself in the background
+    api_key = game.api_key
+    provider = game.provider
+    temperature = game.temperature
+    with_image = st.session_state.get('enable_images', True)
+    opening_pool = get_opening_pool()
+    opening = None
+    if api_key:
+        pool_key = (world_id, player.current_station, player.current_town, provider)
+        pool_image = with_image and get_scene_bundle().get(player.current_station, player.current_town) is None # Bundled towns need no generated image
+        opening_pool.register(pool_key, lambda: _generate_opening(initial_messages, api_key, provider, temperature, pool_image))
+        opening = opening_pool.take(pool_key)
+        get_metrics().inc("opening_pool_requests_total", result="miss" if opening is None else "hit")
+
+    if opening is not None:
+        initial_response = opening["text"]
+        if opening["image"] and with_image:
+            get_image_jobs().cancel(st.session_state.session_id)
+            player.message_images[1] = opening["image"]
+        else:
+            _start_scene_image(initial_prompt_content, 1)
     else:
-        st.session_state.current_image = None
-        st.session_state.current_image_caption = None
-
-    st.session_state.messages = [
-        {"role": "system", "content": "You are a Dungeon Master for a text-based RPG. Use the provided world data to describe locations, NPCs, and events. Be creative and engaging. Keep responses concise, aiming for approximately 150 words or less."},
-        {"role": "assistant", "content": initial_response if initial_response and not initial_response.startswith("API key not configured") else "Welcome to Aurora Nexus!"} # Display the AI's response as the first message, or default welcome if API key issue or no response
-    ]
-
-def get_location_description(game_state):
-    world_data = game_state.world_data
-    station_name = game_state.current_station
-    town_name = game_state.current_town
-    town_data = world_data['stations'][station_name]['towns'][town_name]
-    description = f"**{town_data['name']}:** {town_data['description']}\n\n"
-    npc_names = [npc['name'] for npc in town_data['npcs'].values()] if 'npcs' in town_data else []
-    if npc_names:
-        description += f"**Notable inhabitants you see around you:** {', '.join([npc['name'] for npc in town_data['npcs'].values()])}.\n"
-    return description
-
-def handle_player_input(player_command, game_state):
-    current_location_description = get_location_description(game_state)
-    prompt_message = f"""
-    **Current Location:**
-    {current_location_description}
-
-    **Your Inventory:** {game_state.inventory}
-
-    **Your Command:** {player_command}
-
-    Respond as the Dungeon Master. Describe what happens next in the game world based on the player's command, the current location, and the world's lore.
-    Be descriptive and engaging. Advance the story based on the player's actions. Aim to keep your response to around 150 words or less.
-    """
-    st.session_state.messages.append({"role": "user", "content": player_command}) # Keep this line to display the player's command
+        # The opening image only needs the prompt, so start it before the text is generated
+        if api_key:
+            _start_scene_image(initial_prompt_content, 1)
+
+        # Stream the opening scene into a temporary bubble; the history loop re-renders it once stored
+        placeholder = (container or st).empty()
+        with placeholder.container():
+            with st.chat_message("assistant"):
+                initial_response = _render_response(initial_messages)
+        placeholder.empty()
+
+    # Every game is logged from its first scene, so it can be resumed after a refresh or restart
+    game.begin(initial_response)
+    _keep_game_in_url(player)
+
+def _keep_game_in_url(game_state):
+    if game_state.game_id and st.query_params.get("game") != game_state.game_id:
+        st.query_params["game"] = game_state.game_id
+
+def load_game(game_id):
+    """Resume a logged game from its latest snapshot and the events after it, without any model calls."""
+    loader = get_world_loader()
+    _game().load(game_id, lambda world_id: loader.by_id(world_id) or loader.get())
+    get_image_jobs().cancel(st.session_state.session_id)
+    st.session_state.history_shown = HISTORY_PAGE_SIZE
+    st.query_params["game"] = game_id
+
+def handle_player_input(player_command, game):
+    """Play one command through `game`, rendering the command, the reply and its scene image."""
+    turn = game.prepare_turn(player_command) # Records the command and answers quick commands locally
     with st.chat_message("user"): # **Explicitly display user message here**
         st.write(player_command)
-    
-    # Generate the AI response
-    ai_response = generate_response(st.session_state.messages + [{"role": "user", "content": prompt_message}], st.session_state.api_key, st.session_state.api_provider, st.session_state.temperature)
-    
-    # Generate image for the new scene if images are enabled
-    if st.session_state.get('enable_images', True):
-        try:
-            if st.session_state.get('debug_mode', False):
-                st.sidebar.write("Debug: Attempting to generate image...")
-                
-            image_data, image_caption = generate_image(ai_response, st.session_state.api_key)
-            
-            if image_data:
-                st.session_state.current_image = image_data
-                st.session_state.current_image_caption = image_caption
-                
-                if st.session_state.get('debug_mode', False):
-                    st.sidebar.write("Debug: Image successfully generated")
-            else:
-                if st.session_state.get('debug_mode', False):
-                    st.sidebar.write(f"Debug: Failed to generate image. Reason: {image_caption}")
-                st.session_state.current_image = None
-                st.session_state.current_image_caption = None
-        except Exception as e:
-            if st.session_state.get('debug_mode', False):
-                st.sidebar.write(f"Debug: Exception during image generation: {str(e)}")
-            st.session_state.current_image = None
-            st.session_state.current_image_caption = None
-    
-    return ai_response
-
-def add_item_to_inventory(item_name, game_state):
-    if item_name in game_state.inventory:
-        game_state.inventory[item_name] += 1
-    else:
-        game_state.inventory[item_name] = 1
-
-def remove_item_from_inventory(item_name, game_state):
-    if item_name in game_state.inventory and game_state.inventory[item_name] > 0:
-        game_state.inventory[item_name] -= 1
-        if game_state.inventory[item_name] == 0:
-            del game_state.inventory[item_name]
-
-def check_inventory(game_state):
-    inventory_str = "Your Inventory:\n"
-    if not game_state.inventory:
-        inventory_str += "Empty"
-    else:
-        for item, count in game_state.inventory.items():
-            inventory_str += f"- {item}: {count}\n"
-    return inventory_str
 
+    if turn.quick:
+        with st.chat_message("assistant"):
+            st.write(turn.reply)
+            if st.session_state.get('quick_command_flavour', False):
+                flavour = _render_response(game.flavour_messages(turn))
+                turn.reply += f"\n\n{flavour}"
+            if turn.scene is not None:
+                _start_scene_image(turn.scene, turn.scene_index)
+                _render_scene_image(game.state, turn.scene_index) # Shown at once when the town is pre-rendered
+        return game.finish_turn(turn)
+
+    # Start the scene image in the background; it is attached to the reply when it finishes
+    _start_scene_image(turn.scene, turn.scene_index)
+
+    # Generate the AI response, rendering it as it streams in
+    with st.chat_message("assistant"):
+        turn.reply = _render_response(turn.request_messages)
+        _render_scene_image(game.state, turn.scene_index) # Shown at once when the town is pre-rendered
+    _record_turn_stats(turn.prompt_stats)
+    return game.finish_turn(turn)
 
 # --- Streamlit UI ---
+HEADER_IMAGE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "AURORA_NEXUS.png")
+HEADER_IMAGE_URL = "https://raw.githubusercontent.com/thecraigd/rpg-streamlit/main/AURORA_NEXUS.png"
+
+HEADER_IMAGE_CACHE = os.path.join(".cache", "AURORA_NEXUS.png")
+HEADER_IMAGE_WIDTH = 1460 # st.image's widest layout; wider images are rescaled on every render
+
+def _display_header(data):
+    # Encoded once as progressive JPEG, which st.image passes through instead of re-encoding per render
+    try:
+        return image_pipeline.prepare(data, width=HEADER_IMAGE_WIDTH, quality=85)[0]
+    except (OSError, ValueError):
+        return data
+
+def _download_header_image(holder):
+    # The asset is not part of every checkout: fetch it once and keep it under .cache/ for later processes
+    import urllib.request
+    try:
+        with urllib.request.urlopen(HEADER_IMAGE_URL, timeout=10) as response:
+            data = response.read()
+        os.makedirs(os.path.dirname(HEADER_IMAGE_CACHE), exist_ok=True)
+        with open(f"{HEADER_IMAGE_CACHE}.tmp", "wb") as f:
+            f.write(data)
+        os.replace(f"{HEADER_IMAGE_CACHE}.tmp", HEADER_IMAGE_CACHE)
+        holder["data"] = _display_header(data)
+    except (OSError, ValueError):
+        pass # Keep linking the hosted copy; the next process tries again
+
+@st.cache_resource  # Read the header from disk once per process instead of fetching it remotely on every render
+def _header_image_holder():
+    holder = {}
+    for path in (HEADER_IMAGE_PATH, HEADER_IMAGE_CACHE):
+        try:
+            with open(path, "rb") as f:
+                holder["data"] = _display_header(f.read())
+            return holder
+        except OSError:
+            pass
+    threading.Thread(target=_download_header_image, args=(holder,), name="header-image", daemon=True).start()
+    return holder
+
+def _header_image():
+    return _header_image_holder().get("data", HEADER_IMAGE_URL) # The hosted copy until the local one is available
+
+script_start = time.perf_counter()
 st.set_page_config(
     page_title="AURORA NEXUS - AI RPG Game",
     layout="wide",
@@ -398,10 +744,7 @@ st.markdown(
 temperature = 0.7
 
 # Add a full-width header image
-st.image(
-    "https://raw.githubusercontent.com/thecraigd/rpg-streamlit/main/AURORA_NEXUS.png",
-    use_container_width=True,
-)
+st.image(_header_image(), width="stretch")
 
 # Display logo/title
 # st.title("Aurora Nexus RPG") # removed and replaced with header image
@@ -411,10 +754,26 @@ The Aurora Nexus uses modern Large Language Model technology to power a fully in
 
 Thanks for your patience while the first part of your adventure is created...""")
 
+# Identifies this browser session to the shared background workers
+if "session_id" not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
+# Owner token of this browser's saved games, kept in the page URL so a refresh still finds them
+if "owner" not in st.session_state:
+    st.session_state.owner = st.query_params.get("player") or uuid.uuid4().hex
+if st.query_params.get("player") != st.session_state.owner:
+    st.query_params["player"] = st.session_state.owner
+if "player" not in st.session_state:
+    st.session_state.player = get_session_store().create(st.session_state.session_id)
+player = _player()
+
+# Main-area slot for output produced while handling sidebar actions
+main_area = st.container()
+
 # Sidebar for settings
 with st.sidebar:
     st.header("Settings")
-    api_provider = st.selectbox("API Provider", ["Google Gemini Flash 3", "Deepseek Chat"])  
+    api_provider = st.selectbox("API Provider", list(PROVIDER_CLIENTS))  
+    _preload_provider(PROVIDER_CLIENTS[api_provider])
     
     # Image generation toggle with warning
     st.markdown("**Scene Visualization**")
@@ -423,13 +782,48 @@ with st.sidebar:
     if enable_images:
         st.info("Note: Image generation is experimental and may not be available with all API keys. If you see policy violation messages, try disabling this feature.")
     
+    # Stream replies as they are generated instead of waiting for the full text
+    stream_responses = st.checkbox("Stream Responses", value=True)
+
+    # Quick commands (inventory, look, who is here, go to <town>) are answered locally
+    quick_command_flavour = st.checkbox("Narrate Quick Commands", value=False)
+
     # Add debug mode toggle
     debug_mode = st.checkbox("Debug Mode", value=False)
     
+    st.session_state.stream_responses = stream_responses
+    st.session_state.quick_command_flavour = quick_command_flavour
+
     if st.button("Start New Game"):
-        if 'world_data' in st.session_state:
-            start_game(st.session_state.world_data)
-            st.session_state.messages = st.session_state.messages # Force re-render of chat
+        if player.world_data is not None:
+            start_game(*get_world_loader().current(), container=main_area) # Picks up any newer world version
+
+    # Every turn is logged as it happens; saving names the game and snapshots it for a quick resume
+    st.markdown("**Saved Games**")
+    save_title = st.text_input("Game name", placeholder="Leave empty to keep the current name")
+    if st.button("Save Game") and player.game_id:
+        try:
+            try:
+                get_game_log().save(player.game_id, player.to_dict(), title=save_title or None, after=player.game_seq)
+            except GameConflict: # Continued in another tab since; save this tab's game as a copy
+                _game().fork()
+                get_game_log().save(player.game_id, player.to_dict(), title=save_title or None)
+                _keep_game_in_url(player)
+            st.success("Game saved.")
+        except (sqlite3.Error, KeyError) as e:
+            st.error(f"Failed to save game: {str(e)}")
+    saved_games = {game["game_id"]: game for game in get_game_log().list_games(owner=st.session_state.owner)}
+    if saved_games:
+        selected_game = st.selectbox(
+            "Saved game",
+            list(saved_games),
+            format_func=lambda game_id: f"{saved_games[game_id]['title'] or game_id} ({saved_games[game_id]['events']} events)",
+        )
+        if st.button("Load Game"):
+            try:
+                load_game(selected_game)
+            except (sqlite3.Error, KeyError) as e:
+                st.error(f"Failed to load game: {str(e)}")
 
     st.session_state.api_provider = api_provider # Update session state with sidebar values
     st.session_state.temperature = temperature
@@ -444,57 +838,30 @@ if api_provider == "Deepseek Chat":
 else:
     st.session_state.api_key = _load_gemini_api_key() # Access API key from secrets or environment
 
-# Initialize game state if not already in session
-if "world_data" not in st.session_state:
-    world_data = load_world_data("https://raw.githubusercontent.com/thecraigd/rpg-streamlit/main/aurora_nexus_world.json")
-    st.session_state.world_data = world_data
-    start_game(world_data)
+# Initialize game state if not already in session, resuming the game in the URL after a refresh
+if player.world_data is None:
+    try:
+        load_game(st.query_params["game"])
+    except (KeyError, sqlite3.Error):
+        start_game(*get_world_loader().current())
 
 # Initialize messages if not already in session
-if "messages" not in st.session_state:
-    st.session_state.messages = [
-        {"role": "system", "content": "You are a Dungeon Master for a text-based RPG. Use the provided world data to describe locations, NPCs, and events. Be creative and engaging. Keep responses concise, aiming for approximately 150 words or less."},
-        {"role": "assistant", "content": "Welcome to Aurora Nexus! I'll be your guide through this adventure. Type a command to begin."}
-    ]
+if not len(player.messages):
+    player.messages = MessageStore([
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "assistant", "content": f"{WELCOME} I'll be your guide through this adventure. Type a command to begin."}
+    ])
+
+if "history_shown" not in st.session_state:
+    st.session_state.history_shown = HISTORY_PAGE_SIZE
+
+# Attach any scene image that finished in the background since the last run
+_collect_scene_image()
 
 # Display chat messages
-if "messages" in st.session_state:
-    for message in st.session_state.messages:
-        if message["role"] != "system": # Don't show system messages directly to the user
-            with st.chat_message(message["role"]):
-                st.write(message["content"])
-                
-                # Display current scene image after assistant messages
-                if message["role"] == "assistant" and 'current_image' in st.session_state and st.session_state.current_image is not None and st.session_state.get('enable_images', True):
-                    try:
-                        st.image(st.session_state.current_image, 
-                                 caption=st.session_state.get('current_image_caption', 'Scene illustration'), 
-                                 use_column_width=True)
-                    except Exception as e:
-                        st.error(f"Failed to display image: {str(e)}")
-                        if st.session_state.get('debug_mode', False):
-                            st.sidebar.write(f"Debug: Image display error: {str(e)}")
-                            st.sidebar.write(f"Debug: Image type: {type(st.session_state.current_image)}")
-
-# Chat input
-if prompt := st.chat_input("Enter your command here..."):
-    ai_response = handle_player_input(prompt, st.session_state)
-    if ai_response:
-        with st.chat_message("assistant"):
-            st.write(ai_response)
-            
-            # Display the generated image
-            if 'current_image' in st.session_state and st.session_state.current_image is not None and st.session_state.get('enable_images', True):
-                try:
-                    st.image(st.session_state.current_image, 
-                             caption=st.session_state.get('current_image_caption', 'Scene illustration'), 
-                             use_column_width=True)
-                except Exception as e:
-                    st.error(f"Failed to display image: {str(e)}")
-                    st.sidebar.write(f"Debug: Image display error: {str(e)}")
-                    st.sidebar.write(f"Debug: Image type: {type(st.session_state.current_image)}")
-            
-            st.session_state.messages.append({"role": "assistant", "content": ai_response})
+with get_metrics().span("render_history"):
+    _render_history(player)
+_active_turn()
 
 
 # --- Example Inventory Interaction (for testing) ---
@@ -502,11 +869,17 @@ if st.sidebar.checkbox("Show Inventory Functions (Debug)"):
     st.sidebar.subheader("Inventory (Debug)")
     item_to_add = st.sidebar.text_input("Add Item:")
     if st.sidebar.button("Add Item to Inventory"):
-        add_item_to_inventory(item_to_add, st.session_state)
+        _game().add_item(item_to_add)
 
     item_to_remove = st.sidebar.text_input("Remove Item:")
     if st.sidebar.button("Remove Item from Inventory"):
-        remove_item_from_inventory(item_to_remove, st.session_state)
+        _game().remove_item(item_to_remove)
 
     if st.sidebar.button("Check Inventory"):
-        st.sidebar.write(check_inventory(st.session_state))
+        st.sidebar.write(_game().check_inventory())
+
+get_metrics().observe("script_run_seconds", time.perf_counter() - script_start)
+if st.session_state.get('debug_mode', False):
+    _render_latency_panel()
+
+get_session_store().release(player)
@@ -0,0 +1,204 @@
+# Headless load test: many scripted playthroughs of the game engine on one asyncio event loop
+#
+# Drives game_engine.GameSession directly, without Streamlit, so hundreds of
+# concurrent players fit in one process. By default the mock provider stands in
+# for Gemini / DeepSeek; --live uses the real APIs with the keys in the
+# environment. Reports the same table as bench_turns.py (and can be compared
+# with its results), and --transcripts keeps every playthrough for review:
+#
+#   python benchmarks/bench_headless.py --sessions 1 16 64 --turns 8 --output headless.json
+#   GEMINI_API_KEY=... python benchmarks/bench_headless.py --live --sessions 4 --transcripts runs/
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(0, REPO_DIR)
+
+from bench_turns import PROVIDERS, SCRIPT, percentiles, print_report  # noqa: E402
+from mock_provider import MockProvider, add_arguments, config_from_args  # noqa: E402
+
+import providers  # noqa: E402
+from context_manager import ConversationContext  # noqa: E402
+from game_engine import GameEngine, GameSession, is_error_reply  # noqa: E402
+from game_log import GameLog  # noqa: E402
+from llm_clients import DEFAULT_MAX_CONNECTIONS, ClientRegistry  # noqa: E402
+from metrics import Metrics  # noqa: E402
+from model_router import ModelRouter  # noqa: E402
+from rate_limiter import RateLimiter  # noqa: E402
+from session_store import PlayerState  # noqa: E402
+from world_loader import world_id  # noqa: E402
+
+API_KEYS = {"gemini": ("GEMINI_API_KEY", "GOOGLE_API_KEY"), "deepseek": ("DEEPSEEK_API_KEY",)}
+
+
+def build_engine(args, provider_url, workdir):
+    """The engine as app.py builds it, pointed at the mock provider unless --live is given."""
+    registry = ClientRegistry(read_timeout=args.timeout, max_connections=args.max_connections,
+                              max_keepalive=args.max_connections, loop=asyncio.get_running_loop())
+    metrics = Metrics()
+    limiter = RateLimiter(json.loads(args.rate_limits or "{}"), max_wait=args.timeout,
+                          observe=metrics.observe, count=metrics.inc)
+    deepseek_url = f"{provider_url}/v1" if provider_url else os.environ.get("DEEPSEEK_BASE_URL", providers.DEEPSEEK_BASE_URL)
+    gemini = providers.GeminiProvider(registry, ModelRouter(providers.GEMINI_MODELS), limiter, metrics)
+    engine = GameEngine(
+        providers={
+            PROVIDERS["gemini"]: gemini,
+            PROVIDERS["deepseek"]: providers.OpenAICompatibleProvider(registry, limiter, metrics, base_url=deepseek_url),
+        },
+        game_log=None if args.no_log else GameLog(os.path.join(workdir, "games.sqlite3")),
+        metrics=metrics,
+    )
+    return engine, registry
+
+
+async def reply(session, turn, samples, stream):
+    # Fills in the Dungeon Master's answer to `turn`, timing the first chunk
+    start = time.perf_counter()
+    if not stream:
+        turn.reply = await session.reply_text(turn.request_messages)
+        samples["ttft"].append(time.perf_counter() - start)
+        return
+    chunks = []
+    async for chunk in session.reply(turn.request_messages):
+        if not chunks:
+            samples["ttft"].append(time.perf_counter() - start)
+        chunks.append(chunk)
+    turn.reply = "".join(chunks)
+
+
+async def play_session(number, engine, world, args, script, api_key, results):
+    session = GameSession(engine, PlayerState(f"headless-{number}"), ConversationContext(),
+                          provider=PROVIDERS[args.provider], api_key=api_key)
+    samples = {"startup": [], "turn": [], "ttft": [], "prompt_build": []}
+    start = time.perf_counter()
+    opening = await session.start(world_id(world), world)
+    samples["startup"].append(time.perf_counter() - start)
+    if is_error_reply(opening):
+        results["errors"].append(f"session {number} opening: {opening[:120]}")
+    for index in range(args.turns):
+        start = time.perf_counter()
+        turn = session.prepare_turn(script[index % len(script)])
+        if not turn.quick:
+            samples["prompt_build"].append(turn.prompt_stats["prompt_build"])
+            await reply(session, turn, samples, not args.no_stream)
+        session.finish_turn(turn)
+        samples["turn"].append(time.perf_counter() - start)
+        if is_error_reply(turn.reply):
+            results["errors"].append(f"session {number} turn {index}: {turn.reply[:120]}")
+    for name, values in samples.items():
+        results[name].extend(values)
+    if args.transcripts:
+        with open(os.path.join(args.transcripts, f"session-{number:04d}.json"), "w") as f:
+            json.dump({"game_id": session.state.game_id, "station": session.state.current_station,
+                       "town": session.state.current_town, "inventory": session.state.inventory,
+                       "messages": list(session.state.messages)}, f, indent=2)
+
+
+async def run_level(concurrency, engine, world, args, script, api_key):
+    results = {"startup": [], "turn": [], "ttft": [], "prompt_build": [], "errors": []}
+    start = time.perf_counter()
+    outcomes = await asyncio.gather(*(play_session(number, engine, world, args, script, api_key, results)
+                                      for number in range(concurrency)), return_exceptions=True)
+    elapsed = time.perf_counter() - start
+    results["errors"].extend(f"session crashed: {outcome!r}" for outcome in outcomes if isinstance(outcome, Exception))
+    turns = len(results["turn"])
+    return {
+        "sessions": concurrency,
+        "turns": turns,
+        "wall_time": elapsed,
+        "throughput_turns_per_s": turns / elapsed if elapsed else 0.0,
+        "startup": percentiles(results["startup"]),
+        "turn_latency": percentiles(results["turn"]),
+        "ttft": percentiles(results["ttft"]),
+        "prompt_build": percentiles(results["prompt_build"]),
+        "errors": results["errors"][:20],
+        "error_count": len(results["errors"]),
+    }
+
+
+async def run_levels(args, provider_url, workdir, world, script, api_key):
+    # Every level shares one loop: the pooled async clients are bound to the loop that first used them
+    engine, registry = build_engine(args, provider_url, workdir)
+    try:
+        return [await run_level(concurrency, engine, world, args, script, api_key) for concurrency in args.sessions]
+    finally:
+        await asyncio.gather(*registry.close_all(), return_exceptions=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent headless playthroughs of the game engine")
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 8, 32], help="concurrency levels to run")
+    parser.add_argument("--turns", type=int, default=8, help="scripted turns per session")
+    parser.add_argument("--provider", choices=sorted(PROVIDERS), default="gemini")
+    parser.add_argument("--no-stream", action="store_true", help="use the blocking reply path")
+    parser.add_argument("--script", help="file with one player command per line (default: the bench_turns script)")
+    parser.add_argument("--world", default=os.path.join(REPO_DIR, "aurora_nexus_world.json"))
+    parser.add_argument("--live", action="store_true", help="call the real provider APIs instead of the mock")
+    parser.add_argument("--rate-limits", default=os.environ.get("RATE_LIMITS"), help="RATE_LIMITS JSON for the shared limiter")
+    parser.add_argument("--no-log", action="store_true", help="do not write games to a game log")
+    parser.add_argument("--transcripts", help="directory to write each playthrough to as JSON")
+    parser.add_argument("--timeout", type=float, default=120.0, help="seconds allowed per provider call")
+    parser.add_argument("--max-connections", type=int, default=DEFAULT_MAX_CONNECTIONS, help="connection pool size per client")
+    parser.add_argument("--output", default="bench_headless.json", help="where to write the JSON results")
+    parser.add_argument("--compare", help="previous results JSON to compare against")
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    with open(args.world, encoding="utf-8") as f:
+        world = json.load(f)
+    script = SCRIPT
+    if args.script:
+        with open(args.script, encoding="utf-8") as f:
+            script = [line.strip() for line in f if line.strip()]
+    if args.transcripts:
+        os.makedirs(args.transcripts, exist_ok=True)
+
+    provider = None
+    if args.live:
+        api_key = next(filter(None, (os.environ.get(name) for name in API_KEYS[args.provider])), None)
+        if not api_key:
+            sys.exit(f"Set {' or '.join(API_KEYS[args.provider])} to play against the live API.")
+    else:
+        provider = MockProvider(config_from_args(args)).start()
+        os.environ["GOOGLE_GEMINI_BASE_URL"] = provider.url
+        api_key = "mock-key"
+
+    workdir = tempfile.mkdtemp(prefix="bench_headless_")
+    try:
+        levels = asyncio.run(run_levels(args, provider and provider.url, workdir, world, script, api_key))
+    finally:
+        if provider is not None:
+            provider.stop()
+
+    report = {
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        "environment": {"python": platform.python_version(), "platform": platform.platform(),
+                        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S")},
+        "levels": levels,
+        "memory_per_session_bytes": None,
+        "provider_requests": dict(provider.requests) if provider is not None else {},
+    }
+    report["config"]["images"] = False
+    report["config"]["failing_model"] = list(report["config"]["failing_model"] or [])
+    output = os.path.abspath(args.output)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    previous = None
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+    print_report(report, previous)
+    print(f"results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
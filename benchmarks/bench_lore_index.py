@@ -0,0 +1,38 @@
+# Micro-benchmark: LoreIndex build time and query latency on large worlds
+#
+#   python benchmarks/bench_lore_index.py
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lore_index import LoreIndex  # noqa: E402
+from synthetic_world import _WORDS, make_world  # noqa: E402
+
+QUERIES = 500
+
+
+def bench(stations, towns_per_station, npcs_per_town=3):
+    world = make_world(stations, towns_per_station, npcs_per_town)
+    start = time.perf_counter()
+    index = LoreIndex.from_world(world)
+    build_ms = (time.perf_counter() - start) * 1000
+
+    rng = random.Random(1)
+    latencies = []
+    for _ in range(QUERIES):
+        query = " ".join(rng.choice(_WORDS) for _ in range(8))
+        start = time.perf_counter()
+        index.search(query, k=4, token_budget=400)
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    print(f"{len(index.passages):>7} passages  build {build_ms:8.1f} ms  "
+          f"query p50 {statistics.median(latencies):6.2f} ms  p95 {latencies[int(0.95 * len(latencies))]:6.2f} ms")
+
+
+if __name__ == "__main__":
+    for stations, towns in ((10, 10), (50, 20), (100, 50)):
+        bench(stations, towns)
@@ -0,0 +1,161 @@
+# Rerun cost against chat history length
+#
+# Loads app.py in Streamlit's AppTest harness, fills the session with a synthetic
+# history of N turns (optionally with a scene image on every reply) and times full
+# script reruns, which is what every sidebar interaction and finished scene image
+# triggers. Each history length is measured twice: with the paginated history
+# (HISTORY_PAGE_SIZE, the default) and with every message rendered, which is how
+# the app behaved before. Reports rerun time and the number of elements and
+# bytes sent to the browser per rerun:
+#
+#   python benchmarks/bench_rerun.py --turns 10 100 1000 --images
+import argparse
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_PATH = os.path.join(os.path.dirname(BENCH_DIR), "app.py")
+sys.path.insert(0, BENCH_DIR)
+
+from mock_provider import MockConfig, MockProvider  # noqa: E402
+
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+from session_store import MessageStore  # noqa: E402
+
+RENDER_ALL = 10 ** 9  # HISTORY_PAGE_SIZE that shows every message
+
+
+class PayloadMeter:
+    """Counts the delta messages (and their bytes) sent while a script runs."""
+
+    def __init__(self):
+        from streamlit.runtime.scriptrunner_utils.script_run_context import ScriptRunContext
+
+        self.elements = 0
+        self.bytes = 0
+        original_enqueue = ScriptRunContext.enqueue
+        meter = self
+
+        def enqueue(ctx, msg):
+            if msg.HasField("delta"):
+                meter.elements += 1
+                meter.bytes += msg.ByteSize()
+            return original_enqueue(ctx, msg)
+
+        ScriptRunContext.enqueue = enqueue
+
+    def reset(self):
+        self.elements = 0
+        self.bytes = 0
+
+
+def synthetic_history(turns, words, image):
+    filler = ("the station hums with neon light as traders haggle over shimmering relics "
+              "while drones drift between hydroponic towers ").split()
+    reply = " ".join(filler[i % len(filler)] for i in range(words))
+    messages = [{"role": "system", "content": "You are a Dungeon Master for a text-based RPG."},
+                {"role": "assistant", "content": reply}]
+    images = {1: (image, "Scene illustration")} if image else {}
+    for turn in range(turns):
+        messages.append({"role": "user", "content": f"Explore the next corridor ({turn})"})
+        messages.append({"role": "assistant", "content": reply})
+        if image:
+            images[len(messages) - 1] = (image, "Scene illustration")
+    return messages, images
+
+
+def scene_image(size):
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.radial_gradient("L").resize(size).convert("RGB").save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def measure(app_path, turns, page_size, args, meter, image):
+    from streamlit.testing.v1 import AppTest
+
+    os.environ["HISTORY_PAGE_SIZE"] = str(page_size)
+    at = AppTest.from_file(app_path, default_timeout=args.timeout)
+    at.secrets["GEMINI_API_KEY"] = "mock-key"
+    at.run()
+    if args.images:
+        next(box for box in at.sidebar.checkbox if box.label == "Enable Scene Images").check()
+    messages, images = synthetic_history(turns, args.words, image)
+    player = at.session_state["player"]
+    player.messages = MessageStore(messages)
+    player.message_images = images
+    at.run()  # warm-up: media files are registered on the first render
+
+    timings, elements, sent = [], [], []
+    for _ in range(args.reruns):
+        meter.reset()
+        start = time.perf_counter()
+        at.run()
+        timings.append(time.perf_counter() - start)
+        elements.append(meter.elements)
+        sent.append(meter.bytes)
+    return {
+        "turns": turns,
+        "page_size": None if page_size == RENDER_ALL else page_size,
+        "rerun_p50": statistics.median(timings),
+        "rerun_max": max(timings),
+        "elements": statistics.median(elements),
+        "bytes": statistics.median(sent),
+        "exception": at.exception[0].message if at.exception else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rerun time against chat history length")
+    parser.add_argument("--app", default=APP_PATH, help="app.py to measure")
+    parser.add_argument("--turns", type=int, nargs="+", default=[10, 100, 1000], help="history lengths in turns")
+    parser.add_argument("--page-size", type=int, default=30, help="HISTORY_PAGE_SIZE for the paginated runs")
+    parser.add_argument("--images", action="store_true", help="attach a scene image to every reply")
+    parser.add_argument("--words", type=int, default=120, help="words per synthetic reply")
+    parser.add_argument("--reruns", type=int, default=5, help="timed reruns per configuration")
+    parser.add_argument("--timeout", type=float, default=300.0, help="seconds allowed per script run")
+    parser.add_argument("--output", default="bench_rerun.json", help="where to write the JSON results")
+    args = parser.parse_args()
+    output = os.path.abspath(args.output)
+    app_path = os.path.abspath(args.app)
+
+    provider = MockProvider(MockConfig(ttft=0.0, chunk_delay=0.0)).start()
+    os.chdir(tempfile.mkdtemp(prefix="bench_rerun_"))
+    os.environ.update(GOOGLE_GEMINI_BASE_URL=provider.url, WORLD_URL="", OPENING_POOL_DEPTH="0")
+    meter = PayloadMeter()
+    image = scene_image((768, 320)) if args.images else None
+
+    results = []
+    print(f"{'turns':>6} {'history':>10} {'rerun p50':>10} {'max':>8} {'elements':>9} {'KiB sent':>9}")
+    for turns in args.turns:
+        for page_size in (args.page_size, RENDER_ALL):
+            result = measure(app_path, turns, page_size, args, meter, image)
+            results.append(result)
+            label = "all" if result["page_size"] is None else f"last {page_size}"
+            print(f"{turns:>6} {label:>10} {result['rerun_p50'] * 1000:10.1f} {result['rerun_max'] * 1000:8.1f} "
+                  f"{result['elements']:>9.0f} {result['bytes'] / 1024:9.1f}")
+            if result["exception"]:
+                print(f"       exception: {result['exception']}")
+    provider.stop()
+    print("(rerun times in ms)")
+
+    report = {
+        "config": {key: value for key, value in vars(args).items() if key != "output"},
+        "environment": {"python": platform.python_version(), "platform": platform.platform(),
+                        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S")},
+        "results": results,
+    }
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+# Memory per player session: list-of-dicts state vs. the compact session store
+#
+# Builds N synthetic sessions of T turns, with a scene image on every
+# --image-every'th reply, in three layouts and reports the memory held per
+# session:
+#
+#   legacy    - messages as a list of dicts, scene images as decoded PIL images
+#   compact   - PlayerState: array-backed MessageStore, images as encoded bytes
+#   spilled   - the same sessions after the idle sweep moved them to SQLite
+#
+# Python allocations, message text included, are measured with tracemalloc.
+# Pillow allocates decoded bitmaps outside the Python heap, so the legacy layout
+# does not materialize them; their size is added from each image's dimensions
+# and mode instead. Spill and reload times per session and the SQLite bytes per
+# session are reported too:
+#
+#   python benchmarks/bench_session_memory.py --sessions 100 --turns 100
+import argparse
+import gc
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from session_store import MessageStore, SessionStore  # noqa: E402
+
+_FILLER = ("the station hums with neon light as traders haggle over shimmering relics while drones "
+           "drift between hydroponic towers and a distant reactor pulses beneath the dome ").split()
+
+
+def scene_image(size, seed):
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    gradient = Image.linear_gradient("L").resize(size)
+    noise = Image.effect_noise(size, 24 + seed % 16)
+    image = Image.merge("RGB", (gradient, noise, Image.radial_gradient("L").resize(size)))
+    image.save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def reply_text(words, seed):
+    return " ".join(_FILLER[(seed + i) % len(_FILLER)] for i in range(words))
+
+
+def session_content(session, args, image):
+    """Messages and {message_index: encoded image} for one synthetic session."""
+    messages = [{"role": "system", "content": "You are a Dungeon Master for a text-based RPG."},
+                {"role": "assistant", "content": reply_text(args.words, session)}]
+    images = {}
+    for turn in range(args.turns):
+        messages.append({"role": "user", "content": f"Explore the next corridor ({session}/{turn})"})
+        messages.append({"role": "assistant", "content": reply_text(args.words, session + turn)})
+        if args.image_every and turn % args.image_every == 0:
+            images[len(messages) - 1] = bytes(bytearray(image))  # one object per generated image
+    return messages, images
+
+
+def traced(build):
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = build()
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return result, used
+
+
+def build_legacy(args, image):
+    from PIL import Image
+
+    sessions = []
+    decoded = 0
+    for session in range(args.sessions):
+        messages, images = session_content(session, args, image)
+        pictures = {}
+        for index, data in images.items():
+            picture = Image.open(io.BytesIO(data))  # header only: the bitmap is counted, not decoded
+            decoded += picture.width * picture.height * len(picture.getbands())
+            pictures[index] = (picture.size, "Scene illustration")
+        sessions.append({"messages": messages, "message_images": pictures})
+    return sessions, decoded
+
+
+def build_compact(store, args, image):
+    states = []
+    for session in range(args.sessions):
+        messages, images = session_content(session, args, image)
+        state = store.create(f"session-{session}")
+        state.world_id = "world"
+        state.messages = MessageStore(messages)
+        state.message_images = {index: (data, "Scene illustration") for index, data in images.items()}
+        store.release(state)
+        states.append(state)
+    return states
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memory per player session")
+    parser.add_argument("--sessions", type=int, default=100, help="concurrent sessions")
+    parser.add_argument("--turns", type=int, default=100, help="turns per session")
+    parser.add_argument("--words", type=int, default=120, help="words per reply")
+    parser.add_argument("--image-every", type=int, default=10, help="attach a scene image every N turns (0 for none)")
+    parser.add_argument("--image-size", type=int, nargs=2, default=[768, 320], metavar=("WIDTH", "HEIGHT"))
+    parser.add_argument("--output", default="bench_session_memory.json", help="where to write the JSON results")
+    args = parser.parse_args()
+
+    image = scene_image(tuple(args.image_size), 0)
+
+    (legacy, decoded), legacy_heap = traced(lambda: build_legacy(args, image))
+    del legacy
+
+    path = os.path.join(tempfile.mkdtemp(prefix="bench_sessions_"), "sessions.sqlite3")
+    store = SessionStore(path, resolve_world=lambda world_id: None, idle_seconds=0.0, sweep_seconds=3600)
+    gc.collect()
+    tracemalloc.start()  # one trace across build and spill, so memory freed by the spill is seen
+    before = tracemalloc.get_traced_memory()[0]
+    states = build_compact(store, args, image)
+    gc.collect()
+    compact_heap = tracemalloc.get_traced_memory()[0] - before
+    start = time.perf_counter()
+    store.sweep()
+    spill_time = time.perf_counter() - start
+    gc.collect()
+    spilled_heap = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    db_bytes = os.path.getsize(path)
+
+    start = time.perf_counter()
+    for state in states:
+        store.activate(state)
+    reload_time = time.perf_counter() - start
+
+    per_session = {
+        "legacy": (legacy_heap + decoded) / args.sessions,
+        "legacy_heap": legacy_heap / args.sessions,
+        "compact": compact_heap / args.sessions,
+        "spilled": spilled_heap / args.sessions,
+    }
+    print(f"\n{args.sessions} sessions x {args.turns} turns, image every {args.image_every} turns")
+    print(f"{'layout':<10} {'KiB/session':>12}")
+    print(f"{'legacy':<10} {per_session['legacy'] / 1024:12.1f}  "
+          f"({per_session['legacy_heap'] / 1024:.1f} KiB Python heap + decoded bitmaps)")
+    print(f"{'compact':<10} {per_session['compact'] / 1024:12.1f}")
+    print(f"{'spilled':<10} {per_session['spilled'] / 1024:12.1f}")
+    print(f"spill {spill_time / args.sessions * 1000:.2f} ms/session, "
+          f"reload {reload_time / args.sessions * 1000:.2f} ms/session, "
+          f"SQLite {db_bytes / args.sessions / 1024:.1f} KiB/session")
+
+    report = {
+        "config": {key: value for key, value in vars(args).items() if key != "output"},
+        "environment": {"python": platform.python_version(), "platform": platform.platform(),
+                        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S")},
+        "bytes_per_session": per_session,
+        "spill_seconds_per_session": spill_time / args.sessions,
+        "reload_seconds_per_session": reload_time / args.sessions,
+        "sqlite_bytes_per_session": db_bytes / args.sessions,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"results written to {os.path.abspath(args.output)}")
+
+
+if __name__ == "__main__":
+    main()
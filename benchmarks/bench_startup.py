@@ -0,0 +1,182 @@
+# Cold-start benchmark: import time and time to first paint of app.py
+#
+# Each trial starts a fresh interpreter (under -X importtime) that runs the app
+# once through Streamlit's AppTest harness against the local mock provider and
+# reports:
+#
+#   first paint  - time from the start of the script run until the header image
+#                  is sent to the browser
+#   first run    - time until the whole first script run (opening scene included)
+#                  has finished
+#   imports      - import time of the heavy third-party packages, and
+#                  whether each one was loaded at all
+#
+# Results are saved as JSON and can be compared with a previous run, e.g. of an
+# older checkout passed with --app:
+#
+#   python benchmarks/bench_startup.py --app /tmp/old/app.py --output before.json
+#   python benchmarks/bench_startup.py --output after.json --compare before.json
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_PATH = os.path.join(os.path.dirname(BENCH_DIR), "app.py")
+
+HEAVY_PACKAGES = ["openai", "google.genai", "httpx", "requests", "PIL.Image"]
+
+
+def child(app_path, timeout):
+    """Runs inside the fresh interpreter; prints one JSON line with the timings."""
+    start = time.perf_counter()
+    from streamlit.runtime.scriptrunner_utils.script_run_context import ScriptRunContext
+    from streamlit.testing.v1 import AppTest
+    streamlit_import = time.perf_counter() - start
+
+    painted = []
+    original_enqueue = ScriptRunContext.enqueue
+
+    def enqueue(self, msg):
+        if not painted and msg.HasField("delta") and msg.delta.new_element.WhichOneof("type") == "imgs":
+            painted.append(time.perf_counter())
+        return original_enqueue(self, msg)
+
+    ScriptRunContext.enqueue = enqueue
+    at = AppTest.from_file(app_path, default_timeout=timeout)
+    run_start = time.perf_counter()
+    at.run()
+    first_run = time.perf_counter() - run_start
+    print(json.dumps({
+        "streamlit_import": streamlit_import,
+        "first_paint": painted[0] - run_start if painted else None,
+        "first_run": first_run,
+        "loaded": [name for name in HEAVY_PACKAGES if name in sys.modules],
+        "exception": at.exception[0].message if at.exception else None,
+    }))
+
+
+def parse_importtime(stderr):
+    """Import seconds of each heavy package (its own modules only) from -X importtime output.
+
+    Self times are summed per package because imports running in background
+    threads interleave in the output, which breaks the cumulative column.
+    """
+    times = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_time, _, name = line[len("import time:"):].split("|")
+        name = name.strip()
+        if not self_time.strip().isdigit():
+            continue
+        for package in HEAVY_PACKAGES:
+            if name == package or name.startswith(package + "."):
+                times[package] = times.get(package, 0.0) + int(self_time) / 1e6
+    return times
+
+
+def run_trial(args, workdir, env):
+    command = [sys.executable, "-X", "importtime", os.path.abspath(__file__),
+               "--child", "--app", os.path.abspath(args.app), "--timeout", str(args.timeout)]
+    completed = subprocess.run(command, cwd=workdir, env=env, capture_output=True, text=True)
+    lines = [line for line in completed.stdout.splitlines() if line.startswith("{")]
+    if completed.returncode or not lines:
+        raise RuntimeError(f"trial failed: {completed.stderr[-2000:]}")
+    result = json.loads(lines[-1])
+    result["imports"] = parse_importtime(completed.stderr)
+    return result
+
+
+def summarize(trials):
+    def median(key):
+        values = [trial[key] for trial in trials if trial.get(key) is not None]
+        return statistics.median(values) if values else None
+
+    return {
+        "trials": len(trials),
+        "streamlit_import": median("streamlit_import"),
+        "first_paint": median("first_paint"),
+        "first_run": median("first_run"),
+        "imports": {name: statistics.median(trial["imports"].get(name, 0.0) for trial in trials)
+                    for name in HEAVY_PACKAGES},
+        "loaded": sorted({name for trial in trials for name in trial["loaded"]}),
+        "exceptions": sorted({trial["exception"] for trial in trials if trial["exception"]}),
+    }
+
+
+def print_report(summary, previous=None):
+    def fmt(value):
+        return "       -" if value is None else f"{value * 1000:8.1f}"
+
+    old = (previous or {}).get("summary", {})
+    print(f"\n{'':<18} {'now':>8} {'previous':>8}")
+    for key in ("streamlit_import", "first_paint", "first_run"):
+        print(f"{key:<18} {fmt(summary[key])} {fmt(old.get(key)) if old else ''}")
+    for name in HEAVY_PACKAGES:
+        loaded = "" if name in summary["loaded"] else " (not loaded)"
+        previous_time = fmt(old.get("imports", {}).get(name)) if old else ""
+        print(f"import {name:<11} {fmt(summary['imports'][name])} {previous_time}{loaded}")
+    for message in summary["exceptions"]:
+        print(f"exception: {message}")
+    print(f"(median of {summary['trials']} cold starts, in ms)")
+
+
+def main():
+    sys.path.insert(0, BENCH_DIR)
+    from mock_provider import MockProvider, add_arguments, config_from_args
+
+    parser = argparse.ArgumentParser(description="Cold-start import time and time-to-first-paint benchmark")
+    parser.add_argument("--app", default=APP_PATH, help="app.py to measure (e.g. from an older checkout)")
+    parser.add_argument("--runs", type=int, default=5, help="cold starts to measure")
+    parser.add_argument("--timeout", type=float, default=120.0, help="seconds allowed for the first script run")
+    parser.add_argument("--output", default="bench_startup.json", help="where to write the JSON results")
+    parser.add_argument("--compare", help="previous results JSON to compare against")
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    provider = MockProvider(config_from_args(args)).start()
+    workdir = tempfile.mkdtemp(prefix="bench_startup_")
+    os.makedirs(os.path.join(workdir, ".streamlit"))
+    with open(os.path.join(workdir, ".streamlit", "secrets.toml"), "w") as f:
+        f.write('GEMINI_API_KEY = "mock-key"\nDEEPSEEK_API_KEY = "mock-key"\n')
+    env = dict(os.environ, GOOGLE_GEMINI_BASE_URL=provider.url, DEEPSEEK_BASE_URL=f"{provider.url}/v1",
+               WORLD_URL="", OPENING_POOL_DEPTH="0")
+
+    trials = [run_trial(args, workdir, env) for _ in range(args.runs)]
+    provider.stop()
+
+    summary = summarize(trials)
+    report = {
+        "config": {"app": os.path.abspath(args.app), "runs": args.runs, "ttft": args.ttft},
+        "environment": {"python": platform.python_version(), "platform": platform.platform(),
+                        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S")},
+        "summary": summary,
+        "trials": trials,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    previous = None
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+    print_report(summary, previous)
+    print(f"results written to {os.path.abspath(args.output)}")
+
+
+if __name__ == "__main__":
+    if "--child" in sys.argv:
+        child_parser = argparse.ArgumentParser()
+        child_parser.add_argument("--child", action="store_true")
+        child_parser.add_argument("--app", required=True)
+        child_parser.add_argument("--timeout", type=float, default=120.0)
+        child_args = child_parser.parse_args()
+        child(child_args.app, child_args.timeout)
+    else:
+        main()
@@ -0,0 +1,226 @@
+# End-to-end turn latency benchmark against the local mock provider
+#
+# Runs 1..N concurrent scripted sessions of app.py through Streamlit's AppTest
+# harness, with the mock provider standing in for Gemini / DeepSeek, and reports
+# p50/p95/p99 turn latency, time to first token, prompt-build time and memory
+# per session. Results are saved as JSON and can be compared with a previous run:
+#
+#   python benchmarks/bench_turns.py --sessions 1 4 8 --output after.json --compare before.json
+import argparse
+import gc
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+APP_PATH = os.path.join(REPO_DIR, "app.py")
+sys.path.insert(0, BENCH_DIR)
+
+from mock_provider import MockProvider, add_arguments, config_from_args  # noqa: E402
+
+SCRIPT = [
+    "Look around the enclave for anything unusual.",
+    "Talk to Nalani about the hidden gardens.",
+    "inventory",
+    "Ask Nalani what the plants have been whispering about lately.",
+    "go to Verdant Spire",
+    "Climb toward the glowing Tree of Elyria and examine its roots.",
+    "who is here",
+    "Search the Elyrian Academy library for records of the Great Illumination.",
+]
+
+PROVIDERS = {"gemini": "Google Gemini Flash 3", "deepseek": "Deepseek Chat"}
+
+
+def percentiles(values):
+    if not values:
+        return None
+    ordered = sorted(values)
+
+    def pick(q):
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    return {"p50": pick(0.50), "p95": pick(0.95), "p99": pick(0.99),
+            "mean": statistics.fmean(ordered), "count": len(ordered)}
+
+
+def prepare_environment(provider_url, workdir, args):
+    # Keys live in a throwaway secrets.toml: AppTest swaps st.secrets globally, which is not thread-safe
+    os.makedirs(os.path.join(workdir, ".streamlit"), exist_ok=True)
+    with open(os.path.join(workdir, ".streamlit", "secrets.toml"), "w") as f:
+        f.write('GEMINI_API_KEY = "mock-key"\nDEEPSEEK_API_KEY = "mock-key"\n')
+    os.chdir(workdir)
+    os.environ["GOOGLE_GEMINI_BASE_URL"] = provider_url
+    os.environ["DEEPSEEK_BASE_URL"] = f"{provider_url}/v1"
+    os.environ["WORLD_URL"] = ""  # no remote world revalidation during the run
+    os.environ["OPENING_POOL_DEPTH"] = str(args.opening_pool_depth)
+
+
+def new_session(args):
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(APP_PATH, default_timeout=args.timeout)
+    start = time.perf_counter()
+    at.run()
+    startup = time.perf_counter() - start
+    settings = {checkbox.label: checkbox for checkbox in at.sidebar.checkbox}
+    at.sidebar.selectbox[0].select(PROVIDERS[args.provider])
+    settings["Enable Scene Images"].set_value(args.images)
+    settings["Stream Responses"].set_value(not args.no_stream)
+    at.run()
+    return at, startup
+
+
+def play_session(args, results, lock):
+    try:
+        at, startup = new_session(args)
+    except Exception as e:
+        with lock:
+            results["errors"].append(f"startup: {e}")
+        return
+    samples = {"startup": [startup], "turn": [], "ttft": [], "prompt_build": []}
+    for turn in range(args.turns):
+        command = SCRIPT[turn % len(SCRIPT)]
+        previous_stats = len(at.session_state["turn_stats"]) if "turn_stats" in at.session_state else 0
+        start = time.perf_counter()
+        at.chat_input[0].set_value(command).run()
+        samples["turn"].append(time.perf_counter() - start)
+        if at.exception:
+            with lock:
+                results["errors"].append(f"turn {turn}: {at.exception[0].message}")
+        if "turn_stats" in at.session_state and len(at.session_state["turn_stats"]) > previous_stats:
+            stats = at.session_state["turn_stats"][-1]
+            if stats.get("ttft") is not None:
+                samples["ttft"].append(stats["ttft"])
+            if stats.get("prompt_build") is not None:
+                samples["prompt_build"].append(stats["prompt_build"])
+        reply = at.session_state["player"].messages[-1]["content"]
+        if reply.startswith("Error:"):
+            with lock:
+                results["errors"].append(f"turn {turn}: {reply[:120]}")
+    with lock:
+        for name, values in samples.items():
+            results[name].extend(values)
+        results["sessions"].append(at)
+
+
+def run_level(concurrency, args):
+    results = {"startup": [], "turn": [], "ttft": [], "prompt_build": [], "errors": [], "sessions": []}
+    lock = threading.Lock()
+    threads = [threading.Thread(target=play_session, args=(args, results, lock)) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    turns = len(results["turn"])
+    return {
+        "sessions": concurrency,
+        "turns": turns,
+        "wall_time": elapsed,
+        "throughput_turns_per_s": turns / elapsed if elapsed else 0.0,
+        "startup": percentiles(results["startup"]),
+        "turn_latency": percentiles(results["turn"]),
+        "ttft": percentiles(results["ttft"]),
+        "prompt_build": percentiles(results["prompt_build"]),
+        "errors": results["errors"][:20],
+        "error_count": len(results["errors"]),
+    }
+
+
+def measure_memory(args, sessions=4):
+    """Average traced Python memory held per live session after playing the script."""
+    gc.collect()
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    results = {"startup": [], "turn": [], "ttft": [], "prompt_build": [], "errors": [], "sessions": []}
+    lock = threading.Lock()
+    for _ in range(sessions):
+        play_session(args, results, lock)
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+    return used / max(1, len(results["sessions"]))
+
+
+def print_report(report, previous=None):
+    def fmt(block, key="p50"):
+        return "-" if not block else f"{block[key] * 1000:8.1f}"
+
+    print(f"\nprovider={report['config']['provider']} images={report['config']['images']} "
+          f"stream={not report['config']['no_stream']} turns/session={report['config']['turns']}")
+    print(f"{'sessions':>8} {'turn p50':>9} {'p95':>8} {'p99':>8} {'ttft p50':>9} {'p95':>8} "
+          f"{'prompt p50':>10} {'turns/s':>8} {'errors':>6}")
+    old_levels = {level["sessions"]: level for level in (previous or {}).get("levels", [])}
+    for level in report["levels"]:
+        print(f"{level['sessions']:>8} {fmt(level['turn_latency'])} {fmt(level['turn_latency'], 'p95')} "
+              f"{fmt(level['turn_latency'], 'p99')} {fmt(level['ttft'])} {fmt(level['ttft'], 'p95')} "
+              f"{fmt(level['prompt_build']):>10} {level['throughput_turns_per_s']:8.2f} {level['error_count']:>6}")
+        old = old_levels.get(level["sessions"])
+        if old and old.get("turn_latency") and level.get("turn_latency"):
+            delta = (level["turn_latency"]["p50"] - old["turn_latency"]["p50"]) * 1000
+            delta95 = (level["turn_latency"]["p95"] - old["turn_latency"]["p95"]) * 1000
+            print(f"{'':>8} vs previous: turn p50 {delta:+.1f} ms, p95 {delta95:+.1f} ms")
+    throttled = sum(count for key, count in report.get("provider_requests", {}).items() if key.startswith("throttled:"))
+    if throttled:
+        print(f"requests answered 429 by the provider quota: {throttled}")
+    if report.get("memory_per_session_bytes") is not None:
+        print(f"memory per session: {report['memory_per_session_bytes'] / 1024:.1f} KiB")
+    print("(latencies in ms)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end turn latency benchmark")
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 2, 4], help="concurrency levels to run")
+    parser.add_argument("--turns", type=int, default=8, help="scripted turns per session")
+    parser.add_argument("--provider", choices=sorted(PROVIDERS), default="gemini")
+    parser.add_argument("--images", action="store_true", help="enable scene images")
+    parser.add_argument("--no-stream", action="store_true", help="use the blocking reply path")
+    parser.add_argument("--opening-pool-depth", type=int, default=0, help="pre-generated openings per key")
+    parser.add_argument("--memory-sessions", type=int, default=4, help="sessions for the memory pass (0 to skip)")
+    parser.add_argument("--timeout", type=float, default=120.0, help="seconds allowed per script run")
+    parser.add_argument("--output", default="bench_turns.json", help="where to write the JSON results")
+    parser.add_argument("--compare", help="previous results JSON to compare against")
+    add_arguments(parser)
+    args = parser.parse_args()
+    output = os.path.abspath(args.output)
+    compare = os.path.abspath(args.compare) if args.compare else None
+
+    provider = MockProvider(config_from_args(args)).start()
+    workdir = tempfile.mkdtemp(prefix="bench_turns_")
+    prepare_environment(provider.url, workdir, args)
+
+    levels = [run_level(concurrency, args) for concurrency in args.sessions]
+    memory = measure_memory(args, args.memory_sessions) if args.memory_sessions else None
+    provider.stop()
+
+    report = {
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        "environment": {"python": platform.python_version(), "platform": platform.platform(),
+                        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S")},
+        "levels": levels,
+        "memory_per_session_bytes": memory,
+        "provider_requests": dict(provider.requests),
+    }
+    report["config"]["failing_model"] = list(report["config"]["failing_model"] or [])
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    previous = None
+    if compare:
+        with open(compare) as f:
+            previous = json.load(f)
+    print_report(report, previous)
+    print(f"results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+# Micro-benchmark: world load time, memory and lookup latency, JSON world vs compiled world index
+#
+#   python benchmarks/bench_world_index.py --sizes 100x100 200x100
+import argparse
+import gc
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from commands import find_town as find_town_in_dict  # noqa: E402
+from synthetic_world import make_world  # noqa: E402
+from world_index import compile_world, location_description, open_world, world_lore  # noqa: E402
+from world_loader import validate_world, world_id  # noqa: E402
+
+LOOKUPS = 2000
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, (time.perf_counter() - start) * 1000
+
+
+def loaded(fn):
+    """(result, milliseconds, traced bytes still held) of loading a world with `fn`."""
+    gc.collect()
+    _, ms = timed(fn)  # timed without tracing, which slows allocation-heavy code down
+    gc.collect()
+    tracemalloc.start()
+    result = fn()
+    held = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, ms, held
+
+
+def latency(fn, args):
+    samples = []
+    for arg in args:
+        start = time.perf_counter()
+        fn(*arg)
+        samples.append((time.perf_counter() - start) * 1e6)
+    samples.sort()
+    return f"p50 {statistics.median(samples):8.1f} us  p95 {samples[int(0.95 * len(samples))]:8.1f} us"
+
+
+def load_json(path):
+    with open(path, encoding="utf-8") as f:
+        world = validate_world(json.load(f))
+    world_id(world)  # WorldLoader hashes every version it serves
+    return world
+
+
+def bench(stations, towns_per_station, npcs_per_town, workdir):
+    world = make_world(stations, towns_per_station, npcs_per_town)
+    json_path = os.path.join(workdir, f"world-{stations}x{towns_per_station}.json")
+    index_path = json_path[:-5] + ".idx"
+    with open(json_path, "w", encoding="utf-8") as f:
+        json.dump(world, f)
+    _, compile_ms = timed(lambda: compile_world(world, index_path))
+    del world
+
+    plain, json_ms, json_bytes = loaded(lambda: load_json(json_path))
+    compiled, open_ms, open_bytes = loaded(lambda: open_world(index_path))
+    towns = sum(len(station["towns"]) for station in plain["stations"].values())
+    print(f"\n{stations} stations x {towns_per_station} towns = {towns} towns, {npcs_per_town} NPCs each")
+    print(f"  file         JSON {os.path.getsize(json_path) / 2**20:8.1f} MiB    index {os.path.getsize(index_path) / 2**20:8.1f} MiB"
+          f"  (compiled once in {compile_ms:.0f} ms)")
+    print(f"  load         JSON {json_ms:8.1f} ms       index {open_ms:8.1f} ms")
+    print(f"  memory held  JSON {json_bytes / 2**20:8.1f} MiB    index {open_bytes / 2**20:8.1f} MiB")
+
+    _, lore_json_ms, lore_json_bytes = loaded(lambda: world_lore(plain))
+    _, lore_index_ms, lore_index_bytes = loaded(lambda: open_world(index_path).lore())
+    print(f"  lore index   JSON {lore_json_ms:8.1f} ms       index {lore_index_ms:8.1f} ms  (built vs read, incl. opening)")
+    print(f"  lore memory  JSON {lore_json_bytes / 2**20:8.1f} MiB    index {lore_index_bytes / 2**20:8.1f} MiB")
+
+    rng = random.Random(1)
+    visits = [(station, rng.choice(list(plain["stations"][station]["towns"])))
+              for station in rng.choices(list(plain["stations"]), k=LOOKUPS)]
+    first_visits = [(station, next(iter(compiled.towns(station)))) for station in compiled["stations"]]
+    print(f"  first visit of a station (parse)   {latency(lambda s, t: compiled.fragments(s, t), first_visits)}")
+    print(f"  location text, JSON (built)        {latency(lambda s, t: location_description(plain['stations'][s]['towns'][t]), visits)}")
+    print(f"  location text, index (stored)      {latency(lambda s, t: compiled.fragments(s, t), visits)}")
+    exact = visits[:200]
+    prefixes = [(station, town[:-1]) for station, town in visits[:200]]
+    print(f"  find town by name, JSON            {latency(lambda s, t: find_town_in_dict(plain, s, t), exact)}")
+    print(f"  find town by name, index           {latency(lambda s, t: compiled.find_town(s, t), exact)}")
+    print(f"  find town by prefix, JSON          {latency(lambda s, t: find_town_in_dict(plain, s, t), prefixes)}")
+    print(f"  find town by prefix, index         {latency(lambda s, t: compiled.find_town(s, t), prefixes)}")
+    queries = [(f"{town} {station} market",) for station, town in visits[:50]]
+    lore = (world_lore(plain), compiled.lore())
+    print(f"  lore search, JSON                  {latency(lambda q: lore[0].search(q, k=4, token_budget=400), queries)}")
+    print(f"  lore search, index                 {latency(lambda q: lore[1].search(q, k=4, token_budget=400), queries)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="World load and lookup benchmark, JSON vs compiled index")
+    parser.add_argument("--sizes", nargs="+", default=["100x100", "200x100"], help="STATIONSxTOWNS per station")
+    parser.add_argument("--npcs", type=int, default=3, help="NPCs per town")
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory(prefix="bench_world_index_") as workdir:
+        for size in args.sizes:
+            stations, towns = (int(part) for part in size.lower().split("x"))
+            bench(stations, towns, args.npcs, workdir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,292 @@
+# Local stand-in for the Gemini and OpenAI-compatible (DeepSeek) APIs
+#
+# Serves the request/response shapes the app uses, with configurable latency,
+# streaming, error injection, a rate-limit quota and image payloads, so turns can be measured
+# without real API keys:
+#
+#   python benchmarks/mock_provider.py --port 8765 --ttft 0.4 --chunk-delay 0.03
+#
+# Point the app at it with GOOGLE_GEMINI_BASE_URL=http://127.0.0.1:8765 and
+# DEEPSEEK_BASE_URL=http://127.0.0.1:8765/v1.
+import argparse
+import base64
+import io
+import json
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_WORDS = """
+the station hums with neon light as traders haggle over shimmering relics while drones drift
+between hydroponic towers and a distant reactor pulses beneath the dome your path winds past
+vine-wrapped walkways where hybrids whisper of vanished archives and the citadel watches
+""".split()
+
+
+class _QuietServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients closing keep-alive connections is normal, not worth a traceback
+        if isinstance(sys.exc_info()[1], ConnectionError):
+            return
+        super().handle_error(request, client_address)
+
+
+@dataclass
+class MockConfig:
+    ttft: float = 0.3                # seconds before the first byte of a text reply
+    chunk_delay: float = 0.02        # seconds between streamed chunks
+    chunks: int = 20                 # chunks per reply (words per chunk = words // chunks)
+    words: int = 120                 # words per reply
+    error_rate: float = 0.0          # fraction of requests answered with `error_status`
+    error_status: int = 503
+    failing_models: set = field(default_factory=set)  # models that always fail
+    quota_rpm: float = 0.0           # requests/min per model before answering 429 (0 for no quota)
+    quota_burst: float = 60.0        # seconds of quota that may be used at once
+    image_latency: float = 1.0       # seconds to "generate" an image
+    image_size: tuple = (768, 320)
+    image_format: str = "PNG"
+    seed: int = 0
+
+
+class MockProvider:
+    """Threaded HTTP server implementing the provider endpoints the app calls.
+
+    Gemini: POST /v1beta/models/<model>:generateContent and
+    :streamGenerateContent?alt=sse (image models return inline image data).
+    OpenAI-compatible: POST /v1/chat/completions with and without stream=True.
+    """
+
+    def __init__(self, config=None, host="127.0.0.1", port=0):
+        self.config = config or MockConfig()
+        self.requests = Counter()
+        self._rng = random.Random(self.config.seed)
+        self._lock = threading.Lock()
+        self._image_payload = None
+        self._quota = {}  # model -> (requests left, updated at)
+        self._server = _QuietServer((host, port), self._handler_class())
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="mock-provider", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def reply_text(self):
+        with self._lock:
+            return " ".join(self._rng.choice(_WORDS) for _ in range(self.config.words)).capitalize() + "."
+
+    def should_fail(self, model):
+        if model in self.config.failing_models:
+            return True
+        with self._lock:
+            return self._rng.random() < self.config.error_rate
+
+    def over_quota(self, model):
+        """Seconds until `model` has quota again, or None if this request is within it."""
+        if not self.config.quota_rpm:
+            return None
+        rate = self.config.quota_rpm / 60.0
+        capacity = max(1.0, rate * self.config.quota_burst)
+        with self._lock:
+            now = time.monotonic()
+            left, updated = self._quota.get(model, (capacity, now))
+            left = min(capacity, left + (now - updated) * rate)
+            if left < 1.0:
+                self._quota[model] = (left, now)
+                return (1.0 - left) / rate
+            self._quota[model] = (left - 1.0, now)
+            return None
+
+    def image_payload(self):
+        if self._image_payload is None:
+            from PIL import Image
+
+            width, height = self.config.image_size
+            image = Image.radial_gradient("L").resize((width, height)).convert("RGB")
+            buffer = io.BytesIO()
+            image.save(buffer, self.config.image_format)
+            self._image_payload = base64.b64encode(buffer.getvalue()).decode("ascii")
+        return self._image_payload
+
+    def _handler_class(self):
+        provider = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)) or 0)
+                request = json.loads(body or b"{}")
+                path = self.path.split("?")[0]
+                if path.endswith("/chat/completions"):
+                    self._openai(request)
+                elif ":generateContent" in path or ":streamGenerateContent" in path:
+                    model = path.rsplit("/", 1)[-1].split(":")[0]
+                    self._gemini(model, request, stream=":streamGenerateContent" in path)
+                else:
+                    self._json(404, {"error": {"code": 404, "message": f"Unknown path {path}"}})
+
+            # --- Gemini ---
+            def _gemini(self, model, request, stream):
+                provider.requests[f"gemini:{model}:{'stream' if stream else 'unary'}"] += 1
+                if self._throttled(model):
+                    return
+                if provider.should_fail(model):
+                    return self._error("UNAVAILABLE")
+                modalities = [m.lower() for m in request.get("generationConfig", {}).get("responseModalities", [])]
+                if "image" in model or "image" in modalities:
+                    time.sleep(provider.config.image_latency)
+                    mime = f"image/{provider.config.image_format.lower()}"
+                    part = {"inlineData": {"mimeType": mime, "data": provider.image_payload()}}
+                    return self._json(200, {"candidates": [{"content": {"role": "model", "parts": [part]}}]})
+                time.sleep(provider.config.ttft)
+                if not stream:
+                    parts = [{"text": provider.reply_text()}]
+                    return self._json(200, {"candidates": [{"content": {"role": "model", "parts": parts}, "finishReason": "STOP"}]})
+                self._start_stream()
+                for piece in self._pieces(provider.reply_text()):
+                    chunk = {"candidates": [{"content": {"role": "model", "parts": [{"text": piece}]}}]}
+                    self._chunk(b"data: " + json.dumps(chunk).encode() + b"\r\n\r\n")
+                    time.sleep(provider.config.chunk_delay)
+                self._end_stream()
+
+            # --- OpenAI-compatible ---
+            def _openai(self, request):
+                model = request.get("model", "mock")
+                stream = bool(request.get("stream"))
+                provider.requests[f"openai:{model}:{'stream' if stream else 'unary'}"] += 1
+                if self._throttled(model):
+                    return
+                if provider.should_fail(model):
+                    return self._error("Service unavailable")
+                time.sleep(provider.config.ttft)
+                created = int(time.time())
+                if not stream:
+                    message = {"role": "assistant", "content": provider.reply_text()}
+                    return self._json(200, {
+                        "id": "mock-completion", "object": "chat.completion", "created": created, "model": model,
+                        "choices": [{"index": 0, "message": message, "finish_reason": "stop"}],
+                    })
+                self._start_stream()
+                for piece in self._pieces(provider.reply_text()):
+                    chunk = {"id": "mock-completion", "object": "chat.completion.chunk", "created": created, "model": model,
+                             "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]}
+                    self._chunk(b"data: " + json.dumps(chunk).encode() + b"\n\n")
+                    time.sleep(provider.config.chunk_delay)
+                self._chunk(b"data: [DONE]\n\n")
+                self._end_stream()
+
+            # --- Helpers ---
+            def _pieces(self, text):
+                words = text.split(" ")
+                size = max(1, len(words) // max(1, provider.config.chunks))
+                for i in range(0, len(words), size):
+                    yield " ".join(words[i:i + size]) + " "
+
+            def _error(self, message):
+                status = provider.config.error_status
+                self._json(status, {"error": {"code": status, "message": message, "status": message}})
+
+            def _throttled(self, model):
+                retry_after = provider.over_quota(model)
+                if retry_after is None:
+                    return False
+                provider.requests[f"throttled:{model}"] += 1
+                self._json(429, {"error": {"code": 429, "message": "Resource has been exhausted (e.g. check quota).",
+                                           "status": "RESOURCE_EXHAUSTED"}},
+                           headers={"Retry-After": f"{retry_after:.3f}"})
+                return True
+
+            def _json(self, status, payload, headers=None):
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _start_stream(self):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+
+            def _chunk(self, data):
+                self.wfile.write(f"{len(data):X}\r\n".encode() + data + b"\r\n")
+                self.wfile.flush()
+
+            def _end_stream(self):
+                self.wfile.write(b"0\r\n\r\n")
+                self.wfile.flush()
+
+        return Handler
+
+
+def config_from_args(args):
+    return MockConfig(
+        ttft=args.ttft,
+        chunk_delay=args.chunk_delay,
+        chunks=args.chunks,
+        words=args.words,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        failing_models=set(args.failing_model or []),
+        image_latency=args.image_latency,
+        quota_rpm=args.quota_rpm,
+        quota_burst=args.quota_burst,
+    )
+
+
+def add_arguments(parser):
+    parser.add_argument("--ttft", type=float, default=0.3, help="seconds before the first text byte")
+    parser.add_argument("--chunk-delay", type=float, default=0.02, help="seconds between streamed chunks")
+    parser.add_argument("--chunks", type=int, default=20, help="chunks per streamed reply")
+    parser.add_argument("--words", type=int, default=120, help="words per reply")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests that fail")
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--failing-model", action="append", help="model that always fails (repeatable)")
+    parser.add_argument("--image-latency", type=float, default=1.0, help="seconds to produce an image")
+    parser.add_argument("--quota-rpm", type=float, default=0.0, help="requests/min per model before 429s (0 for none)")
+    parser.add_argument("--quota-burst", type=float, default=60.0, help="seconds of quota usable at once")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stand-in for the Gemini and OpenAI-compatible APIs")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    add_arguments(parser)
+    args = parser.parse_args()
+    server = MockProvider(config_from_args(args), host=args.host, port=args.port)
+    print(f"Mock provider listening on {server.url}")
+    server.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
@@ -0,0 +1,42 @@
+# Generates large synthetic worlds in the aurora_nexus_world.json format for benchmarks
+import random
+
+_ROOTS = """
+orbital market neon spire hydroponic reactor archive smuggler engineer botanist oracle drone
+citadel canopy vault relay beacon nebula crystal forge harbor dome cyborg hybrid signal memory
+circuit garden ocean tunnel docking lantern glacier echo mirror temple ruin shard quantum bazaar
+""".split()
+_SUFFIXES = ["", "s", "er", "ing", "ite", "ian", "ward", "craft", "line", "core"]
+# A few thousand distinct words so term frequencies look like real prose rather than a tiny vocabulary
+_WORDS = [f"{root}{suffix}{n or ''}" for root in _ROOTS for suffix in _SUFFIXES for n in range(10)]
+
+
+def _sentence(rng, length):
+    return " ".join(rng.choice(_WORDS) for _ in range(length)).capitalize() + "."
+
+
+def make_world(stations=50, towns_per_station=20, npcs_per_town=3, seed=0):
+    """A world with stations * towns_per_station towns and npcs_per_town NPCs in each."""
+    rng = random.Random(seed)
+    world = {
+        "name": "Synthetic Nexus",
+        "description": _sentence(rng, 40),
+        "stations": {},
+    }
+    for s in range(stations):
+        station_name = f"Station {s}"
+        towns = {}
+        for t in range(towns_per_station):
+            town_name = f"Town {s}-{t}"
+            npcs = {
+                f"npc_{n}": {"name": f"Resident {s}-{t}-{n}", "description": _sentence(rng, 30)}
+                for n in range(npcs_per_town)
+            }
+            towns[town_name] = {"name": town_name, "description": _sentence(rng, 50), "npcs": npcs}
+        world["stations"][station_name] = {
+            "name": station_name,
+            "description": _sentence(rng, 50),
+            "world": world["name"],
+            "towns": towns,
+        }
+    return world
@@ -0,0 +1,76 @@
+# Deterministic parsing of simple player commands that need no LLM call
+import re
+from collections import namedtuple
+
+Command = namedtuple("Command", ["action", "target"])
+
+_FILLER = re.compile(r"\b(please|my|the|a|an)\b")
+
+_EXACT = {
+    "inventory": "inventory", "inv": "inventory", "i": "inventory",
+    "check inventory": "inventory", "show inventory": "inventory", "look in inventory": "inventory",
+    "what am i carrying": "inventory", "what do i have": "inventory",
+    "look": "look", "l": "look", "look around": "look", "where am i": "look",
+    "describe location": "look", "describe surroundings": "look",
+    "who is here": "who", "whos here": "who", "who": "who", "who is around": "who",
+    "who else is here": "who", "list npcs": "who",
+}
+
+_WITH_TARGET = [
+    (re.compile(r"^(?:go|travel|walk|head|move|fly)(?: over| back)?(?: to| towards?)? (?P<target>.+)$"), "go"),
+    (re.compile(r"^(?:drop|discard|throw away) (?P<target>.+)$"), "drop"),
+]
+
+
+def normalize(text):
+    text = text.lower().replace("'", "")
+    text = re.sub(r"[^a-z0-9\s-]", " ", text)
+    text = _FILLER.sub(" ", text)
+    return " ".join(text.split())
+
+
+def parse_command(text):
+    """Return a Command for simple, unambiguous commands, or None for anything else."""
+    normalized = normalize(text)
+    if not normalized:
+        return None
+    action = _EXACT.get(normalized)
+    if action:
+        return Command(action, None)
+    for pattern, action in _WITH_TARGET:
+        match = pattern.match(normalized)
+        if match:
+            return Command(action, match.group("target"))
+    return None
+
+
+def find_town(world_data, current_station, name):
+    """Resolve a town or station name to (station, town), preferring the current station.
+
+    Matches exact names first, then unique prefixes. A station name resolves to
+    its first town. Returns None if nothing (or more than one town) matches.
+    """
+    wanted = normalize(name)
+    stations = world_data["stations"]
+    ordered = [current_station] + [s for s in stations if s != current_station]
+    towns = [(station, town) for station in ordered for town in stations[station]["towns"]]
+
+    for station, town in towns:
+        if normalize(town) == wanted:
+            return station, town
+    for station in ordered:
+        if normalize(station) == wanted and stations[station]["towns"]:
+            return station, next(iter(stations[station]["towns"]))
+    prefixed = [(station, town) for station, town in towns if normalize(town).startswith(wanted)]
+    if len(prefixed) == 1:
+        return prefixed[0]
+    return None
+
+
+def find_item(inventory, name):
+    """Return the inventory key matching `name` case-insensitively, or None."""
+    wanted = normalize(name)
+    for item in inventory:
+        if normalize(item) == wanted:
+            return item
+    return None
@@ -0,0 +1,127 @@
+# Token-budgeted conversation context with a rolling summary of older turns
+import re
+
+DEFAULT_TOKEN_BUDGET = 3000
+DEFAULT_SUMMARY_EVERY = 5
+SUMMARY_SENTENCE_CHARS = 160  # cap on each summarised line
+
+
+def estimate_tokens(text):
+    """Cheap local token estimate (~4 characters per token for English prose)."""
+    if not text:
+        return 0
+    return max(1, (len(text) + 3) // 4)
+
+
+def message_tokens(message):
+    # A few tokens of per-message overhead for the role marker
+    return estimate_tokens(message.get("content", "")) + 4
+
+
+def _first_sentence(text):
+    text = " ".join(text.split())
+    match = re.match(r"(.+?[.!?])(\s|$)", text)
+    sentence = match.group(1) if match else text
+    if len(sentence) > SUMMARY_SENTENCE_CHARS:
+        sentence = sentence[:SUMMARY_SENTENCE_CHARS - 3].rstrip() + "..."
+    return sentence
+
+
+def extractive_summary(previous_summary, messages):
+    """Fold `messages` into `previous_summary` without a model call.
+
+    Keeps every player command and the opening sentence of each reply, which is
+    enough for the Dungeon Master to stay consistent about where the player has
+    been and what they did.
+    """
+    lines = [previous_summary] if previous_summary else []
+    for message in messages:
+        if message["role"] == "user":
+            lines.append(f"Player: {_first_sentence(message['content'])}")
+        elif message["role"] == "assistant":
+            lines.append(f"DM: {_first_sentence(message['content'])}")
+    return "\n".join(lines)
+
+
+class ConversationContext:
+    """Builds each turn's request inside a fixed token budget.
+
+    The system prompt and the new prompt are always sent. The most recent turns
+    fill the remaining budget; turns that fall out of the window are folded into
+    a running summary by `summarizer(previous_summary, messages)`. The summary is
+    refreshed at most once every `summary_every` turns, so its cost stays off
+    most turns.
+    """
+
+    def __init__(self, token_budget=DEFAULT_TOKEN_BUDGET, summary_every=DEFAULT_SUMMARY_EVERY,
+                 summarizer=extractive_summary, summary_token_limit=None):
+        self.token_budget = token_budget
+        self.summary_every = max(1, summary_every)
+        self.summarizer = summarizer
+        self.summary_token_limit = summary_token_limit or token_budget // 4
+        self.summary = ""
+        self.summarized_count = 0  # leading non-system messages folded into the summary
+        self.turns_since_refresh = 0
+        self.last_stats = {}
+
+    def build(self, messages, prompt):
+        """Return the messages to send for this turn, ending with `prompt`."""
+        system = [m for m in messages if m["role"] == "system"][:1]
+        turns = [m for m in messages if m["role"] != "system"]
+        prompt_message = {"role": "user", "content": prompt}
+
+        self.turns_since_refresh += 1
+        fixed_tokens = sum(message_tokens(m) for m in system) + message_tokens(prompt_message)
+        window_start = self._window_start(turns, fixed_tokens + self._summary_tokens())
+
+        if window_start > self.summarized_count and (not self.summary or self.turns_since_refresh >= self.summary_every):
+            self._refresh_summary(turns[self.summarized_count:window_start])
+            window_start = max(window_start, self._window_start(turns, fixed_tokens + self._summary_tokens()))
+
+        recent = turns[window_start:]
+        request = list(system)
+        if self.summary:
+            request.append({"role": "system", "content": f"Summary of the story so far:\n{self.summary}"})
+        request.extend(recent)
+        request.append(prompt_message)
+
+        self.last_stats = {
+            "prompt_tokens": sum(message_tokens(m) for m in request),
+            "history_messages": len(turns),
+            "recent_messages": len(recent),
+            "summarized_messages": self.summarized_count,
+            "dropped_messages": window_start - self.summarized_count,
+            "summary_tokens": self._summary_tokens(),
+        }
+        return request
+
+    def reset(self):
+        self.summary = ""
+        self.summarized_count = 0
+        self.turns_since_refresh = 0
+        self.last_stats = {}
+
+    def _summary_tokens(self):
+        return estimate_tokens(self.summary) + 12 if self.summary else 0
+
+    def _window_start(self, turns, reserved_tokens):
+        # Walk back from the newest turn until the budget is spent
+        remaining = self.token_budget - reserved_tokens
+        start = len(turns)
+        while start > 0:
+            cost = message_tokens(turns[start - 1])
+            if cost > remaining:
+                break
+            remaining -= cost
+            start -= 1
+        return max(start, self.summarized_count)
+
+    def _refresh_summary(self, messages):
+        summary = self.summarizer(self.summary, messages)
+        # Drop the oldest summary lines once the summary outgrows its share of the budget
+        lines = summary.split("\n")
+        while len(lines) > 1 and estimate_tokens("\n".join(lines)) > self.summary_token_limit:
+            lines.pop(0)
+        self.summary = "\n".join(lines)
+        self.summarized_count += len(messages)
+        self.turns_since_refresh = 0
@@ -0,0 +1,400 @@
+# The game itself, independent of Streamlit: rules, Dungeon Master prompts and async replies
+#
+# app.py renders a GameSession; benchmarks/bench_headless.py drives many of them at once on one event loop.
+import logging
+import sqlite3
+import time
+
+from commands import find_item, parse_command
+from context_manager import ConversationContext
+from game_log import GameConflict
+from lore_index import format_lore
+from metrics import TOKEN_BUCKETS
+from rate_limiter import INTERACTIVE
+from session_store import MessageStore
+from world_index import find_town, npc_lines, town_fragments, world_lore
+
+logger = logging.getLogger(__name__)
+
+SYSTEM_PROMPT = "You are a Dungeon Master for a text-based RPG. Use the provided world data to describe locations, NPCs, and events. Be creative and engaging. Keep responses concise, aiming for approximately 150 words or less."
+WELCOME = "Welcome to Aurora Nexus!"
+NO_API_KEY = "API key not configured. Please set it in Streamlit secrets or environment variables."
+
+START_STATION = "New Eden"  # Example starting station
+START_TOWN = "Cygnus Enclave"  # Example starting town
+
+DEFAULT_LORE_TOP_K = 4
+DEFAULT_LORE_TOKEN_BUDGET = 400
+
+
+def is_error_reply(text):
+    """True for the placeholder texts returned instead of a Dungeon Master reply."""
+    return not text or text.startswith(("Error:", "API key not configured"))
+
+
+class GameEngine:
+    """Everything the games of one process share: providers, lore indexes and the game log.
+
+    `providers` maps a provider name, as offered to the player, to an object
+    with async `stream()` and `complete()` methods (see providers.py).
+    `lore_index(world_id, world_data)` returns the LoreIndex of a world; by
+    default one is built per world and kept. `game_log` (a GameLog) makes games
+    durable and `metrics` (a Metrics) receives prompt sizes and timings; both
+    are optional.
+    """
+
+    def __init__(self, providers, lore_index=None, game_log=None, metrics=None,
+                 lore_top_k=DEFAULT_LORE_TOP_K, lore_token_budget=DEFAULT_LORE_TOKEN_BUDGET):
+        self.providers = dict(providers)
+        self.game_log = game_log
+        self.metrics = metrics
+        self.lore_top_k = lore_top_k
+        self.lore_token_budget = lore_token_budget
+        self._lore_index = lore_index
+        self._lore_indexes = {}
+
+    def lore_index(self, world_id, world_data):
+        if self._lore_index is not None:
+            return self._lore_index(world_id, world_data)
+        index = self._lore_indexes.get(world_id)
+        if index is None:
+            index = self._lore_indexes[world_id] = world_lore(world_data)
+        return index
+
+    async def stream(self, provider, messages, api_key, temperature, priority=INTERACTIVE, on_queue=None):
+        """Yield the reply to `messages` as text chunks.
+
+        Failures are not raised: they end the reply with an "Error: ..." text,
+        as the player has always been shown. `on_queue(position, delay)` is
+        told the caller's place while the provider's rate limit holds it back.
+        """
+        if not api_key:  # Check for API key here to avoid initial message
+            yield NO_API_KEY
+            return
+        if provider not in self.providers:
+            yield f"Error: Unknown provider '{provider}'."
+            return
+        produced = False
+        try:
+            async for chunk in self.providers[provider].stream(messages, api_key, temperature, priority, on_queue):
+                produced = True
+                yield chunk
+        except Exception as e:
+            yield f"\n\nError: {str(e)}" if produced else f"Error: {str(e)}"
+
+    async def complete(self, provider, messages, api_key, temperature, priority=INTERACTIVE, on_queue=None):
+        """The whole reply to `messages` at once; failures are returned as "Error: ..." texts."""
+        if not api_key:
+            return NO_API_KEY
+        if provider not in self.providers:
+            return f"Error: Unknown provider '{provider}'."
+        try:
+            return await self.providers[provider].complete(messages, api_key, temperature, priority, on_queue)
+        except Exception as e:
+            return f"Error: {str(e)}"
+
+    def observe(self, name, value, **labels):
+        if self.metrics is not None:
+            self.metrics.observe(name, value, **labels)
+
+
+class Turn:
+    """One player command on its way through a GameSession.
+
+    Quick commands are answered locally and carry their `reply` at once;
+    otherwise `request_messages` is the prompt for the Dungeon Master, whose
+    answer is put into `reply` before `finish_turn()`. `scene` is the text to
+    illustrate the reply with (None when the scene did not change) and
+    `scene_index` the message it belongs to.
+    """
+
+    __slots__ = ("command", "reply", "quick", "scene", "scene_index", "request_messages", "prompt_stats")
+
+    def __init__(self, command):
+        self.command = command
+        self.reply = None
+        self.quick = False
+        self.scene = None
+        self.scene_index = None
+        self.request_messages = None
+        self.prompt_stats = None
+
+
+class GameSession:
+    """One player's game on a PlayerState, with no UI attached.
+
+    The caller owns the flow: `new_game()` and `begin()` start a game around
+    the opening scene, `prepare_turn()` answers a quick command or builds the
+    Dungeon Master prompt, `reply()` streams the answer and `finish_turn()`
+    records it. `start()` and `play()` chain these for callers that only want
+    the text. `context` (a ConversationContext) carries the running summary
+    of older turns and `log` receives messages worth showing a developer.
+    Games are logged under `owner`, and only that owner's games can be loaded.
+    """
+
+    def __init__(self, engine, state, context=None, provider=None, api_key=None, temperature=0.7, log=None,
+                 owner=None):
+        self.engine = engine
+        self.state = state
+        self.context = context if context is not None else ConversationContext()
+        self.provider = provider
+        self.api_key = api_key
+        self.temperature = temperature
+        self.log = log if log is not None else logger.warning
+        self.owner = owner
+
+    # --- State ---
+
+    def record(self, kind, **payload):
+        # Appends to the game's durable log; a snapshot of the whole state is written when one is due
+        if self.state.game_id is None or self.engine.game_log is None:
+            return
+        try:
+            self.state.game_seq = self.engine.game_log.append(
+                self.state.game_id, kind, payload, state=self.state.to_dict, after=self.state.game_seq)
+        except GameConflict:
+            # The game was resumed in another session since; carry on as a copy rather than interleave events
+            self.fork()
+        except (sqlite3.Error, KeyError) as e:
+            self.log(f"Debug: Failed to save game event: {str(e)}")
+
+    def fork(self):
+        """Continue the current state as a new logged game of this owner."""
+        state = self.state
+        try:
+            state.game_id = self.engine.game_log.new_game(
+                state.to_dict(), title=f"{state.current_town}, {time.strftime('%Y-%m-%d %H:%M')} (copy)", owner=self.owner)
+            state.game_seq = 0
+        except sqlite3.Error as e:
+            state.game_id = None
+            self.log(f"Debug: Failed to save game copy: {str(e)}")
+
+    def add_message(self, role, content):
+        self.state.messages.append({"role": role, "content": content})
+        self.record("message", role=role, content=content)
+
+    def town(self):
+        return self.state.world_data['stations'][self.state.current_station]['towns'][self.state.current_town]
+
+    def fragments(self):
+        # Prompt text of the current town; precomputed when the world is compiled (see world_index.py)
+        return town_fragments(self.state.world_data, self.state.current_station, self.state.current_town)
+
+    def describe_location(self):
+        return self.fragments()["location"]
+
+    def relevant_lore(self, query):
+        """Top passages about the world for `query`, skipping the town already described in the prompt."""
+        state = self.state
+        passages = self.engine.lore_index(state.world_id, state.world_data).search(
+            query,
+            k=self.engine.lore_top_k,
+            token_budget=self.engine.lore_token_budget,
+            exclude=lambda passage: passage["kind"] == "town" and passage["station"] == state.current_station and passage["town"] == state.current_town,
+        )
+        return format_lore(passages) if passages else "Nothing further comes to mind."
+
+    def add_item(self, item_name):
+        inventory = self.state.inventory
+        inventory[item_name] = inventory.get(item_name, 0) + 1
+        self.record("inventory", item=item_name, delta=1)
+
+    def remove_item(self, item_name):
+        inventory = self.state.inventory
+        if inventory.get(item_name, 0) > 0:
+            inventory[item_name] -= 1
+            if inventory[item_name] == 0:
+                del inventory[item_name]
+            self.record("inventory", item=item_name, delta=-1)
+
+    def check_inventory(self):
+        inventory_str = "Your Inventory:\n"
+        if not self.state.inventory:
+            inventory_str += "Empty"
+        else:
+            for item, count in self.state.inventory.items():
+                inventory_str += f"- {item}: {count}\n"
+        return inventory_str
+
+    # --- Starting and resuming games ---
+
+    def new_game(self, world_id, world_data, station=START_STATION, town=START_TOWN):
+        """Reset the state for a new game and return the messages that ask for its opening scene."""
+        state = self.state
+        state.world_id = world_id
+        state.world_data = world_data  # Shared with every session on this world version, never copied
+        state.inventory = {}
+        state.message_images = {}
+        state.game_id = None
+        state.game_seq = None
+        state.current_station = station
+        state.current_town = town
+        self.context.reset()
+
+        town_data = self.town()
+        initial_prompt_content = f"""You are the Dungeon Master for a text-based RPG set in the world of {world_data['name']}.
+    The world description is: {world_data['description']}.
+
+    The player starts in {state.current_town} in {state.current_station}.
+    Station Description: {world_data['stations'][state.current_station]['description']}.
+    Town Description: {town_data['description']}.
+    Available NPCs in {state.current_town}:
+    """
+        initial_prompt_content += npc_lines(town_data)
+
+        initial_prompt_content += f"""
+    Related places and people elsewhere in the Nexus:
+    {self.relevant_lore(town_data['description'])}
+    """
+
+        initial_prompt_content += f"""
+    Give some context of the whole Aurora Nexus with its many stations and abundance of variety. Describe the player's immediate surroundings in {state.current_town} and wait for their first command.
+    Keep your descriptions evocative and engaging, setting the scene for an immersive role-playing experience.
+    Remember to act as the Dungeon Master and guide the player through the world. Aim to keep your initial description to around 250 words.
+    """
+
+        return [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": initial_prompt_content}  # Send the initial prompt as a user message to trigger the DM response
+        ]
+
+    def begin(self, opening):
+        """Start the history with the opening scene and log the game, so it can be resumed."""
+        state = self.state
+        state.messages = MessageStore([
+            {"role": "system", "content": SYSTEM_PROMPT},
+            # The opening scene, or the default welcome if the API key is missing or there was no reply
+            {"role": "assistant", "content": opening if opening and not opening.startswith("API key not configured") else WELCOME},
+        ])
+        if self.engine.game_log is None:
+            return
+        try:
+            state.game_id = self.engine.game_log.new_game(
+                state.to_dict(), title=f"{state.current_town}, {time.strftime('%Y-%m-%d %H:%M')}", owner=self.owner)
+            state.game_seq = 0
+        except sqlite3.Error as e:
+            state.game_id = None
+            self.log(f"Debug: Failed to save new game: {str(e)}")
+
+    def load(self, game_id, resolve_world):
+        """Resume a logged game from its latest snapshot and the events after it, without any model calls.
+
+        `resolve_world(world_id)` returns the world the game was played in.
+        """
+        payload = self.engine.game_log.load(game_id, owner=self.owner)
+        self.state.load_dict(payload, resolve_world(payload["world_id"]))
+        self.state.message_images = {}
+        self.context.reset()
+
+    # --- Turns ---
+
+    def quick_command(self, player_command):
+        """Answer simple commands from local game state. Returns None when the Dungeon Master is needed."""
+        state = self.state
+        command = parse_command(player_command)
+        if command is None:
+            return None
+        if command.action == "inventory":
+            return self.check_inventory()
+        if command.action == "look":
+            return self.describe_location()
+        if command.action == "who":
+            return self.fragments()["who"]
+        if command.action == "go":
+            destination = find_town(state.world_data, state.current_station, command.target)
+            if destination is None:
+                return None  # Not a known place; let the Dungeon Master interpret it
+            station_name, town_name = destination
+            if (station_name, town_name) == (state.current_station, state.current_town):
+                return f"You are already in {town_name}.\n\n" + self.describe_location()
+            travel = f"You travel to {town_name}" + (f" on {station_name}" if station_name != state.current_station else "") + ".\n\n"
+            state.current_station = station_name
+            state.current_town = town_name
+            self.record("move", station=station_name, town=town_name)
+            return travel + self.describe_location()
+        if command.action == "drop":
+            item = find_item(state.inventory, command.target)
+            if item is None:
+                return f"You don't have any {command.target}."
+            self.remove_item(item)
+            return f"You drop the {item}.\n\n" + self.check_inventory()
+        return None
+
+    def prepare_turn(self, player_command):
+        """Record the player's command and answer it locally, or build the prompt for the Dungeon Master."""
+        state = self.state
+        self.add_message("user", player_command)
+        turn = Turn(player_command)
+        turn.scene_index = len(state.messages)
+
+        # Simple commands are answered locally without a remote completion
+        start = time.perf_counter()
+        previous_town = (state.current_station, state.current_town)
+        turn.reply = self.quick_command(player_command)
+        if turn.reply is not None:
+            self.engine.observe("quick_command_seconds", time.perf_counter() - start)
+            turn.quick = True
+            if (state.current_station, state.current_town) != previous_town:
+                turn.scene = self.describe_location()
+            return turn
+
+        prompt_start = time.perf_counter()
+        turn.scene = current_location_description = self.describe_location()
+        # Retrieve lore relevant to the command and the last couple of exchanges
+        recent_text = " ".join(m["content"] for m in state.messages[-2:] if m["role"] != "system")
+        relevant_lore = self.relevant_lore(f"{player_command} {recent_text}")
+        prompt_message = f"""
+    **Current Location:**
+    {current_location_description}
+
+    **Relevant Lore:**
+    {relevant_lore}
+
+    **Your Inventory:** {state.inventory}
+
+    **Your Command:** {player_command}
+
+    Respond as the Dungeon Master. Describe what happens next in the game world based on the player's command, the current location, and the world's lore.
+    Be descriptive and engaging. Advance the story based on the player's actions. Aim to keep your response to around 150 words or less.
+    """
+        # Only the system prompt, a summary of older turns and the most recent turns are sent
+        turn.request_messages = self.context.build(state.messages, prompt_message)
+        turn.prompt_stats = {**self.context.last_stats, "prompt_build": time.perf_counter() - prompt_start}
+        self.engine.observe("prompt_tokens", turn.prompt_stats["prompt_tokens"], buckets=TOKEN_BUCKETS)
+        self.engine.observe("prompt_build_seconds", turn.prompt_stats["prompt_build"])
+        return turn
+
+    def flavour_messages(self, turn):
+        """The request for one sentence of atmosphere after a quick command."""
+        return [
+            self.state.messages[0],
+            {"role": "user", "content": f"The player said '{turn.command}' and the result was:\n{turn.reply}\n\nAdd one short sentence of atmosphere for this moment, nothing more."},
+        ]
+
+    def finish_turn(self, turn):
+        if turn.reply:
+            self.add_message("assistant", turn.reply)
+        return turn.reply
+
+    def reply(self, messages, priority=INTERACTIVE, on_queue=None):
+        """Stream the Dungeon Master's reply to `messages` with this session's provider and settings."""
+        return self.engine.stream(self.provider, messages, self.api_key, self.temperature, priority, on_queue)
+
+    async def reply_text(self, messages, priority=INTERACTIVE, on_queue=None):
+        return await self.engine.complete(self.provider, messages, self.api_key, self.temperature, priority, on_queue)
+
+    # --- Headless play ---
+
+    async def start(self, world_id, world_data, station=START_STATION, town=START_TOWN):
+        """Start a new game and return its opening scene."""
+        opening = "".join([chunk async for chunk in self.reply(self.new_game(world_id, world_data, station, town))])
+        self.begin(opening)
+        return opening
+
+    async def play(self, player_command):
+        """Play one command to the end and return the finished Turn."""
+        turn = self.prepare_turn(player_command)
+        if not turn.quick:
+            turn.reply = "".join([chunk async for chunk in self.reply(turn.request_messages)])
+        self.finish_turn(turn)
+        return turn
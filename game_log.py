@@ -0,0 +1,159 @@
+# Durable games: an append-only event log with periodic snapshots in SQLite (WAL)
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+from session_store import MessageStore
+
+DEFAULT_SNAPSHOT_EVERY = 50  # events between snapshots; bounds the tail replayed on load
+
+
+def apply_event(state, kind, payload):
+    """Fold one logged event into a `PlayerState.to_dict()`-shaped state."""
+    if kind == "message":
+        state["messages"].append([MessageStore.ROLES.index(payload["role"]), payload["content"]])
+    elif kind == "move":
+        state["current_station"] = payload["station"]
+        state["current_town"] = payload["town"]
+    elif kind == "inventory":
+        count = state["inventory"].get(payload["item"], 0) + payload["delta"]
+        if count > 0:
+            state["inventory"][payload["item"]] = count
+        else:
+            state["inventory"].pop(payload["item"], None)
+    else:
+        raise ValueError(f"Unknown game event '{kind}'")
+    return state
+
+
+class GameConflict(Exception):
+    """The game has been written to by another session since this one last saw it."""
+
+
+class GameLog:
+    """Stores every game as a sequence of events plus snapshots of its full state.
+
+    Events ("message", "move", "inventory") are only ever appended. Every
+    `snapshot_every` events the caller's current state is written as a
+    snapshot, so `load()` reads the latest snapshot and replays at most
+    `snapshot_every` events, however long the game has run. No model calls are
+    replayed: replies are logged as the text the player saw.
+
+    Games belong to the `owner` token they were created with: listing and
+    loading with an owner only see that owner's games. Writers pass `after`,
+    the sequence number they last saw, so a session that is behind (because
+    the game was resumed somewhere else) gets a GameConflict instead of
+    interleaving its events with the other session's.
+    """
+
+    def __init__(self, path, snapshot_every=DEFAULT_SNAPSHOT_EVERY):
+        self.path = path
+        self.snapshot_every = snapshot_every
+        self._lock = threading.Lock()
+        self._db = self._connect()
+
+    def new_game(self, state, title=None, owner=None):
+        """Start a game from `state` (stored as its first snapshot) and return its ID."""
+        game_id = uuid.uuid4().hex[:12]
+        now = time.time()
+        with self._lock, self._db:
+            self._db.execute("INSERT INTO games (game_id, title, created_at, updated_at, last_seq, snapshot_seq, owner) "
+                             "VALUES (?, ?, ?, ?, 0, 0, ?)", (game_id, title, now, now, owner))
+            self._db.execute("INSERT INTO snapshots (game_id, seq, state) VALUES (?, 0, ?)",
+                             (game_id, json.dumps({**state, "game_id": game_id})))
+        return game_id
+
+    def append(self, game_id, kind, payload, state=None, after=None):
+        """Log one event. `state()` is called for a snapshot when one is due. Returns the event's sequence number.
+
+        Raises GameConflict if `after` is given and is not the game's latest sequence number.
+        """
+        with self._lock, self._db:
+            row = self._db.execute("SELECT last_seq, snapshot_seq FROM games WHERE game_id = ?", (game_id,)).fetchone()
+            if row is None:
+                raise KeyError(f"Unknown game '{game_id}'")
+            if after is not None and row[0] != after:
+                raise GameConflict(f"Game '{game_id}' is at event {row[0]}, not {after}")
+            seq, snapshot_seq = row[0] + 1, row[1]
+            self._db.execute("INSERT INTO events (game_id, seq, kind, payload) VALUES (?, ?, ?, ?)",
+                             (game_id, seq, kind, json.dumps(payload)))
+            if state is not None and seq - snapshot_seq >= self.snapshot_every:
+                self._db.execute("INSERT INTO snapshots (game_id, seq, state) VALUES (?, ?, ?)",
+                                 (game_id, seq, json.dumps(state())))
+                self._db.execute("DELETE FROM snapshots WHERE game_id = ? AND seq < ?", (game_id, seq))
+                snapshot_seq = seq
+            self._db.execute("UPDATE games SET last_seq = ?, snapshot_seq = ?, updated_at = ? WHERE game_id = ?",
+                             (seq, snapshot_seq, time.time(), game_id))
+        return seq
+
+    def save(self, game_id, state, title=None, after=None):
+        """Snapshot `state` at the latest event, so the next load replays nothing, and optionally rename the game."""
+        with self._lock, self._db:
+            row = self._db.execute("SELECT last_seq FROM games WHERE game_id = ?", (game_id,)).fetchone()
+            if row is None:
+                raise KeyError(f"Unknown game '{game_id}'")
+            if after is not None and row[0] != after:
+                raise GameConflict(f"Game '{game_id}' is at event {row[0]}, not {after}")
+            self._db.execute("REPLACE INTO snapshots (game_id, seq, state) VALUES (?, ?, ?)",
+                             (game_id, row[0], json.dumps(state)))
+            self._db.execute("DELETE FROM snapshots WHERE game_id = ? AND seq < ?", (game_id, row[0]))
+            self._db.execute("UPDATE games SET snapshot_seq = ?, title = COALESCE(?, title), updated_at = ? "
+                             "WHERE game_id = ?", (row[0], title, time.time(), game_id))
+
+    def load(self, game_id, owner=None):
+        """Rebuild a game's state from its latest snapshot plus the events after it.
+
+        With an `owner`, another owner's game is reported as unknown; a game
+        logged before games had owners is claimed by the first one to load it.
+        """
+        with self._lock, self._db:
+            game = self._db.execute("SELECT owner, last_seq FROM games WHERE game_id = ?", (game_id,)).fetchone()
+            if game is None or (owner is not None and game[0] not in (None, owner)):
+                raise KeyError(f"Unknown game '{game_id}'")
+            if owner is not None and game[0] is None:
+                self._db.execute("UPDATE games SET owner = ? WHERE game_id = ?", (owner, game_id))
+            row = self._db.execute("SELECT seq, state FROM snapshots WHERE game_id = ? ORDER BY seq DESC LIMIT 1",
+                                   (game_id,)).fetchone()
+            if row is None:
+                raise KeyError(f"Unknown game '{game_id}'")
+            snapshot_seq, state = row[0], json.loads(row[1])
+            events = self._db.execute("SELECT kind, payload FROM events WHERE game_id = ? AND seq > ? ORDER BY seq",
+                                      (game_id, snapshot_seq)).fetchall()
+        for kind, payload in events:
+            apply_event(state, kind, json.loads(payload))
+        state["game_id"] = game_id
+        state["game_seq"] = game[1]
+        return state
+
+    def list_games(self, limit=20, owner=None):
+        """Most recently played games (of `owner`, if given) as dicts with game_id, title, updated_at and events."""
+        with self._lock:
+            if owner is None:
+                rows = self._db.execute("SELECT game_id, title, updated_at, last_seq FROM games "
+                                        "ORDER BY updated_at DESC LIMIT ?", (limit,)).fetchall()
+            else:
+                rows = self._db.execute("SELECT game_id, title, updated_at, last_seq FROM games WHERE owner = ? "
+                                        "ORDER BY updated_at DESC LIMIT ?", (owner, limit)).fetchall()
+        return [{"game_id": game_id, "title": title, "updated_at": updated_at, "events": last_seq}
+                for game_id, title, updated_at, last_seq in rows]
+
+    def _connect(self):
+        if self.path != ":memory:":
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        db = sqlite3.connect(self.path, check_same_thread=False)  # every use holds self._lock
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")  # survives process crashes without an fsync per turn
+        with db:
+            db.execute("CREATE TABLE IF NOT EXISTS games (game_id TEXT PRIMARY KEY, title TEXT, created_at REAL, "
+                       "updated_at REAL, last_seq INTEGER NOT NULL, snapshot_seq INTEGER NOT NULL, owner TEXT)")
+            if "owner" not in {column[1] for column in db.execute("PRAGMA table_info(games)")}:
+                db.execute("ALTER TABLE games ADD COLUMN owner TEXT")  # logs written before games had owners
+            db.execute("CREATE INDEX IF NOT EXISTS games_by_owner ON games (owner, updated_at)")
+            db.execute("CREATE TABLE IF NOT EXISTS events (game_id TEXT NOT NULL, seq INTEGER NOT NULL, "
+                       "kind TEXT NOT NULL, payload TEXT NOT NULL, PRIMARY KEY (game_id, seq))")
+            db.execute("CREATE TABLE IF NOT EXISTS snapshots (game_id TEXT NOT NULL, seq INTEGER NOT NULL, "
+                       "state TEXT NOT NULL, PRIMARY KEY (game_id, seq))")
+        return db
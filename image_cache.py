@@ -0,0 +1,171 @@
+# Content-addressed, size-bounded cache for generated scene images
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+DEFAULT_MEMORY_BYTES = 64 * 1024 * 1024   # 64 MB of encoded images in memory
+DEFAULT_DISK_BYTES = 512 * 1024 * 1024    # 512 MB on disk
+CACHE_SUFFIX = ".img"
+
+
+def cache_key(model, prompt):
+    """Key an image by the model and the prompt actually sent to it."""
+    return hashlib.sha256(f"{model}\0{prompt}".encode("utf-8")).hexdigest()
+
+
+class ImageCache:
+    """Two-tier LRU cache of encoded image bytes (PNG/JPEG as returned by the API).
+
+    The memory tier holds the most recently used images; the disk tier under
+    `directory` survives restarts and is shared by every process using the same
+    path. Both tiers evict least recently used entries once their byte limit is
+    exceeded. Images are kept in their compressed encoding, never as decoded
+    bitmaps, so the limits reflect real storage cost. The lock only guards the
+    in-memory indexes; files are read and written outside it.
+    """
+
+    def __init__(self, directory=None, memory_bytes=DEFAULT_MEMORY_BYTES, disk_bytes=DEFAULT_DISK_BYTES):
+        self.directory = directory
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self._memory = OrderedDict()  # key -> bytes
+        self._memory_size = 0
+        self._disk = OrderedDict()  # key -> size, oldest access first
+        self._disk_size = 0
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            self._scan_disk()
+
+    def get(self, model, prompt):
+        """Return cached image bytes for (model, prompt), or None on a miss."""
+        key = cache_key(model, prompt)
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return data
+            if key not in self._disk:
+                self.misses += 1
+                return None
+        data = self._read_disk(key)  # outside the lock, so other sessions are not held up by the file
+        with self._lock:
+            if data is None:
+                self._disk_size -= self._disk.pop(key, 0)
+                self.misses += 1
+                return None
+            if key in self._disk:
+                self._disk.move_to_end(key)
+            self._remember(key, data)
+            self.disk_hits += 1
+            return data
+
+    def put(self, model, prompt, data):
+        key = cache_key(model, prompt)
+        with self._lock:
+            self._remember(key, data)
+        if not self.directory or not self._write_disk(key, data):
+            return
+        with self._lock:
+            self._disk_size -= self._disk.pop(key, 0)
+            self._disk[key] = len(data)
+            self._disk_size += len(data)
+            evicted = self._evict_disk()
+        self._remove_files(evicted)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_size,
+                "disk_entries": len(self._disk),
+                "disk_bytes": self._disk_size,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._memory_size = 0
+            removed = list(self._disk)
+            self._disk.clear()
+            self._disk_size = 0
+        self._remove_files(removed)
+
+    # --- Memory tier ---
+    def _remember(self, key, data):
+        if len(data) > self.memory_bytes:
+            return
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._memory_size -= len(old)
+        self._memory[key] = data
+        self._memory_size += len(data)
+        while self._memory_size > self.memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_size -= len(evicted)
+
+    # --- Disk tier ---
+    def _path(self, key):
+        return os.path.join(self.directory, key + CACHE_SUFFIX)
+
+    def _scan_disk(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(CACHE_SUFFIX):
+                continue
+            stat = os.stat(os.path.join(self.directory, name))
+            entries.append((stat.st_mtime, name[:-len(CACHE_SUFFIX)], stat.st_size))
+        for _, key, size in sorted(entries):
+            self._disk[key] = size
+            self._disk_size += size
+        self._remove_files(self._evict_disk())
+
+    def _read_disk(self, key):
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)  # Keep LRU order across restarts
+            return data
+        except OSError:
+            return None
+
+    def _write_disk(self, key, data):
+        """Write the file for `key`; returns False if it was not stored."""
+        if len(data) > self.disk_bytes:
+            return False
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError:
+            return False
+        return True
+
+    def _evict_disk(self):
+        # Called with the lock held: drops index entries and returns their keys for _remove_files
+        evicted = []
+        while self._disk_size > self.disk_bytes and self._disk:
+            key, size = self._disk.popitem(last=False)
+            self._disk_size -= size
+            evicted.append(key)
+        return evicted
+
+    def _remove_files(self, keys):
+        for key in keys:
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
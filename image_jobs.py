@@ -0,0 +1,65 @@
+# Background worker pool for scene image generation
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_MAX_WORKERS = 2
+
+
+class ImageJobs:
+    """Runs image generation off the turn path, one live job per session.
+
+    Each job belongs to an `owner` (a session ID) and carries a `key` saying
+    which chat message the image is for. Submitting a new job for an owner
+    cancels the previous one: a queued job is dropped, and a running job's
+    result is discarded when it finishes.
+    """
+
+    def __init__(self, max_workers=DEFAULT_MAX_WORKERS):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="scene-image")
+        self._jobs = {}  # owner -> (key, future)
+        self._lock = threading.Lock()
+
+    def submit(self, owner, key, fn, *args, **kwargs):
+        with self._lock:
+            self._cancel_locked(owner)
+            future = self._executor.submit(fn, *args, **kwargs)
+            self._jobs[owner] = (key, future)
+            return future
+
+    def cancel(self, owner):
+        with self._lock:
+            self._cancel_locked(owner)
+
+    def pending(self, owner):
+        with self._lock:
+            return owner in self._jobs
+
+    def ready(self, owner):
+        with self._lock:
+            job = self._jobs.get(owner)
+            return job is not None and job[1].done()
+
+    def collect(self, owner):
+        """Return (key, result) for a finished job, or None if nothing is ready.
+
+        If the job raised, the exception is returned as the result.
+        """
+        with self._lock:
+            job = self._jobs.get(owner)
+            if job is None or not job[1].done():
+                return None
+            del self._jobs[owner]
+        key, future = job
+        error = future.exception()
+        return key, (error if error is not None else future.result())
+
+    def shutdown(self):
+        with self._lock:
+            for owner in list(self._jobs):
+                self._cancel_locked(owner)
+        self._executor.shutdown(wait=False)
+
+    def _cancel_locked(self, owner):
+        job = self._jobs.pop(owner, None)
+        if job is not None:
+            job[1].cancel()
@@ -0,0 +1,135 @@
+# Scene image post-processing: decode once, scale to the chat column, encode once for the browser
+#
+# st.image passes JPEG and PNG bytes through untouched but re-encodes every
+# other format (WebP included) on each render, so display copies default to
+# progressive JPEG. WebP remains the format for images at rest, such as the
+# pre-rendered scene bundle.
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from io import BytesIO
+
+DISPLAY_WIDTH = 768         # the chat column's width; larger images are scaled down
+DISPLAY_FORMAT = "JPEG"
+DEFAULT_QUALITY = 80
+PLACEHOLDER_WIDTH = 128     # thumbnails shown in place of older scene images
+PLACEHOLDER_QUALITY = 40
+DEFAULT_MAX_PLACEHOLDERS = 256
+FORMATS = ("JPEG", "WEBP", "PNG")
+
+
+def decode(payload, width=None):
+    """Decode an encoded image; JPEGs are decoded at a reduced scale when `width` allows it."""
+    from PIL import Image
+
+    image = Image.open(BytesIO(payload))
+    if width and image.format == "JPEG" and image.width > width:
+        # DCT scaling: decode straight to the smallest size that is still at least `width` wide
+        image.draft("RGB", (width, max(1, image.height * width // image.width)))
+    image.load()
+    if image.mode not in ("RGB", "RGBA", "L"):  # palette images would be resized without filtering
+        image = image.convert("RGBA" if "A" in image.getbands() or "transparency" in image.info else "RGB")
+    return image
+
+
+def scale(image, width):
+    from PIL import Image
+
+    if image.width <= width:
+        return image
+    return image.resize((width, max(1, round(image.height * width / image.width))), Image.LANCZOS)
+
+
+def encode(image, format=DISPLAY_FORMAT, quality=DEFAULT_QUALITY):
+    buffer = BytesIO()
+    if format == "JPEG":
+        image.convert("RGB").save(buffer, "JPEG", quality=quality, optimize=True, progressive=True)
+    elif format == "WEBP":
+        image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+        image.save(buffer, "WEBP", quality=quality, method=6)
+    elif format == "PNG":
+        image.save(buffer, "PNG", optimize=True)
+    else:
+        raise ValueError(f"Unsupported image format '{format}' (expected one of {', '.join(FORMATS)})")
+    return buffer.getvalue()
+
+
+def prepare(payload, width=DISPLAY_WIDTH, format=DISPLAY_FORMAT, quality=DEFAULT_QUALITY):
+    """Scale an encoded image down to `width` and re-encode it once. Returns (bytes, (w, h))."""
+    image = scale(decode(payload, width), width)
+    return encode(image, format, quality), image.size
+
+
+class ImagePipeline:
+    """Turns image payloads from the API into the bytes the browser is sent.
+
+    `process(payload)` decodes, scales and encodes an image once, so storing
+    and re-serving the result is a byte copy. `placeholder(data)` returns a
+    thumbnail of a processed image, kept for up to `max_placeholders` images.
+    `observe(name, value, **labels)` and `count(name, value, **labels)`
+    receive encode times and byte counts; they match `Metrics.observe` and
+    `Metrics.inc`.
+    """
+
+    def __init__(self, width=DISPLAY_WIDTH, format=DISPLAY_FORMAT, quality=DEFAULT_QUALITY,
+                 placeholder_width=PLACEHOLDER_WIDTH, max_placeholders=DEFAULT_MAX_PLACEHOLDERS,
+                 observe=None, count=None):
+        format = format.upper()
+        if format not in FORMATS:
+            raise ValueError(f"Unsupported image format '{format}' (expected one of {', '.join(FORMATS)})")
+        self.width = width
+        self.format = format
+        self.quality = quality
+        self.placeholder_width = placeholder_width
+        self.max_placeholders = max_placeholders
+        self.observe = observe
+        self.count = count
+        self._placeholders = OrderedDict()  # sha1 of the display bytes -> thumbnail bytes
+        self._lock = threading.Lock()
+        self.processed = 0
+        self.source_bytes = 0
+        self.encoded_bytes = 0
+
+    @property
+    def spec(self):
+        """Identifies the output settings, e.g. for keying cached results."""
+        return f"{self.format.lower()}-{self.width}w-q{self.quality}"
+
+    def process(self, payload):
+        start = time.perf_counter()
+        data, size = prepare(payload, self.width, self.format, self.quality)
+        self._record("image_encode_seconds", time.perf_counter() - start, len(payload), len(data))
+        with self._lock:
+            self.processed += 1
+            self.source_bytes += len(payload)
+            self.encoded_bytes += len(data)
+        return data, size
+
+    def placeholder(self, data):
+        key = hashlib.sha1(data).digest()
+        with self._lock:
+            thumbnail = self._placeholders.get(key)
+            if thumbnail is not None:
+                self._placeholders.move_to_end(key)
+                return thumbnail
+        start = time.perf_counter()
+        thumbnail, _ = prepare(data, self.placeholder_width, self.format, PLACEHOLDER_QUALITY)
+        self._record("image_placeholder_seconds", time.perf_counter() - start, len(data), len(thumbnail))
+        with self._lock:
+            self._placeholders[key] = thumbnail
+            while len(self._placeholders) > self.max_placeholders:
+                self._placeholders.popitem(last=False)
+        return thumbnail
+
+    def stats(self):
+        with self._lock:
+            return {"processed": self.processed, "source_bytes": self.source_bytes,
+                    "encoded_bytes": self.encoded_bytes, "placeholders": len(self._placeholders)}
+
+    def _record(self, name, seconds, source, encoded):
+        if self.observe is not None:
+            self.observe(name, seconds, format=self.format)
+        if self.count is not None:
+            self.count("image_source_bytes_total", source, stage=name[:-len("_seconds")])
+            self.count("image_encoded_bytes_total", encoded, stage=name[:-len("_seconds")])
@@ -0,0 +1,179 @@
+# Shared, pooled API clients for the LLM providers
+import asyncio
+import importlib
+import importlib.util
+import inspect
+import threading
+import time
+
+DEFAULT_CONNECT_TIMEOUT = 5.0   # seconds to establish a connection
+DEFAULT_READ_TIMEOUT = 60.0     # seconds to wait for response data
+DEFAULT_IDLE_TTL = 300.0        # close clients unused for this long
+DEFAULT_MAX_CONNECTIONS = 20
+DEFAULT_MAX_KEEPALIVE = 10
+
+
+class ClientRegistry:
+    """Process-wide cache of provider clients keyed by (provider, api_key, base_url).
+
+    Each client keeps its own keep-alive connection pool, so reusing the client
+    across turns and sessions skips fresh connection setup and TLS handshakes.
+    Clients idle for longer than `idle_ttl` are closed on the next lookup.
+    Async clients (AsyncOpenAI, genai's `client.aio`) are closed on `loop`,
+    the event loop their connections belong to.
+    """
+
+    def __init__(self, connect_timeout=DEFAULT_CONNECT_TIMEOUT, read_timeout=DEFAULT_READ_TIMEOUT,
+                 idle_ttl=DEFAULT_IDLE_TTL, max_connections=DEFAULT_MAX_CONNECTIONS,
+                 max_keepalive=DEFAULT_MAX_KEEPALIVE, loop=None):
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.idle_ttl = idle_ttl
+        self.max_connections = max_connections
+        self.max_keepalive = max_keepalive
+        self.loop = loop
+        self._clients = {}  # key -> [client, last_used]
+        self._lock = threading.Lock()
+        self.created = 0
+        self.reused = 0
+        self.closed = 0
+
+    def get(self, provider, api_key, base_url=None):
+        """Return a pooled client for `provider` ("gemini" or "openai-async")."""
+        key = (provider, api_key, base_url)
+        now = time.monotonic()
+        with self._lock:
+            self._close_idle_locked(now, keep=key)
+            entry = self._clients.get(key)
+            if entry is not None:
+                entry[1] = now
+                self.reused += 1
+                return entry[0]
+            client = self._create(provider, api_key, base_url)
+            self._clients[key] = [client, now]
+            self.created += 1
+            return client
+
+    def close_idle(self):
+        with self._lock:
+            self._close_idle_locked(time.monotonic())
+
+    def close_all(self):
+        """Close every client. Returns the futures of the async closes, for callers that want to wait for them."""
+        with self._lock:
+            closing = [self._close(client) for client, _ in self._clients.values()]
+            self._clients.clear()
+        return [future for futures in closing for future in futures if future is not None]
+
+    def stats(self):
+        with self._lock:
+            return {"open": len(self._clients), "created": self.created,
+                    "reused": self.reused, "closed": self.closed}
+
+    def _close_idle_locked(self, now, keep=None):
+        if self.idle_ttl is None:
+            return
+        for key, (client, last_used) in list(self._clients.items()):
+            if key != keep and now - last_used > self.idle_ttl:
+                del self._clients[key]
+                self._close(client)
+
+    def _close(self, client):
+        closings = []
+        try:
+            closing = client.close()  # genai: the sync client only; AsyncOpenAI: a coroutine
+            if inspect.isawaitable(closing):
+                closings.append(closing)
+            aio = getattr(client, "aio", None)  # genai keeps a separate async client with its own pool
+            if aio is not None:
+                closings.append(aio.aclose())
+        except Exception:
+            pass
+        self.closed += 1
+        return [self._schedule(closing) for closing in closings]
+
+    def _schedule(self, closing):
+        # The connection pool belongs to the loop the client ran on, so it must be closed there
+        loop = self.loop
+        if loop is None or loop.is_closed():
+            closing.close()  # nothing left to release the connections on
+            return None
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            return loop.create_task(closing)
+        return asyncio.run_coroutine_threadsafe(closing, loop)
+
+    def _create(self, provider, api_key, base_url):
+        factory = CLIENT_FACTORIES.get(provider)
+        if factory is None:
+            raise ValueError(f"Unknown client provider '{provider}'")
+        return factory(self, api_key, base_url)
+
+
+# Provider plugins: each factory imports its SDK on first use, so a process only
+# pays for the providers its sessions actually select.
+CLIENT_FACTORIES = {}
+PROVIDER_MODULES = {}  # provider -> modules worth importing ahead of the first call
+
+
+def register_provider(name, modules=()):
+    """Decorator registering `factory(registry, api_key, base_url)` as the client factory for `name`."""
+    def decorator(factory):
+        CLIENT_FACTORIES[name] = factory
+        PROVIDER_MODULES[name] = tuple(modules)
+        return factory
+    return decorator
+
+
+def preload(provider):
+    """Import `provider`'s SDK in a background thread so the first call does not wait for it."""
+    modules = PROVIDER_MODULES.get(provider, ())
+
+    def run():
+        for module in modules:
+            try:
+                importlib.import_module(module)
+            except ImportError:
+                pass  # surfaced properly when the client is created
+
+    thread = threading.Thread(target=run, name=f"preload-{provider}", daemon=True)
+    thread.start()
+    return thread
+
+
+@register_provider("gemini", modules=("google.genai",))
+def _create_genai(registry, api_key, base_url):
+    import httpx
+    from google import genai
+    from google.genai import types as genai_types
+
+    client_args = {
+        "timeout": httpx.Timeout(registry.read_timeout, connect=registry.connect_timeout),
+        "limits": httpx.Limits(max_connections=registry.max_connections,
+                               max_keepalive_connections=registry.max_keepalive,
+                               keepalive_expiry=registry.idle_ttl),
+    }
+    options = {
+        "timeout": int(registry.read_timeout * 1000),  # genai expects milliseconds
+        "client_args": client_args,
+    }
+    if importlib.util.find_spec("aiohttp") is None:
+        options["async_client_args"] = client_args  # client.aio uses httpx too unless aiohttp is installed
+    if base_url:
+        options["base_url"] = base_url
+    return genai.Client(api_key=api_key, http_options=genai_types.HttpOptions(**options))
+
+
+@register_provider("openai-async", modules=("openai",))
+def _create_openai_async(registry, api_key, base_url):
+    from openai import AsyncOpenAI, Timeout
+
+    return AsyncOpenAI(
+        api_key=api_key,
+        base_url=base_url,
+        timeout=Timeout(registry.read_timeout, connect=registry.connect_timeout),
+        max_retries=0,  # 429s are retried by the app's shared rate limiter, not per client
+    )
@@ -0,0 +1,124 @@
+# BM25 lexical index over the stations, towns and NPCs of a world
+import heapq
+import math
+import re
+from collections import Counter, defaultdict
+
+from context_manager import estimate_tokens
+
+K1 = 1.5
+B = 0.75
+
+STOPWORDS = frozenset("""
+a an and are as at be by for from has have he her his i in into is it its me my of on or our she
+so that the their them there they this to was we were what where which who will with you your
+""".split())
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text):
+    return [word for word in _WORD.findall(text.lower()) if word not in STOPWORDS]
+
+
+def station_passages(station_name, station):
+    """One passage for the station and each of its towns and NPCs, each tagged with where it lives."""
+    passages = [{"kind": "station", "title": station.get("name", station_name),
+                 "text": station["description"], "station": station_name, "town": None}]
+    for town_name, town in station["towns"].items():
+        passages.append({"kind": "town", "title": f"{town['name']} ({station_name})",
+                         "text": town["description"], "station": station_name, "town": town_name})
+        for npc in town.get("npcs", {}).values():
+            passages.append({"kind": "npc", "title": f"{npc['name']} of {town['name']}",
+                             "text": npc["description"], "station": station_name, "town": town_name})
+    return passages
+
+
+def world_passages(world_data):
+    passages = []
+    for station_name, station in world_data["stations"].items():
+        passages.extend(station_passages(station_name, station))
+    return passages
+
+
+def passage_terms(passage):
+    return tokenize(f"{passage['title']} {passage['text']}")
+
+
+def bm25_norms(lengths):
+    """Per-passage BM25 length normalisation, precomputed so queries only add and divide."""
+    average_length = sum(lengths) / len(lengths) if lengths else 0.0
+    return [K1 * (1 - B + B * length / average_length) if average_length else K1 for length in lengths]
+
+
+def bm25_idf(count, document_frequency):
+    return math.log(1 + (count - document_frequency + 0.5) / (document_frequency + 0.5))
+
+
+class LoreIndex:
+    """Okapi BM25 inverted index built once per world.
+
+    `search` scores only the postings of the query terms, so query cost depends
+    on how common those terms are rather than on the size of the world.
+    """
+
+    def __init__(self, passages):
+        self.passages = passages
+        self._postings = defaultdict(list)  # term -> [(passage_id, term_frequency)]
+        self._lengths = []
+        for passage_id, passage in enumerate(passages):
+            terms = passage_terms(passage)
+            self._lengths.append(len(terms))
+            for term, frequency in Counter(terms).items():
+                self._postings[term].append((passage_id, frequency))
+        self._norms = bm25_norms(self._lengths)
+        self._idf = {term: bm25_idf(len(passages), len(postings)) for term, postings in self._postings.items()}
+
+    @classmethod
+    def from_world(cls, world_data):
+        return cls(world_passages(world_data))
+
+    def postings(self, term):
+        """(idf, [(passage_id, term_frequency), ...]) of `term`, or None if no passage contains it."""
+        idf = self._idf.get(term)
+        return None if idf is None else (idf, self._postings[term])
+
+    def passage(self, passage_id):
+        return self.passages[passage_id]
+
+    def search(self, query, k=5, token_budget=None, exclude=None):
+        """Return up to `k` passages for `query`, best first, within `token_budget` tokens.
+
+        `exclude(passage)` can reject passages the prompt already contains.
+        """
+        scores = defaultdict(float)
+        norms = self._norms
+        for term in set(tokenize(query)):
+            found = self.postings(term)
+            if found is None:
+                continue
+            idf, postings = found
+            weight = idf * (K1 + 1)
+            for passage_id, frequency in postings:
+                scores[passage_id] += weight * frequency / (frequency + norms[passage_id])
+
+        results = []
+        remaining = token_budget
+        # Over-fetch a little so excluded or oversized passages don't starve the result
+        for passage_id in heapq.nlargest(k * 3, scores, key=scores.get):
+            passage = self.passage(passage_id)
+            if exclude is not None and exclude(passage):
+                continue
+            if remaining is not None:
+                cost = estimate_tokens(passage["text"]) + estimate_tokens(passage["title"])
+                if cost > remaining:
+                    continue
+                remaining -= cost
+            results.append(passage)
+            if len(results) == k:
+                break
+        return results
+
+
+def format_lore(passages):
+    return "\n".join(f"- {passage['title']}: {passage['text']}" for passage in passages)
@@ -0,0 +1,222 @@
+# Process-wide timing spans, counters and histograms with Prometheus text export
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+TOKEN_BUCKETS = (16, 64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384, 32768)
+BYTE_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus style, plus the last observation."""
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # final slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self.last = None
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+        self.last = value
+
+    def quantile(self, q):
+        """Estimate a quantile by interpolating inside the bucket that contains it."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            if seen + bucket_count >= rank and bucket_count:
+                lower = self.buckets[index - 1] if index > 0 else 0.0
+                upper = self.buckets[index] if index < len(self.buckets) else self.buckets[-1]
+                return lower + (upper - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+        return self.buckets[-1]
+
+
+def _label_key(labels):
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _format_labels(label_key, extra=()):
+    pairs = list(label_key) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape_label(value)}"' for key, value in pairs) + "}"
+
+
+def _escape_label(value):
+    # Prometheus text format: backslash, double quote and newline are escaped in label values
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Metrics:
+    """Thread-safe registry of counters, gauges and histograms keyed by name and labels.
+
+    Gauges are callables registered with `gauge()` and read at export time, so
+    they report current levels (e.g. a queue depth) without being kept in sync.
+    """
+
+    def __init__(self, prefix="aurora_"):
+        self.prefix = prefix
+        self._counters = {}    # name -> {label_key: value}
+        self._gauges = {}      # name -> {label_key: callable}
+        self._histograms = {}  # name -> {label_key: Histogram}
+        self._buckets = {}     # name -> bucket bounds
+        self._help = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name, value=1, **labels):
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            key = _label_key(labels)
+            series[key] = series.get(key, 0) + value
+
+    def gauge(self, name, read, **labels):
+        """Report `read()` as the current value of `name`; registering again replaces it."""
+        with self._lock:
+            self._gauges.setdefault(name, {})[_label_key(labels)] = read
+
+    def _read_gauges(self):
+        # Read outside the lock: a gauge may take locks of its own
+        with self._lock:
+            gauges = {name: dict(series) for name, series in self._gauges.items()}
+        values = {}
+        for name, series in sorted(gauges.items()):
+            for key, read in sorted(series.items()):
+                try:
+                    values.setdefault(name, {})[key] = read()
+                except Exception:
+                    continue
+        return values
+
+    def observe(self, name, value, buckets=LATENCY_BUCKETS, **labels):
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            self._buckets.setdefault(name, buckets)
+            key = _label_key(labels)
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram(self._buckets[name])
+            histogram.observe(value)
+
+    @contextmanager
+    def span(self, name, **labels):
+        """Time the enclosed block into the `<name>_seconds` histogram."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(f"{name}_seconds", time.perf_counter() - start, **labels)
+
+    def describe(self, name, text):
+        self._help[name] = text
+
+    def snapshot(self):
+        """Summary rows for display: one per histogram series."""
+        rows = []
+        gauges = self._read_gauges()
+        with self._lock:
+            for name, series in sorted(self._histograms.items()):
+                for key, histogram in sorted(series.items()):
+                    rows.append({
+                        "metric": name + _format_labels(key),
+                        "count": histogram.count,
+                        "mean": histogram.sum / histogram.count if histogram.count else None,
+                        "p50": histogram.quantile(0.5),
+                        "p95": histogram.quantile(0.95),
+                        "last": histogram.last,
+                    })
+            counters = {name + _format_labels(key): value
+                        for name, series in sorted(self._counters.items())
+                        for key, value in sorted(series.items())}
+        for name, series in gauges.items():
+            for key, value in series.items():
+                counters[name + _format_labels(key)] = value
+        return rows, counters
+
+    def render_prometheus(self):
+        lines = []
+        for name, series in self._read_gauges().items():
+            full_name = self.prefix + name
+            if name in self._help:
+                lines.append(f"# HELP {full_name} {self._help[name]}")
+            lines.append(f"# TYPE {full_name} gauge")
+            for key, value in series.items():
+                lines.append(f"{full_name}{_format_labels(key)} {value}")
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                full_name = self.prefix + name
+                if name in self._help:
+                    lines.append(f"# HELP {full_name} {self._help[name]}")
+                lines.append(f"# TYPE {full_name} counter")
+                for key, value in sorted(series.items()):
+                    lines.append(f"{full_name}{_format_labels(key)} {value}")
+            for name, series in sorted(self._histograms.items()):
+                full_name = self.prefix + name
+                if name in self._help:
+                    lines.append(f"# HELP {full_name} {self._help[name]}")
+                lines.append(f"# TYPE {full_name} histogram")
+                for key, histogram in sorted(series.items()):
+                    cumulative = 0
+                    for bound, bucket_count in zip(histogram.buckets + ("+Inf",), histogram.counts):
+                        cumulative += bucket_count
+                        lines.append(f"{full_name}_bucket{_format_labels(key, [('le', bound)])} {cumulative}")
+                    lines.append(f"{full_name}_sum{_format_labels(key)} {histogram.sum}")
+                    lines.append(f"{full_name}_count{_format_labels(key)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def write_file(self, path):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(self.render_prometheus())
+        os.replace(tmp_path, path)
+
+
+def start_http_exporter(metrics, port, host="127.0.0.1"):
+    """Serve `metrics` in Prometheus text format at http://host:port/metrics."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            data = metrics.render_prometheus().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-exporter", daemon=True).start()
+    return server
+
+
+def start_file_exporter(metrics, path, interval=15.0):
+    """Rewrite `path` with the Prometheus text every `interval` seconds (for node-exporter textfile collectors)."""
+
+    def run():
+        while True:
+            try:
+                metrics.write_file(path)
+            except OSError:
+                pass
+            time.sleep(interval)
+
+    thread = threading.Thread(target=run, name="metrics-file-exporter", daemon=True)
+    thread.start()
+    return thread
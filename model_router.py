@@ -0,0 +1,194 @@
+# Health-aware model routing with per-model circuit breakers and optional hedging
+import asyncio
+import threading
+import time
+from collections import deque
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+DEFAULT_WINDOW_SECONDS = 60.0
+DEFAULT_MIN_REQUESTS = 4
+DEFAULT_ERROR_THRESHOLD = 0.5
+DEFAULT_OPEN_SECONDS = 30.0
+
+
+class CircuitOpen(RuntimeError):
+    """A model was skipped because its single half-open probe is already running."""
+
+
+class ModelHealth:
+    """Rolling window of call outcomes for one model plus its circuit state."""
+
+    def __init__(self, window_seconds):
+        self.window_seconds = window_seconds
+        self.calls = deque()  # (finished_at, ok, latency)
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+
+    def record(self, now, ok, latency):
+        self.calls.append((now, ok, latency))
+        self.trim(now)
+
+    def trim(self, now):
+        while self.calls and now - self.calls[0][0] > self.window_seconds:
+            self.calls.popleft()
+
+    def error_rate(self):
+        if not self.calls:
+            return 0.0
+        return sum(1 for _, ok, _ in self.calls if not ok) / len(self.calls)
+
+    def latency(self, quantile=0.5):
+        latencies = sorted(latency for _, ok, latency in self.calls if ok)
+        if not latencies:
+            return None
+        return latencies[min(len(latencies) - 1, int(quantile * len(latencies)))]
+
+
+class ModelRouter:
+    """Orders models by health and opens a circuit on models that keep failing.
+
+    A model whose error rate over the last `window_seconds` reaches
+    `error_threshold` (after at least `min_requests` calls) is skipped for
+    `open_seconds`. After that a single half-open probe is let through: success
+    closes the circuit, failure opens it again. When `hedge_after` is set,
+    `call_async` starts the next model if the first has not answered within that many
+    seconds and returns whichever succeeds first.
+    """
+
+    def __init__(self, models, window_seconds=DEFAULT_WINDOW_SECONDS, min_requests=DEFAULT_MIN_REQUESTS,
+                 error_threshold=DEFAULT_ERROR_THRESHOLD, open_seconds=DEFAULT_OPEN_SECONDS,
+                 hedge_after=None, clock=time.monotonic):
+        self.models = list(models)
+        self.min_requests = min_requests
+        self.error_threshold = error_threshold
+        self.open_seconds = open_seconds
+        self.hedge_after = hedge_after
+        self.clock = clock
+        self._health = {model: ModelHealth(window_seconds) for model in self.models}
+        self._lock = threading.Lock()
+
+    def candidates(self):
+        """Models to try for the next request, best first.
+
+        Healthy models keep their configured preference order. A model due for a
+        half-open probe is tried first so it can rejoin quickly. If every circuit
+        is open, all models are returned so a request is still attempted. The
+        probe is only claimed when a call starts, see `acquire()`.
+        """
+        now = self.clock()
+        probes, healthy = [], []
+        with self._lock:
+            for model in self.models:
+                health = self._health[model]
+                health.trim(now)
+                if health.state == OPEN and now - health.opened_at >= self.open_seconds:
+                    health.state = HALF_OPEN
+                    health.probe_in_flight = False
+                if health.state == CLOSED:
+                    healthy.append(model)
+                elif health.state == HALF_OPEN and not health.probe_in_flight:
+                    probes.append(model)
+        return probes + healthy or list(self.models)
+
+    def acquire(self, model):
+        """Call right before calling `model`: claims its half-open probe, or returns False if already claimed."""
+        with self._lock:
+            health = self._health[model]
+            if health.state != HALF_OPEN:
+                return True
+            if health.probe_in_flight:
+                return False
+            health.probe_in_flight = True
+            return True
+
+    def record_success(self, model, latency):
+        with self._lock:
+            health = self._health[model]
+            health.record(self.clock(), True, latency)
+            if health.state == HALF_OPEN:
+                health.state = CLOSED
+                health.calls.clear()
+                health.calls.append((self.clock(), True, latency))
+            health.probe_in_flight = False
+
+    def record_failure(self, model, latency):
+        with self._lock:
+            now = self.clock()
+            health = self._health[model]
+            health.record(now, False, latency)
+            health.probe_in_flight = False
+            if health.state == HALF_OPEN or (
+                    len(health.calls) >= self.min_requests and health.error_rate() >= self.error_threshold):
+                health.state = OPEN
+                health.opened_at = now
+
+    def release(self, model):
+        """Give up a call to `model` without an outcome (it was cancelled), freeing its half-open probe."""
+        with self._lock:
+            self._health[model].probe_in_flight = False
+
+    async def call_async(self, fn):
+        """Await `fn(model)` on the best available model, falling back (or hedging) as needed."""
+        models = self.candidates()
+        if self.hedge_after is not None and len(models) > 1:
+            return await self._call_hedged_async(fn, models)
+        last_error = None
+        for model in models:
+            try:
+                return await self._timed_async(fn, model)
+            except Exception as e:
+                last_error = e
+        raise last_error
+
+    def stats(self):
+        with self._lock:
+            now = self.clock()
+            report = {}
+            for model, health in self._health.items():
+                health.trim(now)
+                report[model] = {
+                    "state": health.state,
+                    "requests": len(health.calls),
+                    "error_rate": health.error_rate(),
+                    "p50_latency": health.latency(0.5),
+                    "p95_latency": health.latency(0.95),
+                }
+            return report
+
+    async def _timed_async(self, fn, model):
+        if not self.acquire(model):
+            raise CircuitOpen(f"Model '{model}' is already being probed")
+        start = time.perf_counter()
+        try:
+            result = await fn(model)
+        except Exception:
+            self.record_failure(model, time.perf_counter() - start)
+            raise
+        except BaseException:
+            self.release(model)  # cancelled, e.g. the losing side of a hedge: let the next request probe it
+            raise
+        self.record_success(model, time.perf_counter() - start)
+        return result
+
+    async def _call_hedged_async(self, fn, models):
+        pending = {asyncio.ensure_future(self._timed_async(fn, models[0]))}
+        remaining = list(models[1:])
+        last_error = None
+        try:
+            while pending:
+                timeout = self.hedge_after if remaining else None
+                done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    last_error = task.exception()
+                if remaining and (not done or not pending):
+                    pending.add(asyncio.ensure_future(self._timed_async(fn, remaining.pop(0))))
+            raise last_error
+        finally:
+            for task in pending:
+                task.cancel()  # the slower call's answer is not needed
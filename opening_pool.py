@@ -0,0 +1,141 @@
+# Pool of pre-generated opening scenes, refilled by a background worker
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TARGET_DEPTH = 3
+DEFAULT_TTL_SECONDS = 3600.0
+DEFAULT_MAX_KEYS = 16
+DEFAULT_RETRY_SECONDS = 60.0
+MAX_WAIT_SECONDS = 3600.0  # the worker re-checks at least this often, so any TTL is a valid wait
+
+
+class OpeningPool:
+    """Keeps up to `target_depth` ready-made openings per key for instant new games.
+
+    A key (e.g. starting station, town and provider) is registered together
+    with a `generate()` callable. A single background thread calls it until the
+    key holds `target_depth` fresh entries. `take(key)` never blocks: it returns
+    a ready entry or None and then schedules a refill. Entries older than
+    `ttl_seconds` are discarded. At most `max_keys` keys are kept; the least
+    recently used one is dropped first. A key whose generator fails is retried
+    after `retry_seconds`.
+    """
+
+    def __init__(self, target_depth=DEFAULT_TARGET_DEPTH, ttl_seconds=DEFAULT_TTL_SECONDS,
+                 max_keys=DEFAULT_MAX_KEYS, retry_seconds=DEFAULT_RETRY_SECONDS):
+        self.target_depth = target_depth
+        self.ttl_seconds = ttl_seconds
+        self.max_keys = max_keys
+        self.retry_seconds = retry_seconds
+        self._pools = OrderedDict()  # key -> {"generate", "entries", "retry_at"}
+        self._condition = threading.Condition()
+        self._worker = None
+        self.hits = 0
+        self.misses = 0
+        self.generated = 0
+        self.expired = 0
+        self.failures = 0
+
+    def register(self, key, generate):
+        """Register (or refresh the generator for) `key` and make sure it gets filled."""
+        with self._condition:
+            pool = self._pools.get(key)
+            if pool is None:
+                pool = self._pools[key] = {"generate": generate, "entries": deque(), "retry_at": 0.0}
+                while len(self._pools) > self.max_keys:
+                    self._pools.popitem(last=False)
+            else:
+                pool["generate"] = generate
+            self._pools.move_to_end(key)
+            self._start_worker()
+            self._condition.notify()
+
+    def take(self, key):
+        """Return a ready entry for `key`, or None if the pool is empty."""
+        with self._condition:
+            pool = self._pools.get(key)
+            entry = None
+            if pool is not None:
+                self._expire(pool)
+                if pool["entries"]:
+                    entry = pool["entries"].popleft()[1]
+                self._pools.move_to_end(key)
+                self._condition.notify()
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return entry
+
+    def depth(self):
+        """Number of ready entries across all keys."""
+        with self._condition:
+            return sum(len(pool["entries"]) for pool in self._pools.values())
+
+    def stats(self):
+        with self._condition:
+            lookups = self.hits + self.misses
+            return {
+                "depth": {key: len(pool["entries"]) for key, pool in self._pools.items()},
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "generated": self.generated,
+                "expired": self.expired,
+                "failures": self.failures,
+            }
+
+    def _expire(self, pool):
+        now = time.monotonic()
+        while pool["entries"] and now - pool["entries"][0][0] > self.ttl_seconds:
+            pool["entries"].popleft()
+            self.expired += 1
+
+    def _start_worker(self):
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(target=self._run, name="opening-pool", daemon=True)
+            self._worker.start()
+
+    def _next_job(self):
+        # Called with the lock held: the most recently used key that is below target depth
+        now = time.monotonic()
+        wake_times = []
+        for key in reversed(self._pools):
+            pool = self._pools[key]
+            self._expire(pool)
+            if pool["entries"]:
+                wake_times.append(pool["entries"][0][0] + self.ttl_seconds - now)
+            if len(pool["entries"]) >= self.target_depth:
+                continue
+            if pool["retry_at"] > now:
+                wake_times.append(pool["retry_at"] - now)
+                continue
+            return key, pool["generate"], None
+        # Nothing to do: sleep until an entry expires or a failed key may be retried
+        return None, None, min(max(0.0, min(wake_times)), MAX_WAIT_SECONDS) if wake_times else None
+
+    def _run(self):
+        while True:
+            with self._condition:
+                key, generate, wait_for = self._next_job()
+                if key is None:
+                    self._condition.wait(timeout=wait_for)
+                    continue
+            try:
+                entry = generate()
+            except Exception as e:
+                logger.warning("Opening generation failed for %s: %s", key, e)
+                with self._condition:
+                    self.failures += 1
+                    if key in self._pools:
+                        self._pools[key]["retry_at"] = time.monotonic() + self.retry_seconds
+                continue
+            with self._condition:
+                if key in self._pools:
+                    self._pools[key]["entries"].append((time.monotonic(), entry))
+                    self._pools[key]["retry_at"] = 0.0
+                    self.generated += 1
@@ -0,0 +1,222 @@
+# Async provider calls: Gemini (with model fallback) and DeepSeek, behind the shared rate limiter
+import time
+from contextlib import contextmanager
+
+from context_manager import estimate_tokens
+from model_router import CircuitOpen
+from rate_limiter import INTERACTIVE
+
+GEMINI_MODELS = ["gemini-3-flash-preview", "gemini-2.5-flash"]  # In order of preference
+DEEPSEEK_MODEL = "deepseek-chat"
+DEEPSEEK_BASE_URL = "https://api.deepseek.com/v1"
+
+# Tokens reserved for the reply when a call is admitted; corrected once the reply is known
+REPLY_TOKEN_ESTIMATE = 400
+
+
+def build_conversation(messages):
+    return "\n".join([f"{m['role']}: {m['content']}" for m in messages])
+
+
+def extract_response_text(response):
+    if response is None:
+        return ""
+    text = getattr(response, "text", None)
+    if text:
+        return text
+    candidates = getattr(response, "candidates", None)
+    if candidates:
+        parts = getattr(candidates[0].content, "parts", [])
+        for part in parts:
+            part_text = getattr(part, "text", None)
+            if part_text:
+                return part_text
+    return ""
+
+
+def make_genai_config(**kwargs):
+    from google.genai import types as genai_types  # imported with the provider, not at startup
+    config_class = getattr(genai_types, "GenerateContentConfig", None)
+    if config_class is None:
+        return None
+    return config_class(**kwargs)
+
+
+def prompt_tokens(messages):
+    return sum(estimate_tokens(message["content"]) for message in messages) + REPLY_TOKEN_ESTIMATE
+
+
+async def first_chunk_ready(chunks):
+    # Waits for the first chunk so quota errors surface while the call can still be retried
+    iterator = chunks.__aiter__()
+    try:
+        first = await iterator.__anext__()
+    except StopAsyncIteration:
+        first = None
+
+    async def replay():
+        if first is not None:
+            yield first
+        async for chunk in iterator:
+            yield chunk
+
+    return replay()
+
+
+class _Provider:
+    def __init__(self, registry, limiter, metrics=None):
+        self.registry = registry
+        self.limiter = limiter
+        self.metrics = metrics
+
+    @contextmanager
+    def _attempt(self, model_name):
+        # Times one call to one model and counts its outcome, so fallbacks show up in the metrics
+        if self.metrics is None:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.metrics.inc("model_attempts_total", model=model_name, outcome="error")
+            raise
+        finally:
+            self.metrics.observe("model_attempt_seconds", time.perf_counter() - start, model=model_name)
+        self.metrics.inc("model_attempts_total", model=model_name, outcome="ok")
+
+
+class GeminiProvider(_Provider):
+    """Gemini through `client.aio`, trying the router's models in order of health.
+
+    A streamed reply falls back to the next model only while nothing has been
+    yielded; a complete reply may also be hedged onto the backup model.
+    """
+
+    def __init__(self, registry, router, limiter, metrics=None):
+        super().__init__(registry, limiter, metrics)
+        self.router = router
+
+    async def stream(self, messages, api_key, temperature, priority=INTERACTIVE, on_queue=None):
+        client = self.registry.get("gemini", api_key).aio
+        conversation = build_conversation(messages)
+        config = make_genai_config(temperature=temperature)
+        kwargs = {"config": config} if config is not None else {}
+        tokens = prompt_tokens(messages)
+        produced = False
+        last_error = None
+        for model_name in self.router.candidates():
+            if not self.router.acquire(model_name):
+                last_error = CircuitOpen(f"Model '{model_name}' is already being probed")
+                continue
+            start = time.perf_counter()
+            first_chunk_latency = None
+            reply_tokens = 0
+
+            async def open_stream(model_name=model_name):
+                return await first_chunk_ready(await client.models.generate_content_stream(
+                    model=model_name,
+                    contents=conversation,
+                    **kwargs,
+                ))
+
+            try:
+                with self._attempt(model_name):
+                    chunks = await self.limiter.call_async(model_name, open_stream, tokens=tokens,
+                                                           priority=priority, on_wait=on_queue)
+                    async for chunk in chunks:
+                        text = extract_response_text(chunk)
+                        if text:
+                            if first_chunk_latency is None:
+                                first_chunk_latency = time.perf_counter() - start
+                            produced = True
+                            reply_tokens += estimate_tokens(text)
+                            yield text
+                self.router.record_success(model_name, first_chunk_latency or time.perf_counter() - start)
+                self.limiter.charge(model_name, reply_tokens - REPLY_TOKEN_ESTIMATE)
+                return
+            except Exception as e:
+                self.router.record_failure(model_name, time.perf_counter() - start)
+                # Only fall back while nothing has been shown to the player yet
+                if produced:
+                    raise
+                last_error = e
+            except BaseException:
+                # Closed or cancelled mid-call (e.g. a Streamlit interrupt): no outcome, but free a half-open probe
+                self.router.release(model_name)
+                raise
+        raise last_error
+
+    async def complete(self, messages, api_key, temperature, priority=INTERACTIVE, on_queue=None):
+        client = self.registry.get("gemini", api_key).aio
+        conversation = build_conversation(messages)
+        config = make_genai_config(temperature=temperature)
+        kwargs = {"config": config} if config is not None else {}
+        tokens = prompt_tokens(messages)
+
+        async def attempt(model_name):
+            async def call():
+                return await client.models.generate_content(
+                    model=model_name,
+                    contents=conversation,
+                    **kwargs,
+                )
+
+            with self._attempt(model_name):
+                response = await self.limiter.call_async(model_name, call, tokens=tokens,
+                                                         priority=priority, on_wait=on_queue)
+            self.limiter.charge(model_name, estimate_tokens(extract_response_text(response)) - REPLY_TOKEN_ESTIMATE)
+            return response
+
+        # The router skips models with an open circuit and can hedge onto the backup model
+        return extract_response_text(await self.router.call_async(attempt))
+
+
+class OpenAICompatibleProvider(_Provider):
+    """An OpenAI-compatible chat API (DeepSeek) through the pooled AsyncOpenAI client."""
+
+    def __init__(self, registry, limiter, metrics=None, base_url=DEEPSEEK_BASE_URL, model=DEEPSEEK_MODEL):
+        super().__init__(registry, limiter, metrics)
+        self.base_url = base_url
+        self.model = model
+
+    async def stream(self, messages, api_key, temperature, priority=INTERACTIVE, on_queue=None):
+        client = self.registry.get("openai-async", api_key, self.base_url)
+
+        async def open_stream():
+            return await first_chunk_ready(await client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                temperature=temperature,
+                stream=True,
+            ))
+
+        reply_tokens = 0
+        with self._attempt(self.model):
+            stream = await self.limiter.call_async(self.model, open_stream, tokens=prompt_tokens(messages),
+                                                   priority=priority, on_wait=on_queue)
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
+                text = chunk.choices[0].delta.content
+                if text:
+                    reply_tokens += estimate_tokens(text)
+                    yield text
+        self.limiter.charge(self.model, reply_tokens - REPLY_TOKEN_ESTIMATE)
+
+    async def complete(self, messages, api_key, temperature, priority=INTERACTIVE, on_queue=None):
+        client = self.registry.get("openai-async", api_key, self.base_url)
+
+        async def call():
+            return await client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                temperature=temperature, # Use the temperature parameter
+            )
+
+        with self._attempt(self.model):
+            response = await self.limiter.call_async(self.model, call, tokens=prompt_tokens(messages),
+                                                     priority=priority, on_wait=on_queue)
+        text = response.choices[0].message.content
+        self.limiter.charge(self.model, estimate_tokens(text or "") - REPLY_TOKEN_ESTIMATE)
+        return text
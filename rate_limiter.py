@@ -0,0 +1,293 @@
+# Process-wide admission control for provider APIs: token buckets behind a fair queue
+import asyncio
+import random
+import threading
+import time
+
+DEFAULT_MAX_WAIT = 30.0      # seconds a request may queue before it is turned away
+DEFAULT_RETRIES = 3          # retries after a rate-limit (429) answer
+DEFAULT_BACKOFF = 1.0        # first backoff in seconds, doubled per retry
+DEFAULT_MAX_BACKOFF = 30.0
+DEFAULT_BURST_SECONDS = 60.0  # quota that may be spent at once; providers count per minute
+ASYNC_POLL_SECONDS = 0.05     # async waiters cannot block on the lock's condition, so they poll
+
+INTERACTIVE = 0  # a player is waiting for the answer
+BACKGROUND = 1   # prefetch work (openings, scene images) that yields to players
+
+
+class QueueTimeout(Exception):
+    """Raised when a request cannot be admitted within the queue's wait bound."""
+
+
+def retry_after(error):
+    """Seconds the provider asked us to wait if `error` is a rate-limit answer, 0.0 without a hint, else None.
+
+    Works with the OpenAI SDK (`status_code`), google-genai (`code`) and
+    urllib (`code`) errors; `Retry-After` is read from the response headers.
+    """
+    status = getattr(error, "status_code", None) or getattr(error, "code", None)
+    if status != 429 and getattr(error, "status", None) != "RESOURCE_EXHAUSTED":
+        return None
+    headers = getattr(error, "headers", None) or getattr(getattr(error, "response", None), "headers", None)
+    try:
+        return max(0.0, float(headers.get("retry-after")))
+    except (AttributeError, TypeError, ValueError):
+        return 0.0
+
+
+class TokenBucket:
+    """Refills at `per_minute / 60` units per second up to `burst_seconds` worth.
+
+    The level may go negative when a request turns out to cost more than it
+    was admitted for; later requests then wait until the debt is repaid.
+    """
+
+    def __init__(self, per_minute, burst_seconds=DEFAULT_BURST_SECONDS, clock=time.monotonic):
+        self.rate = per_minute / 60.0
+        self.capacity = max(1.0, self.rate * burst_seconds)
+        self.clock = clock
+        self.level = self.capacity
+        self.updated = clock()
+
+    def refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, amount, now):
+        """Seconds until `amount` (capped at the capacity) can be taken."""
+        self.refill(now)
+        missing = min(amount, self.capacity) - self.level
+        return missing / self.rate if missing > 0 else 0.0
+
+    def take(self, amount, now):
+        self.refill(now)
+        self.level -= amount
+
+
+class Limiter:
+    """Request and token buckets for one model, plus the requests queued for it."""
+
+    def __init__(self, requests_per_minute=None, tokens_per_minute=None, burst_seconds=DEFAULT_BURST_SECONDS,
+                 clock=time.monotonic):
+        self.requests = TokenBucket(requests_per_minute, burst_seconds, clock) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute, burst_seconds, clock) if tokens_per_minute else None
+        self.paused_until = 0.0
+        self.waiting = {}  # ticket -> (priority, order)
+
+    def delay(self, tokens, now):
+        delay = max(0.0, self.paused_until - now)
+        if self.requests is not None:
+            delay = max(delay, self.requests.delay(1, now))
+        if self.tokens is not None and tokens:
+            delay = max(delay, self.tokens.delay(tokens, now))
+        return delay
+
+    def take(self, tokens, now):
+        if self.requests is not None:
+            self.requests.take(1, now)
+        if self.tokens is not None and tokens:
+            self.tokens.take(tokens, now)
+
+    def position(self, ticket):
+        """1-based place of `ticket` in the queue: players first, then arrival order."""
+        rank = self.waiting[ticket]
+        return 1 + sum(1 for other in self.waiting.values() if other < rank)
+
+
+class RateLimiter:
+    """Admits provider calls at the configured requests/min and tokens/min of each model.
+
+    `limits` maps a model name to {"rpm": ..., "tpm": ...}; either may be left
+    out, and models without limits are admitted at once. Callers wait in one
+    queue per model, served strictly in order (interactive requests before
+    background ones), so a burst of sessions is spread over the quota instead
+    of being answered with 429s. A request that would wait longer than
+    `max_wait` is turned away with QueueTimeout. When the provider still
+    answers 429, the whole model is paused for the Retry-After time (or an
+    exponential backoff with jitter) and the request is retried at the head of
+    the queue, up to `retries` times. At most `burst_seconds` of quota is
+    spent at once after an idle spell.
+
+    `observe(name, value, **labels)` and `count(name, **labels)` receive wait
+    times and outcomes; they match `Metrics.observe` and `Metrics.inc`.
+    """
+
+    def __init__(self, limits=None, max_wait=DEFAULT_MAX_WAIT, retries=DEFAULT_RETRIES,
+                 backoff=DEFAULT_BACKOFF, max_backoff=DEFAULT_MAX_BACKOFF, burst_seconds=DEFAULT_BURST_SECONDS,
+                 observe=None, count=None, clock=time.monotonic):
+        self.limits = dict(limits or {})
+        self.burst_seconds = burst_seconds
+        self.max_wait = max_wait
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.observe = observe
+        self.count = count
+        self.clock = clock
+        self._limiters = {}
+        self._condition = threading.Condition()
+        self._order = 0
+
+    def call(self, model, fn, tokens=0, priority=INTERACTIVE, on_wait=None):
+        """Run `fn()` once `model` has capacity for one request of `tokens` tokens, retrying on 429s.
+
+        `on_wait(position, delay)` is called whenever the caller's place in the
+        queue changes while it waits; `delay` is the expected wait in seconds
+        once it is at the front, otherwise None.
+        """
+        order = self._next_order()
+        for attempt in range(self.retries + 1):
+            self.acquire(model, tokens, priority, on_wait, order=order)
+            try:
+                return fn()
+            except Exception as e:
+                self._after_error(model, e, attempt)
+
+    async def call_async(self, model, fn, tokens=0, priority=INTERACTIVE, on_wait=None):
+        """`call` for coroutines: awaits `fn()` and waits for admission without blocking the event loop."""
+        order = self._next_order()
+        for attempt in range(self.retries + 1):
+            await self.acquire_async(model, tokens, priority, on_wait, order=order)
+            try:
+                return await fn()
+            except Exception as e:
+                self._after_error(model, e, attempt)
+
+    def acquire(self, model, tokens=0, priority=INTERACTIVE, on_wait=None, order=None):
+        """Block until `model` can take one request of `tokens` tokens. Returns the seconds waited."""
+        start = self.clock()
+        limiter, ticket = self._enqueue(model, priority, order)
+        reported = None
+        try:
+            while True:
+                with self._condition:
+                    position, delay, wait = self._poll(model, limiter, ticket, tokens, start + self.max_wait)
+                    if position is None:
+                        break
+                    if position == reported or on_wait is None:
+                        self._condition.wait(wait)
+                        continue
+                reported = position
+                on_wait(position, delay)  # outside the lock: it may render UI
+        except BaseException as e:
+            self._abandon(model, limiter, ticket, e)
+            raise
+        return self._admitted(model, start)
+
+    async def acquire_async(self, model, tokens=0, priority=INTERACTIVE, on_wait=None, order=None):
+        """`acquire` for event loops: polls the queue instead of blocking on the lock's condition."""
+        start = self.clock()
+        limiter, ticket = self._enqueue(model, priority, order)
+        reported = None
+        try:
+            while True:
+                with self._condition:
+                    position, delay, wait = self._poll(model, limiter, ticket, tokens, start + self.max_wait)
+                if position is None:
+                    break
+                if position != reported and on_wait is not None:
+                    reported = position
+                    on_wait(position, delay)
+                await asyncio.sleep(min(wait, ASYNC_POLL_SECONDS))
+        except BaseException as e:
+            self._abandon(model, limiter, ticket, e)
+            raise
+        return self._admitted(model, start)
+
+    def charge(self, model, tokens):
+        """Correct the token bucket once a call's real size is known (negative refunds)."""
+        with self._condition:
+            limiter = self._limiter(model)
+            if limiter.tokens is not None and tokens:
+                limiter.tokens.take(tokens, self.clock())
+                self._condition.notify_all()
+
+    def pause(self, model, seconds):
+        """Hold every request for `model` for `seconds`, e.g. after the provider answered 429."""
+        with self._condition:
+            limiter = self._limiter(model)
+            limiter.paused_until = max(limiter.paused_until, self.clock() + seconds)
+            self._condition.notify_all()
+
+    def stats(self):
+        with self._condition:
+            now = self.clock()
+            for limiter in self._limiters.values():
+                for bucket in (limiter.requests, limiter.tokens):
+                    if bucket is not None:
+                        bucket.refill(now)
+            return {model: {"queued": len(limiter.waiting),
+                            "paused": max(0.0, limiter.paused_until - now),
+                            "requests_left": None if limiter.requests is None else limiter.requests.level,
+                            "tokens_left": None if limiter.tokens is None else limiter.tokens.level}
+                    for model, limiter in self._limiters.items()}
+
+    def _enqueue(self, model, priority, order):
+        ticket = object()
+        with self._condition:
+            limiter = self._limiter(model)
+            limiter.waiting[ticket] = (priority, self._next_order() if order is None else order)
+            self._condition.notify_all()  # a player may have jumped ahead of the current head
+        return limiter, ticket
+
+    def _poll(self, model, limiter, ticket, tokens, deadline):
+        # Admits `ticket` if it is at the front and the buckets allow it. Otherwise returns
+        # (position, delay, seconds to wait before polling again). Called with the lock held.
+        now = self.clock()
+        position = limiter.position(ticket)
+        delay = limiter.delay(tokens, now) if position == 1 else None
+        if delay == 0.0:
+            limiter.take(tokens, now)
+            del limiter.waiting[ticket]
+            self._condition.notify_all()
+            return None, None, None
+        remaining = deadline - now
+        if remaining <= 0 or (delay is not None and delay > remaining):
+            raise QueueTimeout(f"{model} is at its rate limit; try again in a moment")
+        return position, delay, min(remaining, delay) if delay is not None else remaining
+
+    def _abandon(self, model, limiter, ticket, error):
+        with self._condition:
+            limiter.waiting.pop(ticket, None)
+            self._condition.notify_all()
+        if isinstance(error, QueueTimeout):
+            self._inc("rate_limit_rejected_total", model=model)
+
+    def _admitted(self, model, start):
+        waited = self.clock() - start
+        self._inc("rate_limit_admitted_total", model=model)
+        if self.observe is not None:
+            self.observe("rate_limit_wait_seconds", waited, model=model)
+        return waited
+
+    def _after_error(self, model, error, attempt):
+        # Re-raises `error` unless it is a 429 worth retrying, in which case the model is paused first
+        hint = retry_after(error)
+        if hint is None:
+            raise error
+        self._inc("rate_limit_throttled_total", model=model)
+        if attempt == self.retries:
+            raise error
+        self.pause(model, hint or self._backoff(attempt))
+
+    def _limiter(self, model):
+        limiter = self._limiters.get(model)
+        if limiter is None:
+            limits = self.limits.get(model, {})
+            limiter = self._limiters[model] = Limiter(limits.get("rpm"), limits.get("tpm"), self.burst_seconds,
+                                                        self.clock)
+        return limiter
+
+    def _next_order(self):
+        with self._condition:
+            self._order += 1
+            return self._order
+
+    def _backoff(self, attempt):
+        # "Equal jitter": at least half the exponential delay, so retries of many sessions spread out
+        delay = min(self.max_backoff, self.backoff * 2 ** attempt)
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def _inc(self, name, **labels):
+        if self.count is not None:
+            self.count(name, **labels)
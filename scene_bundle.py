@@ -0,0 +1,286 @@
+# Pre-rendered town scene images: an offline batch job and the bundle the app serves them from
+#
+# Walks every station and town in the world file, asks the image model for a
+# scene per town and stores it resized as WebP next to a manifest.json. Runs
+# can be interrupted and restarted: towns already in the manifest with an
+# unchanged prompt are skipped.
+#
+#   GEMINI_API_KEY=... python scene_bundle.py --world aurora_nexus_world.json --out assets/scenes --workers 4
+import argparse
+import hashlib
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import image_pipeline
+
+logger = logging.getLogger(__name__)
+
+MANIFEST = "manifest.json"
+DEFAULT_MODEL = "gemini-2.0-flash-exp-image-generation"
+DEFAULT_WIDTH = image_pipeline.DISPLAY_WIDTH
+DEFAULT_QUALITY = 80
+DEFAULT_MAX_CACHED = 64  # encoded images the app keeps in memory
+
+
+def town_prompt(world_name, station, town):
+    """The image prompt for one town, built from its description."""
+    return (f"Create a sci-fi image in widescreen cinematic format and 5:2 aspect ratio, depicting "
+            f"{town['name']} on {station['name']}, in the world of {world_name}. {town['description']} "
+            f"No text or lettering in the image.")
+
+
+def prompt_digest(model, prompt):
+    return hashlib.sha256(f"{model}\0{prompt}".encode("utf-8")).hexdigest()
+
+
+def _slug(name):
+    return re.sub(r"[^a-z0-9]+", "-", name.lower()).strip("-") or "scene"
+
+
+class SceneBundle:
+    """Read side of a bundle directory: the manifest plus one WebP file per town.
+
+    `get(station, town)` returns `(image_bytes, caption)` or None. The
+    manifest is read on first use and re-read when the file changes, so a
+    batch run that finishes while the app is up is picked up without a
+    restart. Up to `max_cached` images are kept in memory, after passing
+    through `transform(bytes) -> bytes` once if one is given. A town whose
+    image cannot be read or transformed stays a miss until the manifest changes.
+    """
+
+    def __init__(self, directory, max_cached=DEFAULT_MAX_CACHED, transform=None):
+        self.directory = directory
+        self.max_cached = max_cached
+        self.transform = transform
+        self._scenes = {}
+        self._manifest_mtime = None
+        self._cache = OrderedDict()  # file -> bytes
+        self._unreadable = set()     # (station, town) whose image failed for this manifest
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, station, town):
+        with self._lock:
+            self._refresh()
+            entry = self._scenes.get(station, {}).get(town)
+            data = None if entry is None else self._cache.get(entry["file"])
+            if data is not None:
+                self._cache.move_to_end(entry["file"])
+                self.hits += 1
+                return data, f"{town}, {station}"
+            if entry is None or (station, town) in self._unreadable:
+                self.misses += 1
+                return None
+            manifest_mtime = self._manifest_mtime
+        data = self._read(entry["file"])  # outside the lock, so other sessions are not held up by a decode
+        with self._lock:
+            if data is None:
+                if manifest_mtime == self._manifest_mtime:
+                    self._unreadable.add((station, town))  # not retried on every turn in this town
+                self.misses += 1
+                return None
+            self._cache[entry["file"]] = data
+            while len(self._cache) > self.max_cached:
+                self._cache.popitem(last=False)
+            self.hits += 1
+            return data, f"{town}, {station}"
+
+    def _read(self, name):
+        # A missing or unreadable image is a miss: the town falls back to a generated scene
+        try:
+            with open(os.path.join(self.directory, name), "rb") as f:
+                data = f.read()
+            return self.transform(data) if self.transform is not None else data
+        except Exception as e:
+            logger.warning("Skipping scene image %s: %s", name, e)
+            return None
+
+    def stats(self):
+        with self._lock:
+            towns = sum(len(towns) for towns in self._scenes.values())
+            return {"towns": towns, "cached": len(self._cache), "hits": self.hits, "misses": self.misses}
+
+    def _refresh(self):
+        path = os.path.join(self.directory, MANIFEST)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            self._scenes, self._manifest_mtime = {}, None
+            return
+        if mtime == self._manifest_mtime:
+            return
+        try:
+            with open(path, encoding="utf-8") as f:
+                self._scenes = json.load(f).get("scenes", {})
+        except (OSError, ValueError) as e:
+            logger.warning("Could not read scene manifest %s: %s", path, e)
+            self._scenes = {}
+        self._manifest_mtime = mtime
+        self._cache.clear()
+        self._unreadable.clear()
+
+
+# --- Batch job ---
+
+def load_manifest(directory):
+    try:
+        with open(os.path.join(directory, MANIFEST), encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"scenes": {}}
+
+
+def _write_atomic(path, data):
+    temporary = f"{path}.tmp"
+    with open(temporary, "wb") as f:
+        f.write(data)
+    os.replace(temporary, path)
+
+
+def optimise(payload, width=DEFAULT_WIDTH, quality=DEFAULT_QUALITY):
+    """Scale an encoded image down to `width` and re-encode it as WebP. Returns (bytes, (w, h))."""
+    return image_pipeline.prepare(payload, width, "WEBP", quality)
+
+
+def render_scene(client, model, prompt):
+    """Generate one image and return its encoded bytes as sent by the API."""
+    import base64
+
+    from google.genai import types as genai_types
+
+    response = client.models.generate_content(
+        model=model,
+        contents=prompt,
+        config=genai_types.GenerateContentConfig(response_modalities=["Text", "Image"]),
+    )
+    for candidate in getattr(response, "candidates", None) or []:
+        for part in getattr(candidate.content, "parts", None) or []:
+            inline = getattr(part, "inline_data", None)
+            if inline is not None and inline.data:
+                return base64.b64decode(inline.data) if isinstance(inline.data, str) else inline.data
+    text = getattr(response, "text", None)
+    raise RuntimeError(f"No image in the response{': ' + text[:100] if text else ''}")
+
+
+def plan(world_data, manifest, model, directory, force=False, only=None):
+    """Towns that still need an image, as (station, town, prompt, digest) tuples."""
+    todo = []
+    # Keyed like the world's own "stations" and "towns" objects, which is how the app looks scenes up
+    for station_name, station in world_data["stations"].items():
+        for town_name, town in station.get("towns", {}).items():
+            if only and town_name not in only and town["name"] not in only:
+                continue
+            prompt = town_prompt(world_data["name"], station, town)
+            digest = prompt_digest(model, prompt)
+            entry = manifest["scenes"].get(station_name, {}).get(town_name)
+            done = (entry is not None and entry.get("prompt_sha") == digest
+                    and os.path.exists(os.path.join(directory, entry["file"])))
+            if force or not done:
+                todo.append((station_name, town_name, prompt, digest))
+    return todo
+
+
+def build(world_data, directory, generate, model=DEFAULT_MODEL, workers=4, width=DEFAULT_WIDTH,
+          quality=DEFAULT_QUALITY, force=False, only=None, progress=print):
+    """Render every missing town with `generate(prompt)` on `workers` threads; returns (done, failed).
+
+    The manifest is rewritten after each finished town, so an interrupted run
+    resumes where it stopped.
+    """
+    os.makedirs(directory, exist_ok=True)
+    manifest = load_manifest(directory)
+    manifest.update(world=world_data["name"], model=model, width=width, format="WEBP")
+    todo = plan(world_data, manifest, model, directory, force, only)
+    progress(f"{len(todo)} of {sum(len(s.get('towns', {})) for s in world_data['stations'].values())} towns to render")
+    lock = threading.Lock()
+    done, failed = 0, []
+
+    def render(station, town, prompt, digest):
+        start = time.perf_counter()
+        payload = generate(prompt)
+        generated = time.perf_counter() - start
+        data, size = optimise(payload, width, quality)
+        name = f"{_slug(station)}--{_slug(town)}-{digest[:8]}.webp"
+        _write_atomic(os.path.join(directory, name), data)
+        return name, size, len(payload), len(data), generated
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="scene-bundle") as executor:
+        futures = {executor.submit(render, *job): job for job in todo}
+        for future in as_completed(futures):
+            station, town, prompt, digest = futures[future]
+            try:
+                name, size, raw_bytes, webp_bytes, generated = future.result()
+            except Exception as e:
+                failed.append((station, town, str(e)))
+                progress(f"  failed  {town} ({station}): {e}")
+                continue
+            with lock:
+                previous = manifest["scenes"].setdefault(station, {}).get(town)
+                manifest["scenes"][station][town] = {
+                    "file": name, "prompt_sha": digest, "width": size[0], "height": size[1],
+                    "bytes": webp_bytes, "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                }
+                _write_atomic(os.path.join(directory, MANIFEST), json.dumps(manifest, indent=2).encode("utf-8"))
+                if previous and previous["file"] != name:
+                    try:
+                        os.remove(os.path.join(directory, previous["file"]))
+                    except OSError:
+                        pass
+                done += 1
+            progress(f"  {done}/{len(todo)}  {town} ({station}): {generated:.1f}s, "
+                     f"{raw_bytes / 1024:.0f} KiB -> {webp_bytes / 1024:.0f} KiB WebP {size[0]}x{size[1]}")
+    return done, failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-render a scene image for every town in the world file")
+    parser.add_argument("--world", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "aurora_nexus_world.json"))
+    parser.add_argument("--out", default=os.path.join("assets", "scenes"), help="bundle directory")
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    parser.add_argument("--workers", type=int, default=4, help="images generated at once")
+    parser.add_argument("--rpm", type=float, help="requests/min allowed by the image model's quota")
+    parser.add_argument("--width", type=int, default=DEFAULT_WIDTH, help="maximum width of the stored images")
+    parser.add_argument("--quality", type=int, default=DEFAULT_QUALITY, help="WebP quality (0-100)")
+    parser.add_argument("--force", action="store_true", help="re-render towns that are already in the bundle")
+    parser.add_argument("--only", action="append", help="render only this town (repeatable)")
+    parser.add_argument("--dry-run", action="store_true", help="list the towns that would be rendered")
+    args = parser.parse_args()
+
+    with open(args.world, encoding="utf-8") as f:
+        world_data = json.load(f)
+    if args.dry_run:
+        for station, town, _, _ in plan(world_data, load_manifest(args.out), args.model, args.out, args.force, args.only):
+            print(f"{town} ({station})")
+        return
+
+    from llm_clients import ClientRegistry
+    from rate_limiter import RateLimiter
+
+    api_key = os.environ.get("GEMINI_API_KEY") or os.environ.get("GOOGLE_API_KEY")
+    if not api_key:
+        sys.exit("Set GEMINI_API_KEY (or GOOGLE_API_KEY) to render scene images.")
+    client = ClientRegistry(read_timeout=180).get("gemini", api_key)
+    limiter = RateLimiter({args.model: {"rpm": args.rpm}} if args.rpm else {}, max_wait=3600, burst_seconds=1)
+
+    def generate(prompt):
+        return limiter.call(args.model, lambda: render_scene(client, args.model, prompt))
+
+    start = time.perf_counter()
+    done, failed = build(world_data, args.out, generate, model=args.model, workers=args.workers,
+                         width=args.width, quality=args.quality, force=args.force, only=args.only)
+    print(f"{done} rendered, {len(failed)} failed in {time.perf_counter() - start:.1f}s; bundle at {os.path.abspath(args.out)}")
+    if failed:
+        print("Run the same command again to retry the failed towns.")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+# Compact per-player game state with idle sessions spilled to SQLite
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import weakref
+from array import array
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_IDLE_SECONDS = 900.0           # spill sessions untouched for this long
+DEFAULT_MAX_RESIDENT = 200             # ... and the least recently used beyond this many
+DEFAULT_SWEEP_SECONDS = 60.0
+DEFAULT_BUSY_TIMEOUT = 600.0           # a run that never released its session is treated as finished
+DEFAULT_RETENTION_SECONDS = 7 * 86400  # spilled rows of sessions that never came back
+
+
+class MessageStore:
+    """Append-only chat history kept as a role-code array plus a list of strings.
+
+    Behaves like the list of {"role", "content"} dicts the app used before:
+    indexing returns a fresh dict, slicing a list of them. Storing one byte per
+    role and a bare string per message avoids a dict per message.
+    """
+
+    ROLES = ("system", "user", "assistant")
+    __slots__ = ("_roles", "_contents")
+
+    def __init__(self, messages=()):
+        self._roles = array("B")
+        self._contents = []
+        for message in messages:
+            self.append(message)
+
+    def append(self, message):
+        self._roles.append(self.ROLES.index(message["role"]))
+        self._contents.append(message["content"])
+
+    def __len__(self):
+        return len(self._contents)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._message(i) for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        return self._message(index)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self._message(index)
+
+    def _message(self, index):
+        return {"role": self.ROLES[self._roles[index]], "content": self._contents[index]}
+
+    def to_rows(self):
+        return [[role, content] for role, content in zip(self._roles, self._contents)]
+
+    @classmethod
+    def from_rows(cls, rows):
+        store = cls()
+        for role, content in rows:
+            store._roles.append(role)
+            store._contents.append(content)
+        return store
+
+
+class PlayerState:
+    """One player's game state: location, inventory, chat history and scene images.
+
+    `world_data` is a reference to the shared, read-only world identified by
+    `world_id`; it is never copied or persisted. Scene images are kept as
+    encoded bytes, keyed by the index of the message they illustrate.
+    """
+
+    __slots__ = ("session_id", "game_id", "game_seq", "world_id", "world_data", "current_station", "current_town",
+                 "inventory", "messages", "message_images", "resident", "last_used", "busy_since",
+                 "__weakref__")
+
+    def __init__(self, session_id):
+        self.session_id = session_id
+        self.game_id = None
+        self.game_seq = None  # the game log's sequence number this state is at
+        self.world_id = None
+        self.world_data = None
+        self.current_station = None
+        self.current_town = None
+        self.inventory = {}
+        self.messages = MessageStore()
+        self.message_images = {}
+        self.resident = True
+        self.last_used = time.monotonic()
+        self.busy_since = None
+
+    def to_dict(self):
+        """JSON-ready game state, without the world or the scene images."""
+        return {
+            "game_id": self.game_id,
+            "game_seq": self.game_seq,
+            "world_id": self.world_id,
+            "current_station": self.current_station,
+            "current_town": self.current_town,
+            "inventory": self.inventory,
+            "messages": self.messages.to_rows(),
+        }
+
+    def load_dict(self, payload, world_data):
+        self.game_id = payload.get("game_id")
+        self.game_seq = payload.get("game_seq")
+        self.world_id = payload["world_id"]
+        self.world_data = world_data
+        self.current_station = payload["current_station"]
+        self.current_town = payload["current_town"]
+        self.inventory = dict(payload["inventory"])
+        self.messages = MessageStore.from_rows(payload["messages"])
+
+
+class SessionStore:
+    """Tracks every live PlayerState and moves idle ones out of memory.
+
+    A background sweep spills states that have not been used for
+    `idle_seconds`, and the least recently used ones while more than
+    `max_resident` are in memory, to a SQLite database at `path`. Spilled
+    states keep only their identity; `activate()` reloads them on the next
+    script run. States are held weakly, so a closed browser session is freed
+    normally, and rows left behind are pruned after `retention_seconds`.
+    `resolve_world(world_id)` maps a stored world ID back to the shared world.
+    """
+
+    def __init__(self, path, resolve_world, idle_seconds=DEFAULT_IDLE_SECONDS,
+                 max_resident=DEFAULT_MAX_RESIDENT, sweep_seconds=DEFAULT_SWEEP_SECONDS,
+                 busy_timeout=DEFAULT_BUSY_TIMEOUT, retention_seconds=DEFAULT_RETENTION_SECONDS):
+        self.path = path
+        self.resolve_world = resolve_world
+        self.idle_seconds = idle_seconds
+        self.max_resident = max_resident
+        self.sweep_seconds = sweep_seconds
+        self.busy_timeout = busy_timeout
+        self.retention_seconds = retention_seconds
+        self._states = weakref.WeakValueDictionary()  # session_id -> PlayerState
+        self._lock = threading.RLock()
+        self._db = self._connect()
+        self._sweeper = None
+        self.spills = 0
+        self.reloads = 0
+
+    def create(self, session_id):
+        state = PlayerState(session_id)
+        with self._lock:
+            self._states[session_id] = state
+        self._start_sweeper()
+        return state
+
+    def activate(self, state):
+        """Mark `state` in use by a script run, reloading it first if it was spilled."""
+        with self._lock:
+            if not state.resident:
+                self._reload(state)
+            state.last_used = time.monotonic()
+            state.busy_since = state.last_used
+        return state
+
+    def release(self, state):
+        """Mark the end of a script run; the state may be spilled once it has been idle long enough."""
+        with self._lock:
+            state.last_used = time.monotonic()
+            state.busy_since = None
+
+    def sweep(self, now=None):
+        """Spill idle states and prune abandoned rows. Returns the number of states spilled."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            idle = [state for state in list(self._states.values())
+                    if state.resident and self._spillable(state, now)]
+            idle.sort(key=lambda state: state.last_used)
+            resident = sum(1 for state in list(self._states.values()) if state.resident)
+            spilled = 0
+            for state in idle:
+                if now - state.last_used < self.idle_seconds and resident - spilled <= self.max_resident:
+                    break
+                self._spill(state)
+                spilled += 1
+            self._db.execute("DELETE FROM sessions WHERE updated_at < ?", (time.time() - self.retention_seconds,))
+            self._db.execute("DELETE FROM images WHERE session_id NOT IN (SELECT session_id FROM sessions)")
+            self._db.commit()
+            return spilled
+
+    def stats(self):
+        with self._lock:
+            states = list(self._states.values())
+            stored = self._db.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+            return {"resident": sum(1 for state in states if state.resident),
+                    "spilled": sum(1 for state in states if not state.resident),
+                    "stored": stored, "spills": self.spills, "reloads": self.reloads}
+
+    def _spillable(self, state, now):
+        return state.busy_since is None or now - state.busy_since > self.busy_timeout
+
+    def _spill(self, state):
+        payload = state.to_dict()
+        self._db.execute("REPLACE INTO sessions (session_id, state, updated_at) VALUES (?, ?, ?)",
+                         (state.session_id, json.dumps(payload), time.time()))
+        self._db.execute("DELETE FROM images WHERE session_id = ?", (state.session_id,))
+        self._db.executemany(
+            "INSERT INTO images (session_id, message_index, caption, data) VALUES (?, ?, ?, ?)",
+            [(state.session_id, index, caption, data)
+             for index, (data, caption) in state.message_images.items()])
+        self._db.commit()
+        state.world_data = None
+        state.inventory = None
+        state.messages = None
+        state.message_images = None
+        state.resident = False
+        self.spills += 1
+
+    def _reload(self, state):
+        row = self._db.execute("SELECT state FROM sessions WHERE session_id = ?", (state.session_id,)).fetchone()
+        if row is None:  # pruned or database removed: start over with an empty state
+            logger.warning("No stored state for session %s", state.session_id)
+            payload = {"world_id": None, "current_station": None, "current_town": None,
+                       "inventory": {}, "messages": []}
+        else:
+            payload = json.loads(row[0])
+        images = self._db.execute("SELECT message_index, caption, data FROM images WHERE session_id = ?",
+                                  (state.session_id,)).fetchall()
+        world_data = self.resolve_world(payload["world_id"]) if payload["world_id"] else None  # None starts a new game
+        state.load_dict(payload, world_data)
+        state.message_images = {index: (bytes(data), caption) for index, caption, data in images}
+        state.resident = True
+        self._db.execute("DELETE FROM sessions WHERE session_id = ?", (state.session_id,))
+        self._db.execute("DELETE FROM images WHERE session_id = ?", (state.session_id,))
+        self._db.commit()
+        self.reloads += 1
+
+    def _connect(self):
+        if self.path != ":memory:":
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        db = sqlite3.connect(self.path, check_same_thread=False)  # every use holds self._lock
+        db.execute("CREATE TABLE IF NOT EXISTS sessions "
+                   "(session_id TEXT PRIMARY KEY, state TEXT NOT NULL, updated_at REAL NOT NULL)")
+        db.execute("CREATE TABLE IF NOT EXISTS images (session_id TEXT NOT NULL, message_index INTEGER NOT NULL, "
+                   "caption TEXT, data BLOB NOT NULL, PRIMARY KEY (session_id, message_index))")
+        db.commit()
+        return db
+
+    def _start_sweeper(self):
+        with self._lock:
+            if self._sweeper is None or not self._sweeper.is_alive():
+                self._sweeper = threading.Thread(target=self._run_sweeper, name="session-sweeper", daemon=True)
+                self._sweeper.start()
+
+    def _run_sweeper(self):
+        while True:
+            time.sleep(self.sweep_seconds)
+            try:
+                self.sweep()
+            except sqlite3.Error as e:
+                logger.warning("Session sweep failed: %s", e)
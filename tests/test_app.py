@@ -0,0 +1,27 @@
+import os
+
+import pytest
+
+APP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    testing = pytest.importorskip("streamlit.testing.v1")
+    monkeypatch.chdir(tmp_path)  # caches and game logs go under .cache/
+    monkeypatch.setenv("WORLD_URL", "")
+    monkeypatch.setenv("OPENING_POOL_DEPTH", "0")
+    monkeypatch.setenv("HISTORY_PAGE_SIZE", "1")
+    at = testing.AppTest.from_file(APP, default_timeout=60)
+    at.secrets["GEMINI_API_KEY"] = ""  # quick commands are answered without a provider
+    return at.run()
+
+
+def test_turns_beyond_a_page_trigger_a_full_run(app):
+    # Each turn adds two messages, more than the one-message page: the turn fragment hands
+    # over to a full run, which renders only the latest page instead of every turn since load
+    for turn in range(4):
+        app.chat_input[0].set_value("inventory").run()
+        assert not app.exception
+        assert len(app.session_state["player"].messages) == 4 + 2 * turn
+        assert [message.markdown[0].value for message in app.chat_message] == ["Your Inventory:\nEmpty"]
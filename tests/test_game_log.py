@@ -0,0 +1,28 @@
+import pytest
+
+from game_log import GameConflict, GameLog
+
+
+def state():
+    return {"game_id": None, "world_id": "w", "current_station": "s", "current_town": "t",
+            "inventory": {}, "messages": []}
+
+
+def test_games_are_listed_and_loaded_per_owner():
+    log = GameLog(":memory:")
+    mine = log.new_game(state(), owner="alice")
+    log.new_game(state(), owner="bob")
+    assert [game["game_id"] for game in log.list_games(owner="alice")] == [mine]
+    assert log.load(mine, owner="alice")["game_id"] == mine
+    with pytest.raises(KeyError):
+        log.load(mine, owner="bob")
+
+
+def test_writer_behind_the_log_gets_a_conflict():
+    log = GameLog(":memory:")
+    game_id = log.new_game(state(), owner="alice")
+    first = log.append(game_id, "move", {"station": "s", "town": "u"}, after=0)
+    assert log.load(game_id, owner="alice")["game_seq"] == first
+    log.append(game_id, "move", {"station": "s", "town": "v"}, after=first)  # the game resumed in another tab
+    with pytest.raises(GameConflict):
+        log.append(game_id, "move", {"station": "s", "town": "w"}, after=first)
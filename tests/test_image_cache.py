@@ -0,0 +1,27 @@
+import os
+
+from image_cache import ImageCache, cache_key
+
+
+def test_disk_tier_survives_a_restart_and_evicts_oldest(tmp_path):
+    cache = ImageCache(str(tmp_path), memory_bytes=0, disk_bytes=10)
+    cache.put("model", "first", b"12345")
+    cache.put("model", "second", b"67890")
+    assert cache.get("model", "first") == b"12345"  # now the most recently used
+    cache.put("model", "third", b"abcde")
+
+    restarted = ImageCache(str(tmp_path), memory_bytes=0, disk_bytes=10)
+    assert restarted.get("model", "second") is None
+    assert restarted.get("model", "first") == b"12345"
+    assert restarted.get("model", "third") == b"abcde"
+    assert restarted.stats()["disk_bytes"] == 10
+
+
+def test_missing_file_is_a_miss(tmp_path):
+    cache = ImageCache(str(tmp_path), memory_bytes=0)
+    cache.put("model", "prompt", b"image")
+    os.remove(os.path.join(str(tmp_path), cache_key("model", "prompt") + ".img"))
+    assert cache.get("model", "prompt") is None
+    assert cache.stats()["disk_entries"] == 0
+    cache.put("model", "prompt", b"image")
+    assert cache.get("model", "prompt") == b"image"
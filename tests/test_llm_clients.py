@@ -0,0 +1,73 @@
+import asyncio
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from llm_clients import ClientRegistry
+
+COMPLETION = {
+    "id": "chatcmpl-test", "object": "chat.completion", "created": 0, "model": "test-model",
+    "choices": [{"index": 0, "finish_reason": "stop",
+                 "message": {"role": "assistant", "content": "You enter the town."}}],
+}
+
+
+class CountingServer(ThreadingHTTPServer):
+    """Stand-in OpenAI endpoint that counts the TCP connections it accepts."""
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), CompletionHandler)
+        self.connections = 0
+
+    def process_request(self, request, client_address):
+        self.connections += 1
+        super().process_request(request, client_address)
+
+
+class CompletionHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        data = json.dumps(COMPLETION).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+@pytest.fixture
+def server():
+    server = CountingServer()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_pooled_client_reuses_one_connection(server):
+    pytest.importorskip("openai")
+    base_url = f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+    async def play():
+        registry = ClientRegistry(loop=asyncio.get_running_loop())
+        for _ in range(5):
+            client = registry.get("openai-async", "test-key", base_url)
+            response = await client.chat.completions.create(
+                model="test-model", messages=[{"role": "user", "content": "look"}])
+            assert response.choices[0].message.content == "You enter the town."
+        stats = registry.stats()
+        await asyncio.gather(*registry.close_all())
+        return stats
+
+    stats = asyncio.run(play())
+    assert stats["created"] == 1 and stats["reused"] == 4
+    assert server.connections == 1
@@ -0,0 +1,41 @@
+import time
+
+from metrics import Metrics
+from opening_pool import OpeningPool
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_gauge_reports_the_current_pool_depth():
+    metrics = Metrics()
+    pool = OpeningPool(target_depth=1, ttl_seconds=float("inf"))  # the worker must survive an unbounded TTL
+    metrics.gauge("opening_pool_depth", pool.depth)
+    assert "# TYPE aurora_opening_pool_depth gauge\naurora_opening_pool_depth 0" in metrics.render_prometheus()
+
+    pool.register("key", lambda: {"text": "opening", "image": None})
+    wait_for(lambda: pool.depth() == 1)
+    assert "aurora_opening_pool_depth 1" in metrics.render_prometheus()
+    assert metrics.snapshot()[1]["opening_pool_depth"] == 1
+
+    assert pool.take("key") == {"text": "opening", "image": None}  # the worker refills it once more
+    pool.register("key", lambda: {"text": "another", "image": None})
+    wait_for(lambda: pool.depth() == 1)
+
+
+def test_failing_gauge_is_skipped():
+    metrics = Metrics()
+    metrics.gauge("broken", lambda: 1 / 0)
+    metrics.inc("requests_total")
+    assert "broken" not in metrics.render_prometheus()
+    assert "aurora_requests_total 1" in metrics.render_prometheus()
+
+
+def test_label_values_are_escaped():
+    metrics = Metrics()
+    metrics.inc("requests_total", world='The "Nexus"\\\nII')
+    assert 'aurora_requests_total{world="The \\"Nexus\\"\\\\\\nII"} 1' in metrics.render_prometheus()
@@ -0,0 +1,78 @@
+import asyncio
+
+from model_router import CLOSED, HALF_OPEN, ModelRouter
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def open_circuit(router, model):
+    for _ in range(router.min_requests):
+        router.record_failure(model, 0.01)
+
+
+def test_cancelled_hedge_releases_half_open_probe():
+    clock = Clock()
+    router = ModelRouter(["a", "b"], min_requests=2, open_seconds=30, hedge_after=0.01, clock=clock)
+    open_circuit(router, "a")
+    clock.now += 31  # "a" is due for its half-open probe
+
+    async def call(model):
+        if model == "a":
+            await asyncio.sleep(10)  # the probe hangs; "b" wins the hedge and "a" is cancelled
+        return model
+
+    assert asyncio.run(router.call_async(call)) == "b"
+    assert router.stats()["a"]["state"] == HALF_OPEN
+    clock.now += 300
+    assert router.candidates()[0] == "a"
+
+
+def test_probe_success_closes_circuit():
+    clock = Clock()
+    router = ModelRouter(["a", "b"], min_requests=2, open_seconds=30, clock=clock)
+    open_circuit(router, "a")
+    assert router.candidates() == ["b"]
+    clock.now += 31
+
+    async def call(model):
+        return model
+
+    assert asyncio.run(router.call_async(call)) == "a"
+    assert router.stats()["a"]["state"] == CLOSED
+
+
+def test_unused_half_open_probe_stays_available():
+    clock = Clock()
+    router = ModelRouter(["a", "b", "c"], min_requests=2, open_seconds=30, clock=clock)
+    open_circuit(router, "a")
+    open_circuit(router, "b")
+    clock.now += 31  # both are due for a probe; the call succeeds on "a" and never reaches "b"
+
+    async def call(model):
+        return model
+
+    assert asyncio.run(router.call_async(call)) == "a"
+    clock.now += 1000
+    assert router.candidates()[0] == "b"
+    assert asyncio.run(router.call_async(call)) == "b"
+    assert router.stats()["b"]["state"] == CLOSED
+
+
+def test_claimed_probe_is_skipped():
+    clock = Clock()
+    router = ModelRouter(["a", "b"], min_requests=2, open_seconds=30, clock=clock)
+    open_circuit(router, "a")
+    clock.now += 31
+    assert router.candidates()[0] == "a"
+    assert router.acquire("a")  # another request starts the probe first
+
+    async def call(model):
+        return model
+
+    assert asyncio.run(router.call_async(call)) == "b"
@@ -0,0 +1,36 @@
+import json
+
+from scene_bundle import MANIFEST, SceneBundle, plan
+
+
+def write_bundle(directory, files):
+    scenes = {"Station": {town: {"file": name} for town, name in files.items()}}
+    (directory / MANIFEST).write_text(json.dumps({"scenes": scenes}))
+
+
+def test_unreadable_image_is_a_miss(tmp_path):
+    (tmp_path / "good.webp").write_bytes(b"good")
+    (tmp_path / "bad.webp").write_bytes(b"not an image")
+    write_bundle(tmp_path, {"Good": "good.webp", "Bad": "bad.webp"})
+
+    transformed = []
+
+    def transform(data):
+        transformed.append(data)
+        if data != b"good":
+            raise OSError("cannot identify image file")
+        return b"display:" + data
+
+    bundle = SceneBundle(str(tmp_path), transform=transform)
+    assert bundle.get("Station", "Good") == (b"display:good", "Good, Station")
+    assert bundle.get("Station", "Bad") is None
+    assert bundle.get("Station", "Bad") is None
+    assert transformed.count(b"not an image") == 1
+    assert bundle.stats()["misses"] == 2
+
+
+def test_plan_uses_the_world_keys(tmp_path):
+    world = {"name": "World", "stations": {"station-key": {
+        "name": "Station Name", "description": "d",
+        "towns": {"town-key": {"name": "Town Name", "description": "d"}}}}}
+    assert [job[:2] for job in plan(world, {"scenes": {}}, "model", str(tmp_path))] == [("station-key", "town-key")]
@@ -0,0 +1,385 @@
+# Compiled, memory-mapped world index: ID tables, a station/town adjacency list and prompt fragments
+#
+# The compiler turns a world JSON into one file: a header with the station,
+# town and NPC tables, then one JSON blob per station. Opening the file maps it
+# and reads only the header; a station's towns, NPCs and precomputed prompt
+# fragments are parsed the first time a player visits it. The lore index's
+# BM25 postings are stored packed, so a lore search reads only the postings of
+# its query terms and the stations of the passages it returns.
+#
+#   python world_index.py aurora_nexus_world.json .cache/world/aurora_nexus_world.idx
+import argparse
+import bisect
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+from collections import Counter, OrderedDict
+from collections.abc import Mapping
+
+from commands import find_town as _find_town_in_dict
+from commands import normalize
+from lore_index import LoreIndex, bm25_idf, bm25_norms, passage_terms, station_passages
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"AWORLDIX"
+FORMAT = 2
+_PREAMBLE = struct.Struct("<8sIQQ")  # magic, format, header offset, header length
+_PASSAGE = struct.Struct("<II")  # lore passage: station ID, position among the station's passages
+DEFAULT_MAX_STATIONS = 256  # parsed stations kept in memory per world
+
+
+# --- Prompt fragments ---
+# The same text for plain and compiled worlds; compiled ones store it per town.
+
+def location_description(town):
+    description = f"**{town['name']}:** {town['description']}\n\n"
+    npc_names = [npc['name'] for npc in town['npcs'].values()] if 'npcs' in town else []
+    if npc_names:
+        description += f"**Notable inhabitants you see around you:** {', '.join(npc_names)}.\n"
+    return description
+
+
+def who_is_here(town):
+    npc_names = [npc['name'] for npc in town.get('npcs', {}).values()]
+    if not npc_names:
+        return f"Nobody of note is around {town['name']} right now."
+    return f"**Around you in {town['name']}:** {', '.join(npc_names)}."
+
+
+def npc_lines(town):
+    if 'npcs' not in town:
+        return "None visible.\n"
+    return "".join(f"- {npc['name']}: {npc['description']}\n" for npc in town['npcs'].values())
+
+
+def _fragments(town):
+    # Text needed on every turn; the opening's NPC list is built once per game instead
+    return {"location": location_description(town), "who": who_is_here(town)}
+
+
+def town_fragments(world_data, station, town):
+    """Prompt fragments of one town: "location" (the look description) and "who"."""
+    if isinstance(world_data, CompiledWorld):
+        return world_data.fragments(station, town)
+    return _fragments(world_data["stations"][station]["towns"][town])
+
+
+def find_town(world_data, current_station, name):
+    """commands.find_town, answered from the name index when the world is compiled."""
+    if isinstance(world_data, CompiledWorld):
+        return world_data.find_town(current_station, name)
+    return _find_town_in_dict(world_data, current_station, name)
+
+
+def world_lore(world_data):
+    """The world's LoreIndex: read from the index file when compiled, built in memory otherwise."""
+    if isinstance(world_data, CompiledWorld):
+        return world_data.lore()
+    return LoreIndex.from_world(world_data)
+
+
+# --- Compiler ---
+
+def compile_world(world_data, path, world_id=None, meta=None):
+    """Write `world_data` to `path` as a world index. Returns the number of bytes written.
+
+    `world_id` is stored so the compiled world keeps the ID of its JSON form;
+    `meta` is any JSON-ready data to keep with it (e.g. HTTP validators).
+    """
+    from world_loader import world_id as content_id
+
+    header = {
+        "format": FORMAT,
+        "world_id": world_id or content_id(world_data),
+        "meta": meta or {},
+        "world": {key: value for key, value in world_data.items() if key != "stations"},
+        # Station table; each station's towns are the contiguous town IDs [first, first + count)
+        "stations": {"name": [], "normalized": [], "offset": [], "length": [], "first_town": [], "towns": []},
+        "towns": {"name": [], "normalized": [], "station": [], "first_npc": [], "npcs": []},
+    }
+    stations, towns = header["stations"], header["towns"]
+    npcs = {"name": [], "town": []}  # written as its own section, parsed only when asked for
+    postings, lengths, passages = {}, [], []  # lore: term -> [passage ID, term frequency, ...]
+    temporary = f"{path}.tmp"
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(temporary, "wb") as f:
+        f.write(_PREAMBLE.pack(MAGIC, FORMAT, 0, 0))
+        for station_id, (station_name, station) in enumerate(world_data["stations"].items()):
+            blob = json.dumps({
+                "station": station,
+                "fragments": {town_name: _fragments(town) for town_name, town in station["towns"].items()},
+            }, separators=(",", ":")).encode("utf-8")
+            stations["name"].append(station_name)
+            stations["normalized"].append(normalize(station_name))
+            stations["offset"].append(f.tell())
+            stations["length"].append(len(blob))
+            stations["first_town"].append(len(towns["name"]))
+            stations["towns"].append(len(station["towns"]))
+            f.write(blob)
+            for ordinal, passage in enumerate(station_passages(station_name, station)):
+                terms = passage_terms(passage)
+                for term, frequency in Counter(terms).items():
+                    postings.setdefault(term, []).extend((len(lengths), frequency))
+                lengths.append(len(terms))
+                passages.extend((station_id, ordinal))
+            for town_name, town in station["towns"].items():
+                towns["name"].append(town_name)
+                towns["normalized"].append(normalize(town_name))
+                towns["station"].append(station_id)
+                towns["first_npc"].append(len(npcs["name"]))
+                towns["npcs"].append(len(town.get("npcs", {})))
+                for npc in town.get("npcs", {}).values():
+                    npcs["name"].append(npc["name"])
+                    npcs["town"].append(len(towns["name"]) - 1)
+        encoded = json.dumps(npcs, separators=(",", ":")).encode("utf-8")
+        header["npcs"] = [f.tell(), len(encoded)]
+        f.write(encoded)
+        header["lore"] = _write_lore(f, postings, lengths, passages)
+        # Town IDs in order of their normalized names, for prefix lookups by bisection
+        header["prefix_order"] = sorted(range(len(towns["name"])), key=towns["normalized"].__getitem__)
+        header_offset = f.tell()
+        encoded = json.dumps(header, separators=(",", ":")).encode("utf-8")
+        f.write(encoded)
+        size = f.tell()
+        f.seek(0)
+        f.write(_PREAMBLE.pack(MAGIC, FORMAT, header_offset, len(encoded)))
+    os.replace(temporary, path)
+    return size
+
+
+def _write_lore(f, postings, lengths, passages):
+    terms = {}
+    for term, values in postings.items():
+        terms[term] = [f.tell(), len(values) // 2]
+        f.write(struct.pack(f"<{len(values)}I", *values))
+    section = {"lengths": [f.tell(), len(lengths)]}
+    f.write(struct.pack(f"<{len(lengths)}I", *lengths))
+    section["passages"] = [f.tell(), len(passages) // 2]
+    f.write(struct.pack(f"<{len(passages)}I", *passages))
+    encoded = json.dumps(terms, separators=(",", ":")).encode("utf-8")
+    section["terms"] = [f.tell(), len(encoded)]
+    f.write(encoded)
+    return section
+
+
+# --- Reader ---
+
+class CompiledWorld(Mapping):
+    """A world index opened read-only; behaves like the world's JSON object.
+
+    `world["stations"][name]` parses that station on first access and keeps up
+    to `max_stations` parsed stations. The ID tables answer name lookups and
+    list towns without touching the stations at all.
+    """
+
+    def __init__(self, path, max_stations=DEFAULT_MAX_STATIONS):
+        self.path = path
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, offset, length = _PREAMBLE.unpack_from(self._map, 0)
+        if magic != MAGIC or version != FORMAT:
+            self._map.close()
+            raise ValueError(f"{path} is not a version {FORMAT} world index")
+        header = json.loads(self._map[offset:offset + length])
+        self.world_id = header["world_id"]
+        self.meta = header["meta"]
+        self.station_table = header["stations"]
+        self.town_table = header["towns"]
+        self._npc_section = header["npcs"]
+        self._npc_table = None
+        self._lore_section = header["lore"]
+        self._lore = None
+        self._top = header["world"]
+        self._prefix_order = header["prefix_order"]
+        self._prefix_keys = [self.town_table["normalized"][town_id] for town_id in self._prefix_order]
+        self._station_ids = {name: station_id for station_id, name in enumerate(self.station_table["name"])}
+        self._towns_by_name = {}
+        for town_id, normalized in enumerate(self.town_table["normalized"]):
+            self._towns_by_name.setdefault(normalized, []).append(town_id)
+        self._stations_by_name = {}
+        for station_id, normalized in enumerate(self.station_table["normalized"]):
+            self._stations_by_name.setdefault(normalized, []).append(station_id)
+        self.stations = _Stations(self, max_stations)
+
+    # Mapping interface: the top-level keys of the JSON, with "stations" loaded lazily
+    def __getitem__(self, key):
+        if key == "stations":
+            return self.stations
+        return self._top[key]
+
+    def __iter__(self):
+        yield from self._top
+        yield "stations"
+
+    def __len__(self):
+        return len(self._top) + 1
+
+    def __eq__(self, other):
+        return self is other
+
+    __hash__ = object.__hash__
+
+    def towns(self, station):
+        """Town names of `station`, in file order, without loading it (the adjacency list)."""
+        station_id = self._station_ids[station]
+        first = self.station_table["first_town"][station_id]
+        return self.town_table["name"][first:first + self.station_table["towns"][station_id]]
+
+    def town_id(self, station, town):
+        return self.station_table["first_town"][self._station_ids[station]] + self.towns(station).index(town)
+
+    @property
+    def npc_table(self):
+        """{"name": [...], "town": [...]} by NPC ID; parsed on first use."""
+        if self._npc_table is None:
+            offset, length = self._npc_section
+            self._npc_table = json.loads(self._map[offset:offset + length])
+        return self._npc_table
+
+    def npcs(self, town_id):
+        """Names of the NPCs living in the town with `town_id`."""
+        first = self.town_table["first_npc"][town_id]
+        return self.npc_table["name"][first:first + self.town_table["npcs"][town_id]]
+
+    def lore(self):
+        """The world's lore index (a CompiledLore); its term dictionary is parsed on first use."""
+        if self._lore is None:
+            self._lore = CompiledLore(self, self._lore_section)
+        return self._lore
+
+    def fragments(self, station, town):
+        return self.stations.load(station)["fragments"][town]
+
+    def find_town(self, current_station, name):
+        """Resolve a town or station name like commands.find_town, from the name index."""
+        wanted = normalize(name)
+        current = self._station_ids.get(current_station)
+
+        def located(town_id):
+            return self.station_table["name"][self.town_table["station"][town_id]], self.town_table["name"][town_id]
+
+        exact = self._towns_by_name.get(wanted)
+        if exact:
+            here = [town_id for town_id in exact if self.town_table["station"][town_id] == current]
+            return located((here or exact)[0])
+        matching = [station_id for station_id in self._stations_by_name.get(wanted, ())
+                    if self.station_table["towns"][station_id]]
+        if matching:
+            station_id = current if current in matching else matching[0]
+            return located(self.station_table["first_town"][station_id])
+        start = bisect.bisect_left(self._prefix_keys, wanted)
+        end = bisect.bisect_left(self._prefix_keys, wanted + "\U0010ffff", start)
+        if end - start == 1:
+            return located(self._prefix_order[start])
+        return None
+
+    def stats(self):
+        return {"stations": len(self.station_table["name"]), "towns": len(self.town_table["name"]),
+                "npcs": sum(self.town_table["npcs"]), "loaded": len(self.stations._loaded),
+                "bytes": len(self._map)}
+
+
+class CompiledLore(LoreIndex):
+    """A LoreIndex whose postings stay in the world index file.
+
+    Only the term dictionary and passage lengths are held in memory; a search
+    unpacks the postings of its query terms, and passages are rebuilt from
+    their (cached) station when they make the result list.
+    """
+
+    def __init__(self, world, section):
+        self._world = world
+        offset, length = section["terms"]
+        self._terms = json.loads(world._map[offset:offset + length])  # term -> [offset, document frequency]
+        offset, count = section["lengths"]
+        self._norms = bm25_norms(struct.unpack_from(f"<{count}I", world._map, offset))
+        self._count = count
+        self._passage_table = section["passages"][0]
+
+    def __len__(self):
+        return self._count
+
+    def postings(self, term):
+        entry = self._terms.get(term)
+        if entry is None:
+            return None
+        offset, frequency = entry
+        values = struct.unpack_from(f"<{2 * frequency}I", self._world._map, offset)
+        return bm25_idf(self._count, frequency), zip(values[::2], values[1::2])
+
+    def passage(self, passage_id):
+        station_id, ordinal = _PASSAGE.unpack_from(self._world._map, self._passage_table + passage_id * _PASSAGE.size)
+        name = self._world.station_table["name"][station_id]
+        entry = self._world.stations.load(name)
+        passages = entry.get("passages")
+        if passages is None:
+            passages = entry["passages"] = station_passages(name, entry["station"])
+        return passages[ordinal]
+
+
+class _Stations(Mapping):
+    """The world's stations, parsed from the mapped file on first access (least recently used dropped)."""
+
+    def __init__(self, world, max_loaded):
+        self._world = world
+        self._max_loaded = max_loaded
+        self._loaded = OrderedDict()  # station name -> {"station": ..., "fragments": ...}
+        self._lock = threading.Lock()
+
+    def load(self, name):
+        with self._lock:
+            entry = self._loaded.get(name)
+            if entry is not None:
+                self._loaded.move_to_end(name)
+                return entry
+        table = self._world.station_table
+        station_id = self._world._station_ids[name]  # KeyError for unknown stations, as with a dict
+        offset = table["offset"][station_id]
+        entry = json.loads(self._world._map[offset:offset + table["length"][station_id]])
+        with self._lock:
+            self._loaded[name] = entry
+            while len(self._loaded) > self._max_loaded:
+                self._loaded.popitem(last=False)
+        return entry
+
+    def __getitem__(self, name):
+        return self.load(name)["station"]
+
+    def __iter__(self):
+        return iter(self._world.station_table["name"])
+
+    def __len__(self):
+        return len(self._world.station_table["name"])
+
+    def __contains__(self, name):
+        return name in self._world._station_ids
+
+
+def open_world(path, max_stations=DEFAULT_MAX_STATIONS):
+    return CompiledWorld(path, max_stations)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compile a world JSON into a memory-mapped world index")
+    parser.add_argument("world", help="world JSON file")
+    parser.add_argument("out", help="index file to write")
+    args = parser.parse_args()
+
+    from world_loader import validate_world
+
+    start = time.perf_counter()
+    with open(args.world, encoding="utf-8") as f:
+        world_data = validate_world(json.load(f))
+    size = compile_world(world_data, args.out)
+    stats = open_world(args.out).stats()
+    print(f"{stats['stations']} stations, {stats['towns']} towns, {stats['npcs']} NPCs -> "
+          f"{args.out} ({size / 1024:.0f} KiB) in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
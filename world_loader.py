@@ -0,0 +1,201 @@
+# Local-first world data loader with background revalidation of the remote copy
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+from world_index import CompiledWorld, compile_world
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_REFRESH_SECONDS = 300.0
+DEFAULT_TIMEOUT = (3.05, 10.0)  # (connect, read) seconds
+MAX_VERSIONS = 4  # recent worlds kept for sessions that started on an older version
+
+
+def world_id(world_data):
+    """Stable content ID of a world, so stored sessions can refer to it without a copy."""
+    if isinstance(world_data, CompiledWorld):
+        return world_data.world_id  # the ID of the JSON it was compiled from
+    canonical = json.dumps(world_data, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:16]
+
+
+def validate_world(world_data):
+    """Raise ValueError unless `world_data` has the shape the game relies on."""
+    if not isinstance(world_data, dict):
+        raise ValueError("World data must be a JSON object")
+    for field in ("name", "description", "stations"):
+        if field not in world_data:
+            raise ValueError(f"World data is missing '{field}'")
+    if not isinstance(world_data["stations"], dict) or not world_data["stations"]:
+        raise ValueError("World data must define at least one station")
+    for station_name, station in world_data["stations"].items():
+        if not isinstance(station.get("towns"), dict) or "description" not in station:
+            raise ValueError(f"Station '{station_name}' needs a description and a 'towns' object")
+        for town_name, town in station["towns"].items():
+            if "name" not in town or "description" not in town:
+                raise ValueError(f"Town '{town_name}' in '{station_name}' needs a name and a description")
+            for npc_key, npc in town.get("npcs", {}).items():
+                if "name" not in npc or "description" not in npc:
+                    raise ValueError(f"NPC '{npc_key}' in '{town_name}' needs a name and a description")
+    return world_data
+
+
+class WorldLoader:
+    """Serves world data from disk immediately and keeps it fresh in the background.
+
+    The first `get()` reads the on-disk cache of the last remote copy (or the
+    shipped local file if it is newer or no cache exists) and validates it.
+    Every `refresh_seconds` a background thread revalidates `remote_url` with
+    ETag / If-Modified-Since; a changed world is validated, written to the cache
+    and swapped in for subsequent `get()` calls. Callers never wait on the network.
+    The last few versions stay reachable through `by_id()` under their `world_id`.
+
+    With an `index_path`, every version is compiled into a world index (see
+    world_index.py) and served from it, so large worlds open without parsing
+    their JSON and stations are only loaded when a player gets there.
+    """
+
+    def __init__(self, local_path, remote_url=None, cache_path=None,
+                 refresh_seconds=DEFAULT_REFRESH_SECONDS, timeout=DEFAULT_TIMEOUT, index_path=None):
+        self.local_path = local_path
+        self.remote_url = remote_url
+        self.cache_path = cache_path
+        self.index_path = index_path
+        self.refresh_seconds = refresh_seconds
+        self.timeout = timeout
+        self.version = 0
+        self.world_id = None
+        self._world = None
+        self._versions = {}  # world_id -> world, oldest first
+        self._validators = {}  # ETag / Last-Modified of the cached copy
+        self._last_checked = 0.0
+        self._refreshing = False
+        self._lock = threading.Lock()
+
+    def get(self):
+        with self._lock:
+            if self._world is None:
+                self._swap(self._load_from_disk())
+            world = self._world
+        self._maybe_refresh()
+        return world
+
+    def refresh(self):
+        """Revalidate the remote copy now. Returns True if a new world was swapped in."""
+        if not self.remote_url:
+            return False
+        import requests  # only needed once a refresh runs, off the first-paint path
+
+        headers = {}
+        if self._validators.get("etag"):
+            headers["If-None-Match"] = self._validators["etag"]
+        if self._validators.get("last_modified"):
+            headers["If-Modified-Since"] = self._validators["last_modified"]
+        response = requests.get(self.remote_url, headers=headers, timeout=self.timeout)
+        if response.status_code == 304:
+            return False
+        response.raise_for_status()
+        world = validate_world(response.json())
+        validators = {
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+        }
+        if self.cache_path:
+            self._write_cache(world, validators)  # before compiling, so the index is the newer file
+        with self._lock:
+            changed = world_id(world) != self.world_id
+            self._validators = validators
+        if changed and self.index_path:
+            world = self._compile(world)  # outside the lock: players keep the current world meanwhile
+        with self._lock:
+            if changed:
+                self._swap(world)
+        return changed
+
+    def current(self):
+        """Return (world_id, world) for the current version."""
+        world = self.get()
+        with self._lock:
+            return (self.world_id, world) if world is self._world else (world_id(world), world)
+
+    def by_id(self, wanted_id):
+        """Return the world with `wanted_id` if it is the current or a recent version, else None."""
+        self.get()
+        with self._lock:
+            return self._versions.get(wanted_id)
+
+    def _swap(self, world):
+        # Called with the lock held
+        if self.index_path and not isinstance(world, CompiledWorld):
+            world = self._compile(world)
+        self._world = world
+        self.world_id = world_id(world)
+        self.version += 1
+        self._versions.pop(self.world_id, None)
+        self._versions[self.world_id] = world
+        while len(self._versions) > MAX_VERSIONS:
+            del self._versions[next(iter(self._versions))]
+
+    def _maybe_refresh(self):
+        if not self.remote_url:
+            return
+        with self._lock:
+            recently_checked = self._last_checked and time.monotonic() - self._last_checked < self.refresh_seconds
+            if self._refreshing or recently_checked:
+                return
+            self._refreshing = True
+            self._last_checked = time.monotonic()
+        threading.Thread(target=self._refresh_in_background, name="world-refresh", daemon=True).start()
+
+    def _refresh_in_background(self):
+        try:
+            if self.refresh():
+                logger.info("Loaded updated world data from %s", self.remote_url)
+        except Exception as e:
+            logger.warning("World data revalidation failed: %s", e)
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def _compile(self, world):
+        try:
+            compile_world(world, self.index_path, meta={"validators": self._validators})
+            return CompiledWorld(self.index_path)
+        except (OSError, ValueError) as e:
+            logger.warning("Serving world data without an index; compiling %s failed: %s", self.index_path, e)
+            return world
+
+    def _load_from_disk(self):
+        if self.index_path and os.path.exists(self.index_path):
+            sources = [path for path in (self.local_path, self.cache_path) if path and os.path.exists(path)]
+            if all(os.path.getmtime(self.index_path) >= os.path.getmtime(path) for path in sources):
+                try:
+                    world = CompiledWorld(self.index_path)
+                    self._validators = world.meta.get("validators", {})
+                    return world
+                except (OSError, ValueError) as e:
+                    logger.warning("Ignoring unusable world index %s: %s", self.index_path, e)
+        if self.cache_path and os.path.exists(self.cache_path):
+            local_mtime = os.path.getmtime(self.local_path) if os.path.exists(self.local_path) else 0
+            if os.path.getmtime(self.cache_path) >= local_mtime:
+                try:
+                    with open(self.cache_path, "r") as f:
+                        cached = json.load(f)
+                    world = validate_world(cached["world"])
+                    self._validators = cached.get("validators", {})
+                    return world
+                except (OSError, ValueError, KeyError) as e:
+                    logger.warning("Ignoring unusable world cache %s: %s", self.cache_path, e)
+        with open(self.local_path, "r") as f:
+            return validate_world(json.load(f))
+
+    def _write_cache(self, world, validators):
+        os.makedirs(os.path.dirname(self.cache_path) or ".", exist_ok=True)
+        tmp_path = f"{self.cache_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"validators": validators, "world": world}, f)
+        os.replace(tmp_path, self.cache_path)